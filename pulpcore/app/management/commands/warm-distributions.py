@@ -0,0 +1,76 @@
+import asyncio
+from gettext import gettext as _
+
+from django.core.management import BaseCommand, CommandError
+
+from pulpcore.app.models import Distribution
+from pulpcore.app.tasks.warm import DEFAULT_CONCURRENCY, request_distributions
+
+
+class Command(BaseCommand):
+    """Django management command for populating the caches of the content app."""
+
+    help = _(
+        "Request the files served by distributions from the content app, so they are cached and "
+        "on-demand content is downloaded before clients ask for it."
+    )
+
+    def add_arguments(self, parser):
+        """Set up arguments."""
+        parser.add_argument(
+            "--distribution-base-path", required=False, help=_("A base_path of a distribution.")
+        )
+        parser.add_argument(
+            "--distribution-path-prefix",
+            required=False,
+            help=_("A filter for distributions whose base_path begins with the provided prefix."),
+        )
+        parser.add_argument(
+            "--content-origin",
+            required=False,
+            help=_("The origin of the content app to send the requests to, e.g. CONTENT_ORIGIN."),
+        )
+        parser.add_argument(
+            "--download-on-demand",
+            action="store_true",
+            help=_("Also request the files of on-demand content that is not downloaded yet."),
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=_("The number of requests sent at once."),
+        )
+
+    def handle(self, *args, **options):
+        """Implement the command."""
+        if options["distribution_base_path"] and options["distribution_path_prefix"]:
+            raise CommandError(
+                "Cannot provide both --distribution-base-path and --distribution-path-prefix"
+            )
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+
+        distributions = Distribution.objects.select_related("pulp_domain")
+        if options["distribution_base_path"]:
+            distributions = distributions.filter(base_path=options["distribution_base_path"])
+        elif options["distribution_path_prefix"]:
+            distributions = distributions.filter(
+                base_path__startswith=options["distribution_path_prefix"]
+            )
+        distributions = list(distributions)
+        if not distributions:
+            raise CommandError(_("No distribution matches."))
+
+        statuses = asyncio.run(
+            request_distributions(
+                distributions,
+                content_origin=options["content_origin"],
+                download_on_demand=options["download_on_demand"],
+                concurrency=options["concurrency"],
+            )
+        )
+        for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+            self.stdout.write(
+                _("{status}: {count}").format(status=status or _("failed"), count=count)
+            )
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0102_add_domain_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repositoryversion',
+            name='content_artifacts_indexed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RepositoryVersionContentArtifact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relative_path', models.TextField()),
+                ('content_artifact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='version_paths', to='core.contentartifact')),
+                ('repository_version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_paths', to='core.repositoryversion')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='repositoryversioncontentartifact',
+            index=models.Index(fields=['repository_version', 'relative_path'], name='core_reposi_reposit_04aada_idx'),
+        ),
+    ]
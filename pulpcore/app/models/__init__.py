@@ -67,6 +67,7 @@ from .repository import (  # noqa
     Repository,
     RepositoryContent,
     RepositoryVersion,
+    RepositoryVersionContentArtifact,
     RepositoryVersionContentDetails,
 )
 
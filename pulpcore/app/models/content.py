@@ -16,7 +16,8 @@ from itertools import chain
 
 from django.conf import settings
 from django.core import validators
-from django.db import IntegrityError, models, transaction
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.signals import post_save, pre_save
 from django.forms.models import model_to_dict
 from django.utils.timezone import now
 from django_guid import get_guid
@@ -97,7 +98,7 @@ class BulkCreateManager(models.Manager):
 
 class BulkTouchQuerySet(models.QuerySet):
     """
-    A query set that provides ``touch()``.
+    A query set that provides ``touch()`` and ``touched()``.
     """
 
     def touch(self):
@@ -115,6 +116,31 @@ class BulkTouchQuerySet(models.QuerySet):
             sub_q = self.order_by("pk").select_for_update(skip_locked=True)
             return self.filter(pk__in=sub_q).update(timestamp_of_interest=now())
 
+    def touched(self):
+        """
+        Update the ``timestamp_of_interest`` on all objects of the query and fetch them, with a
+        single query.
+
+        Like with :meth:`touch`, only the rows that are not locked by others are updated, but all
+        of them are fetched. The objects fetched hold the ``timestamp_of_interest`` from before the
+        update.
+
+        Returns:
+            :class:`django.db.models.query.RawQuerySet`: The objects of the query.
+        """
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        pk = quote_name(self.model._meta.pk.column)
+        sql, params = self.query.sql_with_params()
+        return self.model.objects.raw(
+            f"WITH matched AS ({sql}), touched AS ("
+            f"UPDATE {table} SET timestamp_of_interest = %s WHERE {pk} IN ("
+            f"SELECT {pk} FROM {table} WHERE {pk} IN (SELECT {pk} FROM matched) "
+            f"ORDER BY {pk} FOR UPDATE SKIP LOCKED)) "
+            "SELECT * FROM matched",
+            (*params, now()),
+        )
+
 
 class QueryMixin:
     """
@@ -485,6 +511,76 @@ class PulpTemporaryFile(HandleTempFilesMixin, BaseModel):
 
 
 class ContentManager(BulkCreateManager):
+    def bulk_get_or_create_content(self, objs):
+        """
+        Insert unsaved content units in bulk and get the existing ones from the database.
+
+        Unlike :meth:`bulk_get_or_create`, this supports the master/detail models of content. The
+        rows of the detail tables are inserted first, skipping the units conflicting with existing
+        ones, then the rows of the master table for the units inserted. The existing units are
+        fetched by natural key, with one query per content type.
+
+        Do *not* call save() on each of the instances, see :meth:`Content.can_bulk_create`. This
+        must run in a transaction, the foreign keys of the detail tables to the master table are
+        only checked when it is committed.
+
+        Args:
+            objs (iterable of Content): Unsaved content units, of types that can be bulk created.
+
+        Returns:
+            List of the units inserted and the existing units replacing the units conflicting with
+            them, in the order of ``objs``. Units conflicting with others but not on their natural
+            key are returned unsaved.
+        """
+        objs = list(objs)
+        objs_by_model = defaultdict(list)
+        for obj in objs:
+            objs_by_model[type(obj)].append(obj)
+
+        existing_by_id = {}
+        for model, units in objs_by_model.items():
+            master = model._meta.get_parent_list()[0]
+            link = model._meta.get_ancestor_link(master)
+            for unit in units:
+                if not unit.pulp_type:
+                    unit.pulp_type = unit.get_pulp_type()
+                setattr(unit, link.attname, getattr(unit, master._meta.pk.attname))
+            model._base_manager._insert(
+                units,
+                fields=model._meta.local_concrete_fields,
+                using=self.db,
+                ignore_conflicts=True,
+            )
+            inserted_pks = set(
+                model._base_manager.using(self.db)
+                .filter(pk__in=[unit.pk for unit in units])
+                .values_list("pk", flat=True)
+            )
+            inserted = [unit for unit in units if unit.pk in inserted_pks]
+            if inserted:
+                master._base_manager._insert(
+                    inserted, fields=master._meta.local_concrete_fields, using=self.db
+                )
+            for unit in inserted:
+                unit._state.adding = False
+                unit._state.db = self.db
+
+            conflicting = [unit for unit in units if unit.pk not in inserted_pks]
+            if not conflicting:
+                continue
+            conflicting_q = models.Q(pk__in=[])
+            for unit in conflicting:
+                setattr(unit, link.attname, None)
+                conflicting_q |= unit.q()
+            existing = {
+                result.natural_key(): result
+                for result in model.objects.using(self.db).filter(conflicting_q)
+            }
+            for unit in conflicting:
+                if unit.natural_key() in existing:
+                    existing_by_id[id(unit)] = existing[unit.natural_key()]
+        return [existing_by_id.get(id(obj), obj) for obj in objs]
+
     def orphaned(self, orphan_protection_time, content_pks=None):
         """Returns set of orphaned content that is ready to be cleaned up."""
         expiration = now() - datetime.timedelta(minutes=orphan_protection_time)
@@ -521,6 +617,7 @@ class Content(MasterModel, QueryMixin):
     """
 
     PROTECTED_FROM_RECLAIM = True
+    BULK_CREATE = True
     _repository_types = defaultdict(set)
 
     TYPE = "content"
@@ -546,6 +643,24 @@ class Content(MasterModel, QueryMixin):
         """
         return tuple(cls._repository_types[cls])
 
+    @classmethod
+    def can_bulk_create(cls):
+        """
+        Whether new units of this type can be saved in bulk, without calling :meth:`save`.
+
+        Types overriding :meth:`save`, with lifecycle hooks or receivers of the ``pre_save`` or
+        ``post_save`` signals, or inheriting from another content type are saved one by one. Other
+        types can opt out by setting ``BULK_CREATE`` to ``False``.
+        """
+        return (
+            cls.BULK_CREATE
+            and cls.save is Content.save
+            and cls._meta.get_parent_list() == [Content]
+            and not cls._potentially_hooked_methods()
+            and not pre_save.has_listeners(cls)
+            and not post_save.has_listeners(cls)
+        )
+
     @classmethod
     def natural_key_fields(cls):
         """
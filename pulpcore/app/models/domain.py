@@ -1,8 +1,9 @@
 from django.core.files.storage import get_storage_class, default_storage
 from django.db import models
-from django_lifecycle import hook, BEFORE_DELETE, BEFORE_UPDATE
+from django_lifecycle import hook, AFTER_DELETE, AFTER_UPDATE, BEFORE_DELETE, BEFORE_UPDATE
 
 from pulpcore.app.models import BaseModel, AutoAddObjPermsMixin
+from pulpcore.app.util import notify_distributions_changed
 
 from .fields import EncryptedJSONField
 
@@ -49,6 +50,11 @@ class Domain(BaseModel, AutoAddObjPermsMixin):
     def prevent_default_deletion(self):
         raise models.ProtectedError("Default domain can not be updated/deleted.", [self])
 
+    @hook(AFTER_UPDATE)
+    @hook(AFTER_DELETE)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pk)
+
     class Meta:
         permissions = [
             ("manage_roles_domain", "Can manage role assignments on domain"),
@@ -10,19 +10,19 @@ from aiohttp.web_exceptions import HTTPNotFound
 from django.contrib.postgres.fields import HStoreField
 from django.db import IntegrityError, models, transaction
 from django.utils import timezone
-from django_lifecycle import hook, AFTER_UPDATE, BEFORE_DELETE
+from django_lifecycle import hook, AFTER_CREATE, AFTER_DELETE, AFTER_UPDATE, BEFORE_DELETE
 
 from .base import MasterModel, BaseModel
 from .content import Artifact, Content, ContentArtifact
 from .repository import Remote, Repository, RepositoryVersion
 from .task import CreatedResource
 from pulpcore.app.files import PulpTemporaryUploadedFile
-from pulpcore.cache import Cache
+from pulpcore.cache import invalidate_on_commit
 from dynaconf import settings
 from rest_framework.exceptions import APIException
 from pulpcore.app.models import AutoAddObjPermsMixin
 from pulpcore.responses import ArtifactResponse
-from pulpcore.app.util import get_domain_pk, cache_key
+from pulpcore.app.util import get_domain_pk, cache_key, notify_distributions_changed
 
 
 class PublicationQuerySet(models.QuerySet):
@@ -164,11 +164,15 @@ class Publication(MasterModel):
 
                 # Invalidate cache for all distributions serving this publication
                 if base_paths:
-                    Cache().delete(base_key=cache_key(base_paths))
+                    invalidate_on_commit(cache_key(base_paths))
 
             CreatedResource.objects.filter(object_id=self.pk).delete()
             super().delete(**kwargs)
 
+    @hook(AFTER_DELETE, when="complete", is_now=True)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pulp_domain_id)
+
     def finalize_new_publication(self):
         """
         Finalize the incomplete Publication with plugin-provided code.
@@ -225,7 +229,7 @@ class Publication(MasterModel):
                 ).values_list("base_path", flat=True)
                 if base_paths:
                     base_keys = [f"{self.pulp_domain.name}:{base_path}" for base_path in base_paths]
-                    Cache().delete(base_key=base_keys)
+                    invalidate_on_commit(base_keys)
 
 
 class PublishedArtifact(BaseModel):
@@ -344,12 +348,33 @@ class ContentGuard(MasterModel):
         """
         raise NotImplementedError()
 
+    def permit_cache_key(self, request):
+        """
+        Get a key for everything besides this guard that the decision of `permit` depends on.
+
+        The content app reuses the decision for requests with the same key until the guard is
+        changed or the permissions of users change. Guards looking at anything else, e.g. the
+        headers of the request, must not return a key.
+
+        Args:
+            request (aiohttp.web.Request): A request for a published file.
+
+        Returns:
+            A hashable key, or None if decisions can't be reused.
+        """
+        return None
+
     @hook(BEFORE_DELETE)
     def invalidate_cache(self):
         if settings.CACHE_ENABLED:
             base_paths = self.distribution_set.values_list("base_path", flat=True)
             if base_paths:
-                Cache().delete(base_key=cache_key(base_paths))
+                invalidate_on_commit(cache_key(base_paths))
+
+    @hook(AFTER_UPDATE)
+    @hook(AFTER_DELETE)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pulp_domain_id)
 
     class Meta:
         unique_together = ("name", "pulp_domain")
@@ -378,6 +403,14 @@ class RBACContentGuard(ContentGuard, AutoAddObjPermsMixin):
         except APIException as e:
             raise PermissionError(e)
 
+    def permit_cache_key(self, request):
+        """
+        The decision only depends on the user and their roles.
+        """
+        if not request.get("drf_request", None):
+            return None
+        return ("user", request["user"].pk)
+
     class Meta:
         default_related_name = "%(app_label)s_%(model_name)s"
         permissions = (
@@ -583,9 +616,15 @@ class Distribution(MasterModel):
     def invalidate_cache(self):
         """Invalidates the cache if enabled."""
         if settings.CACHE_ENABLED:
-            Cache().delete(base_key=cache_key(self.base_path))
+            invalidate_on_commit(cache_key(self.base_path))
             # Can also preload cache here possibly
 
+    @hook(AFTER_CREATE)
+    @hook(AFTER_UPDATE)
+    @hook(AFTER_DELETE)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pulp_domain_id)
+
 
 class ArtifactDistribution(Distribution):
     """Serve artifacts by their uuid."""
@@ -12,21 +12,28 @@ from asyncio_throttle import Throttler
 from dynaconf import settings
 from django.contrib.postgres.fields import HStoreField
 from django.core.validators import MinValueValidator
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.db.models import F, Func, Q, Value
 from django.urls import reverse
-from django_lifecycle import AFTER_UPDATE, BEFORE_DELETE, hook
+from django_lifecycle import AFTER_DELETE, AFTER_UPDATE, BEFORE_DELETE, hook
 from rest_framework.exceptions import APIException
 
-from pulpcore.app.util import batch_qs, get_url, get_view_name_for_model, get_domain_pk, cache_key
+from pulpcore.app.util import (
+    batch_qs,
+    cache_key,
+    get_domain_pk,
+    get_url,
+    get_view_name_for_model,
+    notify_distributions_changed,
+)
 from pulpcore.constants import ALL_KNOWN_CONTENT_CHECKSUMS
 from pulpcore.download.factory import DownloaderFactory
 from pulpcore.exceptions import ResourceImmutableError
 
-from pulpcore.cache import Cache
+from pulpcore.cache import invalidate_on_commit
 
 from .base import MasterModel, BaseModel
-from .content import Artifact, Content
+from .content import Artifact, Content, ContentArtifact
 from .fields import EncryptedTextField
 from .task import CreatedResource, Task
 
@@ -283,9 +290,14 @@ class Repository(MasterModel):
             if distributions.exists():
                 base_paths = distributions.values_list("base_path", flat=True)
                 if base_paths:
-                    Cache().delete(base_key=cache_key(base_paths))
+                    invalidate_on_commit(cache_key(base_paths))
                 # Could do preloading here for immediate artifacts with artifacts_for_version
 
+    @hook(AFTER_UPDATE)
+    @hook(AFTER_DELETE)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pulp_domain_id)
+
 
 class Remote(MasterModel):
     """
@@ -527,7 +539,12 @@ class Remote(MasterModel):
         if settings.CACHE_ENABLED:
             base_paths = self.distribution_set.values_list("base_path", flat=True)
             if base_paths:
-                Cache().delete(base_key=cache_key(base_paths))
+                invalidate_on_commit(cache_key(base_paths))
+
+    @hook(AFTER_UPDATE)
+    @hook(AFTER_DELETE)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.pulp_domain_id)
 
     class Meta:
         default_related_name = "remotes"
@@ -629,6 +646,9 @@ class RepositoryVersion(BaseModel):
             1 + the most recent version.
         complete (models.BooleanField): If true, the RepositoryVersion is visible. This field is set
             to true when the task that creates the RepositoryVersion is complete.
+        content_artifacts_indexed (models.BooleanField): If true, the ContentArtifacts of this
+            version are indexed by relative_path, see
+            :class:`~pulpcore.app.models.RepositoryVersionContentArtifact`.
 
     Relations:
 
@@ -643,6 +663,7 @@ class RepositoryVersion(BaseModel):
     complete = models.BooleanField(db_index=True, default=False)
     base_version = models.ForeignKey("RepositoryVersion", null=True, on_delete=models.SET_NULL)
     info = models.JSONField(default=dict)
+    content_artifacts_indexed = models.BooleanField(default=False)
 
     class Meta:
         default_related_name = "versions"
@@ -686,6 +707,44 @@ class RepositoryVersion(BaseModel):
 
         return content_qs.filter(version_memberships__in=self._content_relationships())
 
+    def get_content_artifacts(self, relative_path):
+        """
+        Returns the content artifacts of a repository version at a relative path
+
+        This uses the relative_path index of the repository version if it was built.
+
+        Args:
+            relative_path (str): The relative path of the content artifacts.
+
+        Returns:
+            django.db.models.QuerySet: The ContentArtifacts in this version with `relative_path`.
+        """
+        if self.content_artifacts_indexed:
+            return ContentArtifact.objects.filter(
+                version_paths__repository_version=self,
+                version_paths__relative_path=relative_path,
+            )
+        return ContentArtifact.objects.filter(content__in=self.content, relative_path=relative_path)
+
+    def _index_content_artifacts(self):
+        """
+        Build the relative_path index of the content artifacts in this version.
+        """
+        select_sql, params = (
+            ContentArtifact.objects.filter(content__in=self.content)
+            .values_list("pk", "relative_path")
+            .query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {table} (repository_version_id, content_artifact_id, relative_path) "
+                "SELECT %s, ca.* FROM ({select_sql}) AS ca".format(
+                    table=RepositoryVersionContentArtifact._meta.db_table, select_sql=select_sql
+                ),
+                [self.pk, *params],
+            )
+        self.content_artifacts_indexed = True
+
     @property
     def content(self):
         """
@@ -990,14 +1049,14 @@ class RepositoryVersion(BaseModel):
         if self.complete:
             if self.repository.versions.complete().count() <= 1:
                 raise APIException(_("Attempt to delete the last remaining version."))
-            if settings.CACHE_ENABLED:
-                base_paths = self.distribution_set.values_list("base_path", flat=True)
-                if base_paths:
-                    Cache().delete(base_key=base_paths)
-
             # Handle the manipulation of the repository version content and its final deletion in
             # the same transaction.
             with transaction.atomic():
+                if settings.CACHE_ENABLED:
+                    base_paths = self.distribution_set.values_list("base_path", flat=True)
+                    if base_paths:
+                        invalidate_on_commit(cache_key(base_paths))
+
                 repo_relations = RepositoryContent.objects.filter(
                     repository=self.repository
                 ).select_for_update()
@@ -1024,6 +1083,11 @@ class RepositoryVersion(BaseModel):
                 CreatedResource.objects.filter(object_id=self.pk).delete()
                 super().delete(**kwargs)
 
+    @hook(AFTER_UPDATE, when="complete", has_changed=True, is_now=True)
+    @hook(AFTER_DELETE, when="complete", is_now=True)
+    def _notify_distributions_changed(self):
+        notify_distributions_changed(self.repository.pulp_domain_id)
+
     def _compute_counts(self):
         """
         Compute and save content unit counts by type.
@@ -1098,10 +1162,14 @@ class RepositoryVersion(BaseModel):
                     self.complete = True
                     self.repository.next_version = self.number + 1
                     with transaction.atomic():
+                        self._index_content_artifacts()
                         self.repository.save()
                         self.save()
                         self._compute_counts()
                     self.repository.cleanup_old_versions()
+                    # Drop what was cached while the version was being created, e.g. the paths
+                    # that were not found in the previous version
+                    self.repository.invalidate_cache()
                     repository.on_new_version(self)
             except Exception:
                 self.delete()
@@ -1172,3 +1240,31 @@ class RepositoryVersionContentDetails(models.Model):
             partial_url_str = "{base}?repository_version_removed={rv_href}"
         full_url = partial_url_str.format(base=ctype_url, rv_href=rv_href)
         return full_url
+
+
+class RepositoryVersionContentArtifact(models.Model):
+    """
+    The relative_path index of the ContentArtifacts in a complete RepositoryVersion.
+
+    The content app looks up the file to serve for a repository version in this index instead of
+    resolving the content of the version through its RepositoryContent on every request.
+
+    Fields:
+        relative_path (models.TextField): The relative path of the ContentArtifact.
+
+    Relations:
+        repository_version (models.ForeignKey): The indexed RepositoryVersion.
+        content_artifact (models.ForeignKey): The ContentArtifact in the RepositoryVersion.
+    """
+
+    relative_path = models.TextField()
+
+    repository_version = models.ForeignKey(
+        RepositoryVersion, related_name="content_paths", on_delete=models.CASCADE
+    )
+    content_artifact = models.ForeignKey(
+        ContentArtifact, related_name="version_paths", on_delete=models.CASCADE
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["repository_version", "relative_path"])]
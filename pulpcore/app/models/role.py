@@ -3,8 +3,11 @@ from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 
-from pulpcore.app.models import BaseModel, Group
+from pulpcore.app.models import AccessPolicy, BaseModel, Group
+from pulpcore.app.util import notify_permissions_changed
 
 
 class Role(BaseModel):
@@ -77,3 +80,28 @@ class GroupRole(BaseModel):
     class Meta:
         unique_together = (("group", "role", "content_type", "object_id", "domain"),)
         indexes = [models.Index(fields=["content_type", "object_id"])]
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+@receiver(post_save, sender=GroupRole)
+@receiver(post_delete, sender=GroupRole)
+@receiver(post_save, sender=AccessPolicy)
+@receiver(post_delete, sender=AccessPolicy)
+@receiver(post_delete, sender=get_user_model())
+def _notify_permissions_changed(sender, **kwargs):
+    notify_permissions_changed()
+
+
+@receiver(post_save, sender=get_user_model())
+def _notify_user_changed(sender, update_fields=None, **kwargs):
+    # Logging in only updates the last_login
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        notify_permissions_changed()
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def _notify_members_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        notify_permissions_changed()
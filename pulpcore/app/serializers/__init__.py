@@ -113,3 +113,4 @@ from .user import (  # noqa
     UserSerializer,
 )
 from .replica import UpstreamPulpSerializer  # noqa
+from .warm import WarmDistributionsSerializer  # noqa
@@ -0,0 +1,54 @@
+from gettext import gettext as _
+
+from rest_framework import fields, serializers
+
+from pulpcore.app.models import Distribution
+from pulpcore.app.serializers import ValidateFieldsMixin
+from pulpcore.app.util import get_domain
+
+
+class WarmDistributionsSerializer(serializers.Serializer, ValidateFieldsMixin):
+    """
+    Serializer for populating the caches of the content app with the files of distributions.
+    """
+
+    distribution_hrefs = fields.ListField(
+        required=True,
+        help_text=_(
+            "The distributions to request the files of from the content app. Use ['*'] to specify "
+            "all distributions."
+        ),
+    )
+    download_on_demand = fields.BooleanField(
+        default=False,
+        help_text=_("Also request the files of on-demand content that is not downloaded yet."),
+    )
+    concurrency = fields.IntegerField(
+        required=False,
+        min_value=1,
+        help_text=_("The number of requests sent to the content app at once."),
+    )
+
+    def validate_distribution_hrefs(self, value):
+        """
+        Check that the distribution_hrefs is not an empty list and contains all valid hrefs.
+
+        Args:
+            value (list): The list supplied by the user
+
+        Returns:
+            The list of Distributions after validation
+
+        Raises:
+            ValidationError: If the list is empty or contains invalid hrefs.
+        """
+        if len(value) == 0:
+            raise serializers.ValidationError("Must not be [].")
+        if "*" in value:
+            if len(value) != 1:
+                raise serializers.ValidationError("Can not specify other HREFs when using '*'")
+            return list(Distribution.objects.filter(pulp_domain=get_domain()))
+
+        from pulpcore.app.viewsets import NamedModelViewSet
+
+        return [NamedModelViewSet.get_resource(href, Distribution) for href in value]
@@ -238,6 +238,16 @@ DRF_ACCESS_POLICY = {"reusable_conditions": ["pulpcore.app.global_access_conditi
 
 CONTENT_PATH_PREFIX = "/pulp/content/"
 CONTENT_APP_TTL = 30
+CONTENT_APP_COALESCE_DOWNLOADS = False
+CONTENT_APP_DECOUPLE_DOWNLOADS = False
+CONTENT_APP_DISTRIBUTION_CACHE = False
+CONTENT_APP_DISTRIBUTION_CACHE_TTL = 300
+CONTENT_APP_LISTING_PAGE_SIZE = None
+CONTENT_APP_AUTHENTICATION_CACHE_TTL = 0
+CONTENT_APP_METRICS_PATH = None
+CONTENT_APP_SERVER_TIMING = False
+CONTENT_APP_SAVE_BATCH_INTERVAL = 0
+CONTENT_APP_HEDGE_DELAY = None
 
 WORKER_TTL = 30
 
@@ -254,6 +264,11 @@ ALLOWED_EXPORT_PATHS = []
 CACHE_ENABLED = False
 CACHE_SETTINGS = {
     "EXPIRES_TTL": 600,  # 10 minutes
+    "COMPRESSION_THRESHOLD": 1024,  # 1 kilobyte
+    "LOCAL_MAX_SIZE": 0,  # disabled
+    "LOCAL_TTL": 60,  # 1 minute
+    "NEGATIVE_TTL": 0,  # disabled
+    "STREAMED_RESPONSE_MAX_SIZE": 0,  # disabled
 }
 
 SPECTACULAR_SETTINGS = {
@@ -289,6 +304,15 @@ DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 TASK_DIAGNOSTICS = False
 
+# Tuning of the Stages API pipelines
+STAGES_QUEUE_SIZE = 1
+STAGES_BATCH_MIN_SIZE = 500
+STAGES_BATCH_MAX_SIZE = None
+STAGES_BATCH_MAX_LATENCY = None
+STAGES_ADAPTIVE_BATCHING = False
+STAGES_MEMORY_LIMIT = None
+STAGES_DB_WORKERS = 1
+
 ANALYTICS = True
 
 HIDE_GUARDED_DISTRIBUTIONS = False
@@ -23,3 +23,5 @@ from .replica import replicate_distributions  # noqa
 from .repository import repair_all_artifacts  # noqa
 
 from .analytics import post_analytics  # noqa
+
+from .warm import warm_distributions  # noqa
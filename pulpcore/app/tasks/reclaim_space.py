@@ -1,3 +1,5 @@
+from django.db import transaction
+
 from pulpcore.app.models import (
     Artifact,
     Content,
@@ -24,10 +26,6 @@ def reclaim_space(repo_pks, keeplist_rv_pks=None, force=False):
         force (bool): If True, uploaded content will be taken into account.
 
     """
-    reclaimed_repos = Repository.objects.filter(pk__in=repo_pks)
-    for repo in reclaimed_repos:
-        repo.invalidate_cache(everything=True)
-
     domain = get_domain()
     rest_of_repos = Repository.objects.filter(pulp_domain=domain).exclude(pk__in=repo_pks)
     c_keep_qs = Content.objects.filter(repositories__in=rest_of_repos)
@@ -62,7 +60,11 @@ def reclaim_space(repo_pks, keeplist_rv_pks=None, force=False):
             ca.artifact = None
             ca_to_update.append(ca)
 
-    ContentArtifact.objects.bulk_update(objs=ca_to_update, fields=["artifact"], batch_size=1000)
+    with transaction.atomic():
+        # The cache of all the repositories is invalidated at once when the artifacts are unlinked
+        for repo in Repository.objects.filter(pk__in=repo_pks):
+            repo.invalidate_cache(everything=True)
+        ContentArtifact.objects.bulk_update(objs=ca_to_update, fields=["artifact"], batch_size=1000)
     artifacts_to_delete = Artifact.objects.filter(pk__in=artifact_pks)
     progress_bar = ProgressReport(
         message="Reclaim disk space",
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from collections import Counter
+from gettext import gettext as _
+from urllib.parse import quote
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+from pulpcore.app.models import ContentArtifact, Distribution, ProgressReport, Publication
+
+log = logging.getLogger(__name__)
+
+# The number of requests sent to the content app at once by default
+DEFAULT_CONCURRENCY = 10
+
+
+def _served_paths(distribution, download_on_demand=False):
+    """
+    Get the relative paths of the files a distribution serves from its publication or repository
+    version.
+
+    Args:
+        distribution (:class:`~pulpcore.app.models.Distribution`): The distribution.
+        download_on_demand (bool): Whether to include the files that are not downloaded yet.
+
+    Returns:
+        list: The relative paths.
+    """
+    distribution = distribution.cast()
+    publication = distribution.publication
+    repo_version = distribution.repository_version
+    if distribution.repository:
+        if not publication:
+            try:
+                publication = (
+                    Publication.objects.filter(
+                        repository_version__in=distribution.repository.versions.all(),
+                        complete=True,
+                    )
+                    .select_related("repository_version")
+                    .latest("repository_version", "pulp_created")
+                )
+                repo_version = publication.repository_version
+            except ObjectDoesNotExist:
+                pass
+        if not repo_version:
+            repo_version = distribution.repository.latest_version()
+
+    querysets = []
+    if publication:
+        querysets.append(
+            publication.published_artifact.values_list(
+                "relative_path", "content_artifact__artifact_id"
+            )
+        )
+        if publication.pass_through:
+            querysets.append(
+                ContentArtifact.objects.filter(
+                    content__in=publication.repository_version.content
+                ).values_list("relative_path", "artifact_id")
+            )
+    elif repo_version and not distribution.SERVE_FROM_PUBLICATION:
+        querysets.append(
+            ContentArtifact.objects.filter(content__in=repo_version.content).values_list(
+                "relative_path", "artifact_id"
+            )
+        )
+
+    paths = set()
+    for queryset in querysets:
+        for relative_path, artifact_id in queryset.iterator():
+            if artifact_id or download_on_demand:
+                paths.add(relative_path)
+    return sorted(paths)
+
+
+def _distribution_url(distribution, content_origin=None):
+    """
+    Get the url of the base path of a distribution in the content app.
+    """
+    origin = (content_origin or settings.CONTENT_ORIGIN).rstrip("/")
+    prefix = settings.CONTENT_PATH_PREFIX.strip("/")
+    base_path = distribution.base_path.strip("/")
+    if settings.DOMAIN_ENABLED:
+        base_path = "{}/{}".format(distribution.pulp_domain.name, base_path)
+    return "{}/{}/{}/".format(origin, prefix, base_path)
+
+
+async def request_distributions(
+    distributions,
+    content_origin=None,
+    download_on_demand=False,
+    concurrency=DEFAULT_CONCURRENCY,
+    progress_report=None,
+):
+    """
+    Request the files served by distributions from the content app.
+
+    Each file is requested with a plain GET, which the content app caches like the requests of
+    clients, and which downloads the files of on-demand content. The bodies of the responses are
+    read and dropped. Distributions with a content guard are skipped.
+
+    Args:
+        distributions (list): The :class:`~pulpcore.app.models.Distribution` objects to warm.
+        content_origin (str): The origin of the content app to send the requests to, defaults to
+            ``CONTENT_ORIGIN``.
+        download_on_demand (bool): Whether to request the files that are not downloaded yet.
+        concurrency (int): The number of requests to send at once.
+        progress_report (:class:`~pulpcore.app.models.ProgressReport`): Counts the requests.
+
+    Returns:
+        :class:`collections.Counter`: The number of responses by status, ``None`` counting the
+            requests that failed.
+    """
+    statuses = Counter()
+    # Requests of on-demand content last as long as the download from the remote
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async def request(session, url):
+        try:
+            async with session.get(url) as response:
+                async for chunk in response.content.iter_any():
+                    pass
+                statuses[response.status] += 1
+        except aiohttp.ClientError as e:
+            log.warning(_("Could not request {url}: {error}").format(url=url, error=e))
+            statuses[None] += 1
+        if progress_report is not None:
+            await progress_report.aincrement()
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        pending = set()
+        for distribution in distributions:
+            if distribution.content_guard_id:
+                log.info(
+                    _("Skipping the distribution '{}' protected by a content guard.").format(
+                        distribution.name
+                    )
+                )
+                continue
+            base_url = await sync_to_async(_distribution_url)(distribution, content_origin)
+            paths = await sync_to_async(_served_paths)(distribution, download_on_demand)
+            for path in [""] + paths:
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    await asyncio.gather(*done)
+                pending.add(asyncio.ensure_future(request(session, base_url + quote(path))))
+        await asyncio.gather(*pending)
+    return statuses
+
+
+async def warm_distributions(
+    distribution_pks, content_origin=None, download_on_demand=False, concurrency=None
+):
+    """
+    Populate the caches of the content app with the files served by distributions.
+
+    Args:
+        distribution_pks (list): The primary keys of the distributions to warm.
+        content_origin (str): The origin of the content app to send the requests to, defaults to
+            ``CONTENT_ORIGIN``.
+        download_on_demand (bool): Whether to download the files of on-demand content.
+        concurrency (int): The number of requests to send at once.
+    """
+    distributions = await sync_to_async(list)(
+        Distribution.objects.filter(pk__in=distribution_pks).select_related("pulp_domain")
+    )
+    async with ProgressReport(
+        message=_("Warming the content app"), code="warm.requests"
+    ) as progress_report:
+        statuses = await request_distributions(
+            distributions,
+            content_origin=content_origin,
+            download_on_demand=download_on_demand,
+            concurrency=concurrency or DEFAULT_CONCURRENCY,
+            progress_report=progress_report,
+        )
+    log.info(_("Responses of the content app by status: {}").format(dict(statuses)))
@@ -16,6 +16,7 @@ from pulpcore.app.viewsets import (
     ListRepositoryVersionViewSet,
     OrphansCleanupViewset,
     ReclaimSpaceViewSet,
+    WarmDistributionsViewSet,
 )
 
 
@@ -147,6 +148,10 @@ urlpatterns = [
         f"{API_ROOT}repositories/reclaim_space/",
         ReclaimSpaceViewSet.as_view({"post": "reclaim"}),
     ),
+    path(
+        f"{API_ROOT}distributions/warm/",
+        WarmDistributionsViewSet.as_view({"post": "warm"}),
+    ),
     path(
         f"{API_ROOT}importers/core/pulp/import-check/",
         PulpImporterImportCheckView.as_view(),
@@ -12,6 +12,7 @@ import gnupg
 
 from django.conf import settings
 from django.apps import apps
+from django.db import connection
 from django.urls import Resolver404, resolve, reverse
 from django.contrib.contenttypes.models import ContentType
 from pkg_resources import get_distribution
@@ -25,6 +26,10 @@ from pulpcore.exceptions.validation import InvalidSignatureError
 # a little cache so viewset_for_model doesn't have to iterate over every app every time
 _model_viewset_cache = {}
 
+# The database notification channel used to announce changes to the distributions
+DISTRIBUTIONS_CHANGED_CHANNEL = "pulp_content_distributions"
+PERMISSIONS_CHANGED_CHANNEL = "pulp_content_permissions"
+
 
 def get_url(model, domain=None):
     """
@@ -435,3 +440,29 @@ def cache_key(base_path):
             base_path = [f"{domain.name}:{path}" for path in base_path]
 
     return base_path
+
+
+def notify_distributions_changed(domain_pk):
+    """
+    Tell the content apps that the distributions of a domain have to be loaded again.
+
+    The notification is sent through the database, so it is only delivered once the current
+    transaction is committed and not at all if it is rolled back.
+
+    Args:
+        domain_pk (uuid.UUID): The primary key of the domain whose distributions have changed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", (DISTRIBUTIONS_CHANGED_CHANNEL, str(domain_pk)))
+
+
+def notify_permissions_changed():
+    """
+    Tell the content apps that the permissions of users may have changed.
+
+    The content apps forget the decisions of content guards that depend on permissions. Like
+    :func:`notify_distributions_changed`, this only takes effect once the current transaction is
+    committed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", (PERMISSIONS_CHANGED_CHANNEL,))
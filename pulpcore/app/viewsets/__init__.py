@@ -78,3 +78,4 @@ from .user import (  # noqa
     UserRoleViewSet,
 )
 from .replica import UpstreamPulpViewSet  # noqa
+from .warm import WarmDistributionsViewSet  # noqa
@@ -22,7 +22,7 @@ from pulpcore.app.models.role import GroupRole, UserRole
 from pulpcore.app.response import OperationPostponedResponse
 from pulpcore.app.role_util import get_objects_for_user
 from pulpcore.app.serializers import AsyncOperationResponseSerializer, NestedRoleSerializer
-from pulpcore.app.util import get_viewset_for_model
+from pulpcore.app.util import get_viewset_for_model, notify_permissions_changed
 from pulpcore.tasking.tasks import dispatch
 
 # These should be used to prevent duplication and keep things consistent
@@ -616,6 +616,8 @@ class RolesMixin:
                         for group in serializer.validated_data["groups"]
                     ]
                 )
+            # bulk_create() doesn't send the post_save signal
+            notify_permissions_changed()
         return Response(serializer.data, status=201)
 
     @extend_schema(
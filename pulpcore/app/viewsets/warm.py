@@ -0,0 +1,42 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework.viewsets import ViewSet
+
+from pulpcore.app.response import OperationPostponedResponse
+from pulpcore.app.serializers import AsyncOperationResponseSerializer, WarmDistributionsSerializer
+from pulpcore.app.tasks import warm_distributions
+from pulpcore.tasking.tasks import dispatch
+
+
+class WarmDistributionsViewSet(ViewSet):
+    """
+    Viewset for the endpoint populating the caches of the content app.
+    """
+
+    serializer_class = WarmDistributionsSerializer
+
+    @extend_schema(
+        description=(
+            "Trigger an asynchronous task requesting the files served by distributions from the "
+            "content app, so they are cached before clients ask for them."
+        ),
+        responses={202: AsyncOperationResponseSerializer},
+    )
+    def warm(self, request):
+        """
+        Triggers an asynchronous warm-up of the content app.
+        """
+        serializer = WarmDistributionsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        distributions = serializer.validated_data["distribution_hrefs"]
+        task = dispatch(
+            warm_distributions,
+            shared_resources=distributions,
+            kwargs={
+                "distribution_pks": [str(distribution.pk) for distribution in distributions],
+                "download_on_demand": serializer.validated_data["download_on_demand"],
+                "concurrency": serializer.validated_data.get("concurrency"),
+            },
+        )
+
+        return OperationPostponedResponse(task, request)
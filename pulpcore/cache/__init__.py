@@ -5,4 +5,5 @@ from .cache import (  # noqa
     CacheKeys,
     ConnectionError,
     SyncContentCache,
+    invalidate_on_commit,
 )
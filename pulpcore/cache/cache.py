@@ -1,14 +1,23 @@
+import asyncio
 import enum
 import json
+import logging
+import struct
+import threading
+import time
+import zlib
 
+from collections import OrderedDict, defaultdict
 from functools import wraps
+from urllib.parse import urlencode
 
+from django.db import transaction
 from django.http import HttpResponseRedirect, HttpResponse, FileResponse as ApiFileResponse
 
 from rest_framework.request import Request as ApiRequest
 
 from aiohttp.web import FileResponse, Response, HTTPSuccessful, Request
-from aiohttp.web_exceptions import HTTPFound
+from aiohttp.web_exceptions import HTTPFound, HTTPNotFound
 
 from redis import ConnectionError
 from redis.asyncio import ConnectionError as AConnectionError
@@ -18,9 +27,35 @@ from pulpcore.app.redis_connection import (
     get_redis_connection,
     get_async_redis_connection,
 )
-from pulpcore.responses import ArtifactResponse
+from pulpcore.metrics import cache_lookups_total, timer
+from pulpcore.responses import (
+    ArtifactFileResponse,
+    ArtifactResponse,
+    BufferedStreamResponse,
+    conditional_response,
+)
 
 DEFAULT_EXPIRES_TTL = settings.CACHE_SETTINGS["EXPIRES_TTL"]
+COMPRESSION_THRESHOLD = settings.CACHE_SETTINGS.get("COMPRESSION_THRESHOLD", 1024)
+LOCAL_MAX_SIZE = settings.CACHE_SETTINGS.get("LOCAL_MAX_SIZE", 0)
+LOCAL_TTL = settings.CACHE_SETTINGS.get("LOCAL_TTL", 60)
+NEGATIVE_TTL = settings.CACHE_SETTINGS.get("NEGATIVE_TTL", 0)
+STREAMED_RESPONSE_MAX_SIZE = settings.CACHE_SETTINGS.get("STREAMED_RESPONSE_MAX_SIZE", 0)
+
+# The query parameters of the directory listings of the content app, the only ones cache keys use
+LISTING_PARAMETERS = ("after", "format")
+
+# The Redis pub/sub channel deletions of cache entries are announced on
+INVALIDATION_CHANNEL = "pulp_cache_invalidation"
+RECONNECT_INTERVAL = 5
+
+log = logging.getLogger(__name__)
+
+# Header of binary cache entries: magic, format version, flags and length of the metadata
+ENTRY_HEADER = struct.Struct("!2sBBI")
+ENTRY_MAGIC = b"\x00P"
+ENTRY_VERSION = 1
+ENTRY_COMPRESSED = 0x01
 
 
 class CacheKeys(enum.Enum):
@@ -61,6 +96,189 @@ def aconnection_error_wrapper(func):
     return wrapper
 
 
+def dump_entry(entry, body=None):
+    """
+    Serialize a response entry into the binary cache entry format.
+
+    The entry starts with a fixed size header, followed by the JSON encoded metadata of the
+    response and its raw body. Bodies larger than ``COMPRESSION_THRESHOLD`` are compressed.
+
+    Args:
+        entry (dict): The JSON serializable metadata of the response.
+        body (bytes): The body of the response, if any.
+
+    Returns:
+        bytes: The serialized entry.
+    """
+    metadata = json.dumps(entry).encode()
+    body = body or b""
+    flags = 0
+    if COMPRESSION_THRESHOLD is not None and len(body) > COMPRESSION_THRESHOLD:
+        body = zlib.compress(body)
+        flags |= ENTRY_COMPRESSED
+    header = ENTRY_HEADER.pack(ENTRY_MAGIC, ENTRY_VERSION, flags, len(metadata))
+    return b"".join((header, metadata, body))
+
+
+def load_entry(data):
+    """
+    Deserialize a response entry written by :func:`dump_entry` or by older versions of Pulp.
+
+    Args:
+        data (bytes): The serialized entry.
+
+    Returns:
+        tuple: The metadata of the response (dict) and its body (bytes or None).
+
+    Raises:
+        ValueError: When the entry can't be read.
+    """
+    if not data.startswith(ENTRY_MAGIC):
+        # Entries used to be JSON documents with the body in hexadecimal
+        entry = json.loads(data)
+        body = entry.pop("body", None)
+        return entry, bytes.fromhex(body) if body else None
+
+    try:
+        magic, version, flags, metadata_length = ENTRY_HEADER.unpack_from(data)
+    except struct.error as e:
+        raise ValueError("Truncated cache entry.") from e
+    if version != ENTRY_VERSION:
+        raise ValueError("Unknown cache entry format version {}.".format(version))
+    metadata_end = ENTRY_HEADER.size + metadata_length
+    entry = json.loads(data[ENTRY_HEADER.size : metadata_end])
+    body = data[metadata_end:]
+    if flags & ENTRY_COMPRESSED:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError("Corrupted cache entry body.") from e
+    return entry, body or None
+
+
+class LocalCache:
+    """
+    A bounded in-process LRU cache in front of Redis.
+
+    Entries are dropped when they are older than ``ttl`` seconds, when the total size of the cached
+    values exceeds ``max_size`` bytes, and when their deletion from Redis is announced on the
+    ``INVALIDATION_CHANNEL``. The cache is only used while it is subscribed to that channel, see
+    :meth:`listen_for_invalidations`.
+
+    Args:
+        max_size (int): The maximum total size of the cached values in bytes.
+        ttl (int): The number of seconds entries are kept.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.active = False
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._base_keys = defaultdict(set)
+
+    def _remove(self, base_key, key):
+        expires, value = self._entries.pop((base_key, key))
+        self.size -= len(value)
+        keys = self._base_keys[base_key]
+        keys.discard(key)
+        if not keys:
+            del self._base_keys[base_key]
+
+    def get(self, key, base_key):
+        """Gets the entry of key, None if it is not cached locally"""
+        if not self.active or (base_key, key) not in self._entries:
+            return None
+        expires, value = self._entries[(base_key, key)]
+        if expires < time.monotonic():
+            self._remove(base_key, key)
+            return None
+        self._entries.move_to_end((base_key, key))
+        return value
+
+    def set(self, key, value, base_key, generation=None):
+        """
+        Sets the entry of key
+
+        If `generation` is given, the entry is only set if nothing was invalidated since
+        `generation` was read, as the value may have been read from Redis before its deletion.
+        """
+        if isinstance(value, str):
+            value = value.encode()
+        if not self.active or len(value) > self.max_size:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        if (base_key, key) in self._entries:
+            self._remove(base_key, key)
+        self._entries[(base_key, key)] = (time.monotonic() + self.ttl, value)
+        self._base_keys[base_key].add(key)
+        self.size += len(value)
+        while self.size > self.max_size:
+            lru_base_key, lru_key = next(iter(self._entries))
+            self._remove(lru_base_key, lru_key)
+
+    def exists(self, base_key):
+        """Checks if entries of base_key are cached locally"""
+        return self.active and base_key in self._base_keys
+
+    def delete(self, key=None, base_key=None):
+        """Deletes the entries like :meth:`Cache.delete`"""
+        self.generation += 1
+        base_keys = [base_key] if isinstance(base_key, str) else base_key
+        keys = [key] if isinstance(key, str) else key
+        for base_key in base_keys:
+            for cached_key in list(self._base_keys.get(base_key, ())):
+                if not keys or cached_key in keys:
+                    self._remove(base_key, cached_key)
+
+    def clear(self):
+        """Deletes all entries"""
+        self.generation += 1
+        self._entries.clear()
+        self._base_keys.clear()
+        self.size = 0
+
+    async def listen_for_invalidations(self):
+        """
+        Delete the entries whose deletion from Redis is announced by other processes.
+
+        This runs for the lifetime of the content app and resubscribes when the connection to
+        Redis is lost. The cache is not used while it is not subscribed.
+        """
+        redis = get_async_redis_connection()
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        self.clear()
+                        self.active = True
+                    elif message["type"] == "message":
+                        self.delete(**json.loads(message["data"]))
+            except (AConnectionError, TypeError) as e:
+                log.warning("Content app failed to listen for cache invalidations: %s", e)
+            finally:
+                self.active = False
+                self.clear()
+                await pubsub.reset()
+            await asyncio.sleep(RECONNECT_INTERVAL)
+
+
+_local_cache = None
+
+
+def get_local_cache():
+    """Returns the process-wide LocalCache, None if it is disabled"""
+    global _local_cache
+    if _local_cache is None and LOCAL_MAX_SIZE:
+        _local_cache = LocalCache(LOCAL_MAX_SIZE, LOCAL_TTL)
+    return _local_cache
+
+
 class Cache:
     """Base class for Pulp's cache"""
 
@@ -112,11 +330,50 @@ class Cache:
         key and base_key should not both be lists
         """
         base_key = base_key or self.default_base_key
+        pipeline = self.redis.pipeline(transaction=False)
         if key:
-            return self.redis.hdel(base_key, key)
-        if isinstance(base_key, str):
-            base_key = [base_key]
-        return self.redis.delete(*base_key)
+            pipeline.hdel(base_key, key)
+        else:
+            if isinstance(base_key, str):
+                base_key = [base_key]
+            pipeline.delete(*base_key)
+        pipeline.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "base_key": base_key}))
+        ret, _ = pipeline.execute()
+        return ret
+
+
+_pending_invalidations = threading.local()
+
+
+def _flush_invalidations():
+    base_keys = getattr(_pending_invalidations, "base_keys", None)
+    if not base_keys:
+        return
+    _pending_invalidations.base_keys = set()
+    Cache().delete(base_key=sorted(base_keys))
+
+
+def invalidate_on_commit(base_key):
+    """
+    Deletes the cached entries of base_key once the current transaction is committed
+
+    The base keys invalidated during a transaction are deleted together, with a single round-trip
+    to Redis, and only once the changes that made them stale are visible to the content app, which
+    would otherwise cache the old responses again. Outside of a transaction they are deleted
+    immediately.
+
+    base_key can be a list to delete multiple sets of entries
+    """
+    if isinstance(base_key, str):
+        base_key = [base_key]
+    if not base_key:
+        return
+    if not hasattr(_pending_invalidations, "base_keys"):
+        _pending_invalidations.base_keys = set()
+    _pending_invalidations.base_keys.update(base_key)
+    # Callbacks registered in a savepoint that is rolled back are dropped, so one is registered
+    # for each call. The first one to run flushes all the pending base keys.
+    transaction.on_commit(_flush_invalidations)
 
 
 class SyncContentCache(Cache):
@@ -183,7 +440,12 @@ class SyncContentCache(Cache):
         entry = self.get(key, base_key)
         if not entry:
             return None
-        entry = json.loads(entry)
+        try:
+            entry, body = load_entry(entry)
+        except ValueError:
+            entry, body = {}, None
+        if body is not None:
+            entry["content"] = body
         response_type = entry.pop("type", None)
         if not response_type or response_type not in self.RESPONSE_TYPES:
             # Bad entry, delete from cache
@@ -198,6 +460,7 @@ class SyncContentCache(Cache):
         """Gets the response for the request and try to turn it into a cacheable entry"""
         response = handler(*args, **kwargs)
         entry = {"headers": dict(response.headers), "status": response.status_code}
+        body = None
         response.headers["X-PULP-CACHE"] = "MISS"
         if isinstance(response, HttpResponseRedirect):
             entry["redirect_to"] = str(response.headers["Location"])
@@ -206,14 +469,13 @@ class SyncContentCache(Cache):
             entry["path"] = str(response.filename)
             entry["type"] = "FileResponse"
         elif isinstance(response, HttpResponse):
-            entry["content"] = response.content.decode("utf-8")
+            body = response.content
             entry["type"] = "Response"
         else:
             # We don't cache StreamResponses or errors
             return response
 
-        # TODO look into smaller format, maybe some compression on the text
-        self.set(key, json.dumps(entry), expires, base_key=base_key)
+        self.set(key, dump_entry(entry, body), expires, base_key=base_key)
         return response
 
     def make_key(self, request):
@@ -238,6 +500,7 @@ class AsyncCache:
     def __init__(self):
         """Creates asynchronous cache instance"""
         self.redis = get_async_redis_connection()
+        self.local = get_local_cache()
 
     @aconnection_error_wrapper
     async def get(self, key, base_key=None):
@@ -245,7 +508,15 @@ class AsyncCache:
         base_key = base_key or self.default_base_key
         if key is None:
             return await self.redis.hgetall(base_key)
-        return await self.redis.hget(base_key, key)
+        if self.local is None:
+            return await self.redis.hget(base_key, key)
+        value = self.local.get(key, base_key)
+        if value is None:
+            generation = self.local.generation
+            value = await self.redis.hget(base_key, key)
+            if value is not None:
+                self.local.set(key, value, base_key, generation=generation)
+        return value
 
     @aconnection_error_wrapper
     async def set(self, key, value, expires=None, base_key=None):
@@ -254,6 +525,8 @@ class AsyncCache:
         ret = await self.redis.hset(base_key, key, value)
         if expires:
             await self.redis.expire(base_key, expires)
+        if self.local is not None:
+            self.local.set(key, value, base_key)
         return ret
 
     @aconnection_error_wrapper
@@ -281,20 +554,28 @@ class AsyncCache:
         """
         base_key = base_key or self.default_base_key
         if key:
-            return await self.redis.hdel(base_key, key)
-        if isinstance(base_key, str):
-            base_key = [base_key]
-        return await self.redis.delete(*base_key)
+            ret = await self.redis.hdel(base_key, key)
+        else:
+            if isinstance(base_key, str):
+                base_key = [base_key]
+            ret = await self.redis.delete(*base_key)
+        if self.local is not None:
+            self.local.delete(key=key, base_key=base_key)
+        await self.redis.publish(
+            INVALIDATION_CHANNEL, json.dumps({"key": key, "base_key": base_key})
+        )
+        return ret
 
 
 class AsyncContentCache(AsyncCache):
     """Cache object meant to be used for the content app"""
 
     RESPONSE_TYPES = {
-        "FileResponse": FileResponse,
+        "FileResponse": ArtifactFileResponse,
         "ArtifactResponse": ArtifactResponse,
         "Response": Response,
         "Redirect": HTTPFound,
+        "NotFound": HTTPNotFound,
     }
 
     def __init__(self, base_key=None, expires_ttl=None, keys=None, auth=None):
@@ -326,14 +607,16 @@ class AsyncContentCache(AsyncCache):
 
         async def cached_function(*args, **kwargs):
             request = self.get_request_from_args(args)
-            bk = self.default_base_key
-            if callable(self.default_base_key):
-                bk = await self.default_base_key(request, self)
-            if self.auth:
-                await self.auth(request, self, bk)
-            key = self.make_key(request)
-            # Check cache
-            response = await self.make_response(key, bk)
+            with timer(request, "cache"):
+                bk = self.default_base_key
+                if callable(self.default_base_key):
+                    bk = await self.default_base_key(request, self)
+                if self.auth:
+                    await self.auth(request, self, bk)
+                key = self.make_key(request)
+                # Check cache
+                response = await self.make_response(key, bk, request)
+            cache_lookups_total.inc("miss" if response is None else "hit")
             if response is None:
                 # Cache miss, create new entry
                 response = await self.make_entry(
@@ -349,25 +632,38 @@ class AsyncContentCache(AsyncCache):
             if isinstance(arg, Request):
                 return arg
 
-    async def make_response(self, key, base_key):
-        """Tries to find the cached entry and turn it into a proper response"""
+    async def make_response(self, key, base_key, request=None):
+        """
+        Tries to find the cached entry and turn it into a proper response
+
+        If the entry has validators matching the conditional headers of the request, the
+        response to the conditions is returned instead.
+        """
         entry = await self.get(key, base_key)
         if not entry:
             return None
-        entry = json.loads(entry)
-
-        if binary := entry.pop("body", None):
-            # raw binary data were translated to their hexadecimal representation and saved in
-            # the cache as a regular string; now, it is necessary to translate the data back
-            # to its original representation that will be returned in the HTTP response BODY:
-            # https://docs.aiohttp.org/en/stable/web_reference.html#response
-            entry["body"] = bytes.fromhex(binary)
+        try:
+            entry, body = load_entry(entry)
+        except ValueError:
+            entry, body = {}, None
+        if body is not None:
+            entry["body"] = body
 
         response_type = entry.pop("type", None)
+        expires_at = entry.pop("expires_at", None)
         if not response_type or response_type not in self.RESPONSE_TYPES:
             # Bad entry, delete from cache
-            self.delete(key, base_key)
+            await self.delete(key, base_key)
+            return None
+        if expires_at is not None and expires_at < time.time():
+            # Negative entries expire before the rest of the entries of their base key
+            await self.delete(key, base_key)
             return None
+        if request is not None and entry.get("status") == 200 and entry.get("headers"):
+            conditional = conditional_response(request, entry["headers"])
+            if conditional is not None:
+                conditional.headers.update({"X-PULP-CACHE": "HIT"})
+                return conditional
         response = self.RESPONSE_TYPES[response_type](**entry)
         response.headers.update({"X-PULP-CACHE": "HIT"})
         return response
@@ -378,8 +674,23 @@ class AsyncContentCache(AsyncCache):
             response = await handler(*args, **kwargs)
         except (HTTPSuccessful, HTTPFound) as e:
             response = e
+        except HTTPNotFound as e:
+            # Imported here, the content handler depends on the cache
+            from pulpcore.content.handler import PathNotResolved
+
+            # Only paths missing from the distribution are cached, failures of remotes are not
+            if NEGATIVE_TTL and isinstance(e, PathNotResolved):
+                entry = {
+                    "reason": e.reason,
+                    "text": e.text,
+                    "type": "NotFound",
+                    "expires_at": time.time() + NEGATIVE_TTL,
+                }
+                await self.set(key, dump_entry(entry), expires, base_key=base_key)
+            raise
 
         entry = {"headers": dict(response.headers), "status": response.status}
+        body = None
         response.headers.update({"X-PULP-CACHE": "MISS"})
         if isinstance(response, FileResponse):
             entry["path"] = str(response._path)
@@ -389,28 +700,40 @@ class AsyncContentCache(AsyncCache):
             entry["type"] = "ArtifactResponse"
         elif isinstance(response, (Response, HTTPSuccessful)):
             body = response.body
-            if isinstance(body, bytes):
-                # convert bytes into a json dump-able string
-                entry["body"] = body.hex()
-            else:
-                entry["text"] = getattr(body, "_value", body).decode("utf-8")
+            if not isinstance(body, bytes):
+                body = getattr(body, "_value", body)
             entry["type"] = "Response"
         elif isinstance(response, HTTPFound):
             entry["location"] = str(response.location)
             entry["type"] = "Redirect"
+        elif isinstance(response, BufferedStreamResponse) and response.body_copy is not None:
+            if response.status != 200:
+                return response
+            # The body is sent in one piece when the entry is served
+            for header in ("Content-Length", "Transfer-Encoding"):
+                entry["headers"].pop(header, None)
+            body = bytes(response.body_copy)
+            entry["type"] = "Response"
         else:
-            # We don't cache StreamResponses or errors
+            # We don't cache other StreamResponses or errors
             return response
 
-        # TODO look into smaller format, maybe some compression on the text
-        await self.set(key, json.dumps(entry), expires, base_key=base_key)
+        await self.set(key, dump_entry(entry, body), expires, base_key=base_key)
         return response
 
     def make_key(self, request):
         """Makes the key based off the request"""
         # Might potentially have to make this async if keys require async data from request
+        path = request.path
+        if path.endswith("/"):
+            # Different pages of a directory listing only differ by their query string
+            query = [
+                (name, request.query[name]) for name in LISTING_PARAMETERS if name in request.query
+            ]
+            if query:
+                path = "{}?{}".format(path, urlencode(query))
         all_keys = {
-            CacheKeys.path: request.path,
+            CacheKeys.path: path,
             CacheKeys.method: request.method,
             CacheKeys.host: request.url.host,
         }
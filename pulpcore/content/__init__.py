@@ -20,15 +20,23 @@ from django.db.utils import (  # noqa: E402: module level not at top of file
 )
 
 from pulpcore.app.apps import pulp_plugin_configs  # noqa: E402: module level not at top of file
+from pulpcore.cache.cache import get_local_cache  # noqa: E402: module level not at top of file
 from pulpcore.app.models import ContentAppStatus  # noqa: E402: module level not at top of file
+from pulpcore.metrics import (  # noqa: E402: module level not at top of file
+    add_server_timing,
+    instrument,
+    metrics_view,
+)
 
 from .handler import Handler  # noqa: E402: module level not at top of file
+from .routing import listen_for_changes  # noqa: E402: module level not at top of file
 from .authentication import authenticate  # noqa: E402: module level not at top of file
 
 
 log = logging.getLogger(__name__)
 
-app = web.Application(middlewares=[authenticate])
+app = web.Application(middlewares=[instrument, authenticate])
+app.on_response_prepare.append(add_server_timing)
 
 CONTENT_MODULE_NAME = "content"
 
@@ -69,6 +77,10 @@ async def server(*args, **kwargs):
     os.chdir(settings.WORKING_DIRECTORY)
 
     asyncio.ensure_future(_heartbeat())
+    if settings.CONTENT_APP_DISTRIBUTION_CACHE:
+        asyncio.ensure_future(listen_for_changes())
+    if settings.CACHE_ENABLED and get_local_cache() is not None:
+        asyncio.ensure_future(get_local_cache().listen_for_invalidations())
     for pulp_plugin in pulp_plugin_configs():
         if pulp_plugin.name != "pulpcore.app":
             content_module_name = "{name}.{module}".format(
@@ -76,6 +88,8 @@ async def server(*args, **kwargs):
             )
             with suppress(ModuleNotFoundError):
                 import_module(content_module_name)
+    if settings.CONTENT_APP_METRICS_PATH:
+        app.add_routes([web.get(settings.CONTENT_APP_METRICS_PATH, metrics_view)])
     path_prefix = settings.CONTENT_PATH_PREFIX
     if settings.DOMAIN_ENABLED:
         path_prefix = path_prefix + "{pulp_domain}/"
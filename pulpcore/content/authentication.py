@@ -1,52 +1,105 @@
 import gettext
+import hashlib
 import logging
+import time
+from collections import OrderedDict
 
 from asgiref.sync import sync_to_async
 from aiohttp.web import middleware
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.db.utils import InterfaceError, OperationalError
 from django.http.request import HttpRequest
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
 from rest_framework.views import APIView
 from rest_framework.exceptions import APIException
 
+from . import routing
 from .handler import Handler, PathNotResolved
+from pulpcore.app.authentication import PulpRemoteUserAuthentication
 from pulpcore.app.models import Domain
 from pulpcore.app.util import set_domain
+from pulpcore.metrics import timer
 
 log = logging.getLogger(__name__)
 _ = gettext.gettext
 
+# The maximum number of authenticated credentials kept in memory
+AUTHENTICATION_CACHE_MAX_ENTRIES = 10000
+
+# The entries of the request META, besides REMOTE_USER_ENVIRON_NAME, that credentials are read from
+CREDENTIALS_META = ("HTTP_AUTHORIZATION", "HTTP_COOKIE")
+
+# The authentication classes that only read credentials from these entries
+CACHED_AUTHENTICATORS = (BasicAuthentication, SessionAuthentication, PulpRemoteUserAuthentication)
+
+_authenticated = OrderedDict()
+
 
 @middleware
 async def authenticate(request, handler):
     """Authenticates the request to the content app using the DRF authentication classes"""
+    with timer(request, "auth"):
+        await _authenticate(request)
+    return await handler(request)
+
+
+async def _authenticate(request):
+    domain = await lookup_domain(request)
+    if domain is not None:
+        set_domain(domain)
+        if await _is_unguarded(request):
+            # Nothing is going to look at the user
+            request["user"] = AnonymousUser()
+            request["auth"] = None
+            request["drf_request"] = None
+            return
+
     django_request = convert_request(request)
     fake_view = APIView()
+    credentials = _credentials_key(django_request)
+    cached = _get_authenticated(credentials) if credentials is not None else None
 
-    def _authenticate_blocking():
-        drf_request = fake_view.initialize_request(django_request)
-        try:
-            try:
-                domain = validate_domain(request)
-                fake_view.perform_authentication(drf_request)
-            except (InterfaceError, OperationalError):
-                Handler._reset_db_connection()
-                domain = validate_domain(request)
-                fake_view.perform_authentication(drf_request)
-
-            setattr(drf_request, "pulp_domain", domain)
-        except APIException as e:
-            log.warning(_('"{} {}" "{}": {}').format(request.method, request.path, request.host, e))
+    if domain is not None and cached is not None:
+        auth_request = fake_view.initialize_request(django_request)
+        auth_request.user, auth_request.auth = cached
+        setattr(auth_request, "pulp_domain", domain)
+    else:
 
-        return drf_request
+        def _authenticate_blocking():
+            drf_request = fake_view.initialize_request(django_request)
+            try:
+                try:
+                    domain = validate_domain(request)
+                    fake_view.perform_authentication(drf_request)
+                except (InterfaceError, OperationalError):
+                    Handler._reset_db_connection()
+                    domain = validate_domain(request)
+                    fake_view.perform_authentication(drf_request)
+
+                setattr(drf_request, "pulp_domain", domain)
+            except APIException as e:
+                log.warning(
+                    _('"{} {}" "{}": {}').format(request.method, request.path, request.host, e)
+                )
+                return drf_request, False
+
+            return drf_request, True
+
+        generation = routing.permissions_generation()
+        auth_request, authenticated = await sync_to_async(_authenticate_blocking)()
+        authenticator = auth_request.successful_authenticator if authenticated else None
+        if (
+            authenticated
+            and credentials is not None
+            and (authenticator is None or isinstance(authenticator, CACHED_AUTHENTICATORS))
+        ):
+            _set_authenticated(credentials, generation, auth_request.user, auth_request.auth)
 
-    auth_request = await sync_to_async(_authenticate_blocking)()
     request["user"] = auth_request.user
     request["auth"] = auth_request.auth
     request["drf_request"] = auth_request
 
-    return await handler(request)
-
 
 def convert_request(request):
     """
@@ -70,6 +123,13 @@ def convert_request(request):
     return djr
 
 
+def _domain_not_found(request, domain_name):
+    path = request.match_info.get("path", "")
+    if settings.DOMAIN_ENABLED:
+        path = domain_name + "/" + path
+    return PathNotResolved(path)
+
+
 def validate_domain(request):
     """
     Ensures the request is inside a proper Domain.
@@ -78,10 +138,109 @@ def validate_domain(request):
     try:
         domain = Domain.objects.get(name=domain_name)
     except Domain.DoesNotExist:
-        path = request.match_info.get("path", "")
-        if settings.DOMAIN_ENABLED:
-            path = domain_name + "/" + path
-        raise PathNotResolved(path)
+        raise _domain_not_found(request, domain_name)
 
     set_domain(domain)
     return domain
+
+
+async def lookup_domain(request):
+    """
+    Find the Domain of the request in the in-memory domains of the content app.
+
+    Returns:
+        :class:`~pulpcore.app.models.Domain`: The domain of the request, or None if the in-memory
+            domains are not available.
+
+    Raises:
+        PathNotResolved: When the domain doesn't exist.
+    """
+    if not settings.CONTENT_APP_DISTRIBUTION_CACHE:
+        return None
+    domain_name = request.match_info.get("pulp_domain", "default")
+    try:
+        return await routing.get_domain(domain_name)
+    except Domain.DoesNotExist:
+        raise _domain_not_found(request, domain_name)
+
+
+async def _is_unguarded(request):
+    """
+    Whether the request is for content of a distribution without a content guard.
+
+    Only requests handled by :meth:`Handler.stream_content` are considered, and only if their
+    distribution can be matched without querying the database.
+    """
+    content_handler = getattr(request.match_info.handler, "__self__", None)
+    if not isinstance(content_handler, Handler) or "path" not in request.match_info:
+        return False
+    try:
+        distro = await content_handler._lookup_distribution(request.match_info["path"])
+    except PathNotResolved:
+        return False
+    return distro is not None and distro.content_guard_id is None
+
+
+def _credentials_key(django_request):
+    """
+    Get a key identifying the credentials sent with a request.
+
+    The credentials are the entries of the request META that the authentication classes whose
+    users are remembered read, see ``CREDENTIALS_META`` and ``REMOTE_USER_ENVIRON_NAME``.
+
+    Args:
+        django_request (django.http.HttpRequest): The request, as made by :func:`convert_request`.
+
+    Returns:
+        str: The key, or None if the request has none of these credentials, in which case the
+            user it is authenticated as is not remembered.
+    """
+    names = CREDENTIALS_META + (settings.REMOTE_USER_ENVIRON_NAME,)
+    values = [django_request.META.get(name) for name in names]
+    if not any(values):
+        return None
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update((value or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _get_authenticated(credentials):
+    """
+    Get the user and auth of credentials authenticated less than
+    ``CONTENT_APP_AUTHENTICATION_CACHE_TTL`` seconds ago.
+
+    What was remembered before the content app was told that permissions changed is dropped.
+
+    Returns:
+        tuple: The user and auth, or None.
+    """
+    entry = _authenticated.get(credentials)
+    if entry is None:
+        return None
+    expires, generation, user, auth = entry
+    if time.monotonic() >= expires or generation != routing.permissions_generation():
+        del _authenticated[credentials]
+        return None
+    return user, auth
+
+
+def _set_authenticated(credentials, generation, user, auth):
+    """
+    Remember the user and auth the credentials were authenticated as.
+
+    Args:
+        credentials (str): The key of the credentials, see :func:`_credentials_key`.
+        generation (int): What :func:`~pulpcore.content.routing.permissions_generation` returned
+            before the credentials were authenticated.
+        user: The user the credentials were authenticated as.
+        auth: The auth the credentials were authenticated with.
+    """
+    ttl = settings.CONTENT_APP_AUTHENTICATION_CACHE_TTL
+    if not ttl or generation != routing.permissions_generation():
+        return
+    _authenticated.pop(credentials, None)
+    _authenticated[credentials] = (time.monotonic() + ttl, generation, user, auth)
+    while len(_authenticated) > AUTHENTICATION_CACHE_MAX_ENTRIES:
+        _authenticated.popitem(last=False)
@@ -1,11 +1,14 @@
 import asyncio
 import logging
 import os
-import re
+import sys
+from contextlib import nullcontext, suppress
+from itertools import islice
 from gettext import gettext as _
 
-from aiohttp.client_exceptions import ClientResponseError
-from aiohttp.web import FileResponse, StreamResponse, HTTPOk
+from aiohttp.client_exceptions import ClientError, ClientResponseError
+from aiohttp import hdrs
+from aiohttp.web import HTTPOk
 from aiohttp.web_exceptions import (
     HTTPForbidden,
     HTTPFound,
@@ -18,7 +21,13 @@ from asgiref.sync import sync_to_async
 
 import django
 
-from pulpcore.responses import ArtifactResponse
+from pulpcore.responses import (
+    ArtifactFileResponse,
+    ArtifactResponse,
+    BufferedStreamResponse,
+    artifact_validators,
+    conditional_response,
+)
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pulpcore.app.settings")
 django.setup()
@@ -45,15 +54,50 @@ from pulpcore.app.models import (  # noqa: E402: module level not at top of file
     RemoteArtifact,
 )
 from pulpcore.app import mime_types  # noqa: E402: module level not at top of file
-from pulpcore.app.util import get_domain, cache_key  # noqa: E402: module level not at top of file
+from pulpcore.app.util import (  # noqa: E402: module level not at top of file
+    cache_key,
+    get_domain,
+    set_domain,
+)
 
 from pulpcore.exceptions import UnsupportedDigestValidationError  # noqa: E402
+from pulpcore.metrics import timer  # noqa: E402
 
-from jinja2 import Template  # noqa: E402: module level not at top of file
 from pulpcore.cache import AsyncContentCache  # noqa: E402
+from pulpcore.cache.cache import STREAMED_RESPONSE_MAX_SIZE  # noqa: E402
+
+from . import inflight, routing, sources  # noqa: E402
+from .listing import HtmlListing, directory_entries, get_listing, merge_entries  # noqa: E402
+from .saving import SaveQueue  # noqa: E402
 
 log = logging.getLogger(__name__)
 
+# The number of directory listing entries fetched from the database at once
+LISTING_BATCH_SIZE = 1000
+
+# The errors of a source that the next source of a file is tried after
+SOURCE_ERRORS = (ClientError, asyncio.TimeoutError, UnsupportedDigestValidationError)
+
+# Downloads running in the background, see Handler._download_in_background()
+_background_downloads = set()
+
+
+def _background_download_done(task):
+    _background_downloads.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning("Download in the background failed: {}".format(task.exception()))
+
+
+def _queued_save_done(future):
+    if not future.cancelled() and future.exception() is not None:
+        log.warning("Saving a downloaded artifact failed: {}".format(future.exception()))
+
+
+class RaceLost(Exception):
+    """
+    Another source of the file started sending it to the client first.
+    """
+
 
 class PathNotResolved(HTTPNotFound):
     """
@@ -83,25 +127,59 @@ class DistroListings(HTTPOk):
         if settings.HIDE_GUARDED_DISTRIBUTIONS:
             distros = distros.filter(content_guard__isnull=True)
         base_paths = (
-            distros.annotate(rel_path=models.functions.Substr("base_path", 1 + len(path)))
-            .annotate(
-                path=models.Func(
-                    models.F("rel_path"),
-                    function="SUBSTRING",
-                    template="%(function)s(%(expressions)s,'([^/]*)')",
-                )
-            )
-            .order_by("path")
-            .values_list("path", flat=True)
-            .distinct()
+            distros.filter(base_path__startswith=path)
+            # Sort by code point, like Python does, so the entries can be found in one pass
+            .annotate(sort_path=models.functions.Collate("base_path", "C"))
+            .order_by("sort_path")
+            .values_list("base_path", flat=True)
         )
-        directory_list = (f"{b}/" for b in base_paths)
+        rows = ((f"{base_path}/", None) for base_path in base_paths.iterator())
+        directory_list = [name for name, date in directory_entries(rows, path)]
         if path == "":
             path = settings.CONTENT_PATH_PREFIX
         html = Handler.render_html(directory_list, path=path)
         super().__init__(body=html, headers={"Content-Type": "text/html"})
 
 
+class ResolvedRequest:
+    """
+    What a request to the content app resolved to, see :meth:`Handler.resolve_request`.
+
+    Args:
+        distribution (:class:`~pulpcore.plugin.models.Distribution`): The detail object of the
+            matched distribution.
+        relative_path (str): The path requested, relative to the base path of the distribution.
+            Requests for a directory with an index.html resolve to that file.
+        guarded (bool): Whether a content guard permitted the request.
+
+    Attributes:
+        content_handler_result: The not-None result of :meth:`Distribution.content_handler`.
+        repository (:class:`~pulpcore.plugin.models.Repository`): The repository served.
+        publication (:class:`~pulpcore.plugin.models.Publication`): The publication served.
+        repository_version (:class:`~pulpcore.plugin.models.RepositoryVersion`): The repository
+            version served.
+        list_directory (bool): Whether the request is for a directory listing.
+        content_artifact (:class:`~pulpcore.plugin.models.ContentArtifact`): The content artifact
+            to serve, with its artifact and the artifact's domain.
+        remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The unsaved remote
+            artifact to stream from the remote of the distribution.
+        extra (dict): Whatever else the handler of a plugin looked up.
+    """
+
+    def __init__(self, distribution, relative_path, guarded=False):
+        self.distribution = distribution
+        self.relative_path = relative_path
+        self.guarded = guarded
+        self.content_handler_result = None
+        self.repository = None
+        self.publication = None
+        self.repository_version = None
+        self.list_directory = False
+        self.content_artifact = None
+        self.remote_artifact = None
+        self.extra = {}
+
+
 class ArtifactNotFound(Exception):
     """
     The artifact associated with a published-artifact does not exist.
@@ -190,7 +268,14 @@ class Handler:
             str: The base-path associated with this request
         """
         path = request.match_info["path"]
+        distro = await cls._lookup_distribution(path)
+        if distro is not None:
+            return cache_key(distro.base_path)
         base_paths = cls._base_paths(path)
+        if cached.local is not None:
+            for base_path in base_paths:
+                if cached.local.exists(cache_key(base_path)):
+                    return cache_key(base_path)
         multiplied_base_paths = []
         for i, base_path in enumerate(base_paths):
             copied_by_index_base_path = cache_key([base_path for _ in range(i + 1)])
@@ -216,7 +301,7 @@ class Handler:
         present = await cached.get(guard_key, base_key=base_key)
         if present == b"True" or present is None:
             path = request.match_info["path"]
-            distro = await sync_to_async(cls._match_distribution)(path)
+            distro = await cls._get_distribution(path)
             try:
                 guard = await sync_to_async(cls._permit)(request, distro)
             except HTTPForbidden:
@@ -308,6 +393,56 @@ class Handler:
 
         raise PathNotResolved(path)
 
+    @classmethod
+    async def _lookup_distribution(cls, path):
+        """
+        Match a distribution in the in-memory distribution table.
+
+        Args:
+            path (str): The path component of the URL.
+
+        Returns:
+            The detail object of the matched distribution, or None if the table is not available
+            or the path could be a partial base path that has to be listed.
+
+        Raises:
+            PathNotResolved: when not matched.
+        """
+        if not settings.CONTENT_APP_DISTRIBUTION_CACHE:
+            return None
+        distro_model = cls.distribution_model or Distribution
+        distributions = await routing.get_distributions(distro_model, get_domain())
+        if distributions is None:
+            return None
+        base_paths = cls._base_paths(path)
+        for base_path in base_paths:
+            distro = distributions.get(base_path)
+            if distro is not None:
+                return distro
+        if path.rstrip("/") in base_paths:
+            return None
+        raise PathNotResolved(path)
+
+    @classmethod
+    async def _get_distribution(cls, path):
+        """
+        Match a distribution, preferably without querying the database.
+
+        Args:
+            path (str): The path component of the URL.
+
+        Returns:
+            The detail object of the matched distribution.
+
+        Raises:
+            DistroListings: when multiple matches are possible.
+            PathNotResolved: when not matched.
+        """
+        distro = await cls._lookup_distribution(path)
+        if distro is None:
+            distro = await sync_to_async(cls._match_distribution)(path)
+        return distro
+
     @staticmethod
     def _permit(request, distribution):
         """
@@ -326,14 +461,30 @@ class Handler:
         guard = distribution.content_guard
         if not guard:
             return False
+        guard = guard.cast()
+        decision_key = guard.permit_cache_key(request)
+        if decision_key is not None:
+            decision_key = (guard.pk, guard.pulp_last_updated, decision_key)
+            decision = routing.get_guard_decision(decision_key)
+            if decision is not None:
+                permitted, reason = decision
+                if not permitted:
+                    raise HTTPForbidden(reason=reason)
+                return True
+        generation = routing.permissions_generation()
         try:
-            guard.cast().permit(request)
+            with timer(request, "guard"):
+                guard.permit(request)
         except PermissionError as pe:
             log.debug(
                 'Path: %(p)s not permitted by guard: "%(g)s" reason: %(r)s',
                 {"p": request.path, "g": guard.name, "r": str(pe)},
             )
+            if decision_key is not None:
+                routing.set_guard_decision(decision_key, generation, False, str(pe))
             raise HTTPForbidden(reason=str(pe))
+        if decision_key is not None:
+            routing.set_guard_decision(decision_key, generation, True)
         return True
 
     @staticmethod
@@ -353,6 +504,30 @@ class Handler:
             headers["Content-Type"] = content_type
         return headers
 
+    @staticmethod
+    def _stream_response(request, headers, listing=False):
+        """
+        Create the response used to stream content to the client.
+
+        Small responses to plain GET requests are kept in memory, so they can be cached. Directory
+        listings are kept in memory whatever their size, like they were before they were streamed.
+
+        Args:
+            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+            headers (dict): A dictionary of response headers.
+            listing (bool): Whether the response is a directory listing.
+
+        Returns:
+            :class:`~pulpcore.responses.BufferedStreamResponse`: The response.
+        """
+        max_buffer_size = 0
+        if settings.CACHE_ENABLED and request.method == hdrs.METH_GET:
+            if listing:
+                max_buffer_size = sys.maxsize
+            elif hdrs.RANGE not in request.headers:
+                max_buffer_size = STREAMED_RESPONSE_MAX_SIZE
+        return BufferedStreamResponse(headers=headers, max_buffer_size=max_buffer_size)
+
     @staticmethod
     def render_html(directory_list, path="", dates=None):
         """
@@ -366,33 +541,80 @@ class Handler:
         """
         if dates is None:
             dates = dict()
-        template = Template(
-            """
-<html>
-<head><title>Index of {{ path }}</title></head>
-<body bgcolor="white">
-<h1>Index of {{ path }}</h1>
-<hr><pre>
-{%- if not root %}<a href="../">../</a>{% endif %}
-{% for name in dir_list -%}
-{% if dates.get(name, "") -%}
-{% set date =  dates.get(name).strftime("%d-%b-%Y %H:%M") -%}
-{% else -%}
-{% set date = "" -%}
-{% endif -%}
-<a href="{{ name|e }}">{{ name|e }}</a>{% for number in range(100 - name|e|length) %} """
-            """{% endfor %}{{ date }}
-{% endfor -%}
-</pre><hr></body>
-</html>
-"""
-        )
-        return template.render(
-            dir_list=sorted(directory_list),
-            dates=dates,
-            path=path,
-            root=path == settings.CONTENT_PATH_PREFIX,
-        )
+        entries = [(name, dates.get(name)) for name in sorted(directory_list)]
+        listing = HtmlListing(path)
+        return "".join((listing.header(), listing.entries(entries), listing.footer()))
+
+    @staticmethod
+    def _listing_querysets(repo_version, publication):
+        """
+        Get the querysets of the relative paths a directory listing is made of.
+
+        Args:
+            repo_version (:class:`~pulpcore.app.models.RepositoryVersion`): The repository version
+            publication (:class:`~pulpcore.app.models.Publication`): Publication
+
+        Returns:
+            list: Tuples of a queryset of objects with a ``relative_path`` and the name of the
+                field holding the date to show for them.
+        """
+        querysets = []
+        if publication:
+            querysets.append(
+                (publication.published_artifact.all(), "content_artifact__pulp_created")
+            )
+            if publication.pass_through:
+                repo_version = publication.repository_version
+        if repo_version:
+            if repo_version.content_artifacts_indexed:
+                queryset = repo_version.content_paths.all()
+                querysets.append((queryset, "content_artifact__pulp_created"))
+            else:
+                queryset = ContentArtifact.objects.filter(content__in=repo_version.content)
+                querysets.append((queryset, "pulp_created"))
+        return querysets
+
+    @staticmethod
+    def _directory_entries(querysets, path, after=None, limit=None, extra=()):
+        """
+        Get the sorted entries of a directory.
+
+        The database only returns the first component of the relative paths below ``path``, one row
+        per entry, so the cost of a listing depends on the number of entries shown and not on the
+        number of files below the directory.
+
+        Args:
+            querysets (list): The querysets to list, see :meth:`_listing_querysets`.
+            path (str): The relative path of the directory, empty or ending with a slash.
+            after (str): Only return the entries whose names sort after this one.
+            limit (int): The maximum number of entries to return.
+            extra (iterable): Additional names of entries to merge in.
+
+        Returns:
+            list: Tuples of the name and date of the entries. Names of directories end with a
+                slash.
+        """
+        streams = [[(name, None) for name in sorted(extra) if after is None or name > after]]
+        for queryset, date_field in querysets:
+            name = models.Func(
+                models.functions.Substr("relative_path", 1 + len(path)),
+                function="SUBSTRING",
+                template="%(function)s(%(expressions)s,'^[^/]*/*')",
+            )
+            rows = (
+                queryset.filter(relative_path__startswith=path)
+                # Sort by code point, like Python does, so the querysets can be merged
+                .annotate(name=models.functions.Collate(name, "C"))
+                .values_list("name")
+                .annotate(date=models.Max(date_field))
+                .order_by("name")
+            )
+            if after is not None:
+                rows = rows.filter(name__gt=after)
+            if limit is not None:
+                rows = rows[:limit]
+            streams.append((name, date) for name, date in rows if name)
+        return list(islice(merge_entries(*streams), limit))
 
     async def list_directory(self, repo_version, publication, path):
         """
@@ -411,188 +633,177 @@ class Handler:
             Set of strings representing the files and directories in the directory listing.
         """
 
-        def file_or_directory_name(directory_path, relative_path):
-            result = re.match(r"({})([^\/]*)(\/*)".format(directory_path), relative_path)
-            return "{}{}".format(result.groups()[1], result.groups()[2])
-
         def list_directory_blocking():
             if not publication and not repo_version:
                 raise Exception("Either a repo_version or publication is required.")
             if publication and repo_version:
                 raise Exception("Either a repo_version or publication can be specified.")
-            directory_list = set()
-            dates = {}
-            if publication:
-                pas = publication.published_artifact.select_related("content_artifact").filter(
-                    relative_path__startswith=path
-                )
-                for pa in pas:
-                    name = file_or_directory_name(path, pa.relative_path)
-                    directory_list.add(name)
-                    dates.update({name: pa.content_artifact.pulp_created})
-
-                if publication.pass_through:
-                    cas = ContentArtifact.objects.filter(
-                        content__in=publication.repository_version.content,
-                        relative_path__startswith=path,
-                    )
-                    for ca in cas:
-                        name = file_or_directory_name(path, ca.relative_path)
-                        directory_list.add(name)
-                        dates.update({name: ca.pulp_created})
-
-            if repo_version:
-                cas = ContentArtifact.objects.filter(
-                    content__in=repo_version.content, relative_path__startswith=path
-                )
-                for ca in cas:
-                    name = file_or_directory_name(path, ca.relative_path)
-                    directory_list.add(name)
-                    dates.update({name: ca.pulp_created})
-
-            if directory_list:
-                return directory_list, dates
+            querysets = self._listing_querysets(repo_version, publication)
+            dates = dict(self._directory_entries(querysets, path))
+            if dates:
+                return set(dates), dates
             else:
                 raise PathNotResolved(path)
 
         return await sync_to_async(list_directory_blocking)()
 
-    async def _match_and_stream(self, path, request):
+    async def _stream_directory_listing(self, request, distro, repo_version, publication, path):
         """
-        Match the path and stream results either from the filesystem or by downloading new data.
+        Stream the HTML listing of a directory to the client.
 
-        After deciding the client can access the distribution at ``path``, this function calls
-        :meth:`Distribution.content_handler`. If that function returns a not-None result, it is
-        returned to the client.
+        The entries are fetched from the database in batches of ``LISTING_BATCH_SIZE`` while the
+        listing is sent. With ``CONTENT_APP_LISTING_PAGE_SIZE`` set, a listing ends after that many
+        entries with a link to the next page, which starts after the name given by the ``after``
+        query parameter.
 
-        Then the publication linked to the Distribution is used to determine what content should
-        be served. If ``path`` is a directory entry (i.e. not a file), the directory contents
-        are served to the client. This method calls
-        :meth:`Distribution.content_handler_list_directory` to acquire any additional entries the
-        Distribution's content_handler might serve in that directory. If there is an Artifact to be
-        served, it is served to the client.
+        Args:
+            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+            distro (:class:`~pulpcore.plugin.models.Distribution`): The matched distribution.
+            repo_version (:class:`~pulpcore.app.models.RepositoryVersion`): The repository version
+            publication (:class:`~pulpcore.app.models.Publication`): Publication
+            path (str): The relative path of the directory.
 
-        If there's no publication, the above paragraph is applied to the latest repository linked
-        to the matched Distribution.
+        Raises:
+            PathNotResolved: The directory doesn't exist.
 
-        Finally, when nothing is served to client yet, we check if there is a remote for the
-        Distribution. If so, the Artifact is pulled from the remote and streamed to the client.
+        Returns:
+            :class:`aiohttp.web.StreamResponse`: The response streamed back to the client.
+        """
+        page_size = settings.CONTENT_APP_LISTING_PAGE_SIZE
+        querysets = self._listing_querysets(repo_version, publication)
+        extra = await sync_to_async(distro.content_handler_list_directory)(path)
+        listed = 0
+
+        async def get_batch(after):
+            limit = LISTING_BATCH_SIZE
+            if page_size:
+                limit = min(limit, page_size - listed)
+            # Ask for one more entry to know whether there are more
+            batch = await sync_to_async(self._directory_entries)(
+                querysets, path, after=after, limit=limit + 1, extra=extra
+            )
+            return batch[:limit], len(batch) > limit
+
+        batch, more = await get_batch(request.query.get("after"))
+        if not batch:
+            raise PathNotResolved(path)
+
+        listing = get_listing(request.query.get("format"), request.path)
+        headers = {"Content-Type": listing.content_type}
+        response = self._stream_response(request, headers, listing=True)
+        await response.prepare(request)
+        if request.method == hdrs.METH_HEAD:
+            await response.write_eof()
+            return response
+        await response.write(listing.header().encode())
+        while True:
+            await response.write(listing.entries(batch).encode())
+            listed += len(batch)
+            if not more or (page_size and listed >= page_size):
+                break
+            batch, more = await get_batch(batch[-1][0])
+        next_page = batch[-1][0] if more else None
+        await response.write(listing.footer(next_page).encode())
+        await response.write_eof()
+        return response
+
+    def resolve_request(self, request, path, distro=None):
+        """
+        Look up everything needed to serve a request in the database.
+
+        This runs in a single thread hop for each request. It matches the distribution, checks the
+        content guard, calls :meth:`Distribution.content_handler` and finds the publication or
+        repository version and the content to serve.
+
+        Handlers of plugins can extend this to look up more, calling ``super()`` and storing the
+        results in :attr:`ResolvedRequest.extra`.
 
         Args:
+            request(:class:`~aiohttp.web.Request`): The request to serve.
             path (str): The path component of the URL.
-            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+            distro (:class:`~pulpcore.plugin.models.Distribution`): The detail object of the
+                distribution if it was already matched.
 
         Raises:
-            PathNotResolved: The path could not be matched to a published file.
-            PermissionError: When not permitted.
+            DistroListings: when multiple distributions can be matched.
+            PathNotResolved: when no distribution can be matched.
+            :class:`aiohttp.web_exceptions.HTTPForbidden`: When not permitted.
+            MultipleObjectsReturned: When multiple content artifacts match the path.
 
         Returns:
-            :class:`aiohttp.web.StreamResponse` or :class:`aiohttp.web.FileResponse`: The response
-                streamed back to the client.
+            :class:`ResolvedRequest`: What the request resolved to.
         """
-        distro = await sync_to_async(self._match_distribution)(path)
-
-        await sync_to_async(self._permit)(request, distro)
+        if distro is None:
+            distro = self._match_distribution(path)
+        guarded = self._permit(request, distro)
 
         rel_path = path.lstrip("/")
         rel_path = rel_path[len(distro.base_path) :]
         rel_path = rel_path.lstrip("/")
 
-        content_handler_result = await sync_to_async(distro.content_handler)(rel_path)
-        if content_handler_result is not None:
-            return content_handler_result
-
-        headers = self.response_headers(rel_path)
+        resolved = ResolvedRequest(distro, rel_path, guarded)
+        resolved.content_handler_result = distro.content_handler(rel_path)
+        if resolved.content_handler_result is not None:
+            return resolved
 
         repository = distro.repository
         publication = distro.publication
         repo_version = distro.repository_version
 
         if repository:
+            # Search for publication serving the closest latest version
+            if not publication:
+                try:
+                    versions = repository.versions.all()
+                    publications = Publication.objects.filter(
+                        repository_version__in=versions, complete=True
+                    )
+                    publication = publications.select_related("repository_version").latest(
+                        "repository_version", "pulp_created"
+                    )
+                    repo_version = publication.repository_version
+                except ObjectDoesNotExist:
+                    pass
 
-            def get_latest_publication_or_version_blocking():
-                nonlocal repo_version
-                nonlocal publication
-
-                # Search for publication serving the closest latest version
-                if not publication:
-                    try:
-                        versions = repository.versions.all()
-                        publications = Publication.objects.filter(
-                            repository_version__in=versions, complete=True
-                        )
-                        publication = publications.select_related("repository_version").latest(
-                            "repository_version", "pulp_created"
-                        )
-                        repo_version = publication.repository_version
-                    except ObjectDoesNotExist:
-                        pass
-
-                if not repo_version:
-                    repo_version = repository.latest_version()
+            if not repo_version:
+                repo_version = repository.latest_version()
 
-            await sync_to_async(get_latest_publication_or_version_blocking)()
+        resolved.repository = repository
+        resolved.publication = publication
+        resolved.repository_version = repo_version
 
         if publication:
             if rel_path == "" or rel_path[-1] == "/":
-                try:
-                    index_path = "{}index.html".format(rel_path)
-
-                    await sync_to_async(publication.published_artifact.get)(
-                        relative_path=index_path
-                    )
-
-                    rel_path = index_path
-                    headers = self.response_headers(rel_path)
-                except ObjectDoesNotExist:
-                    dir_list, dates = await self.list_directory(None, publication, rel_path)
-                    dir_list.update(
-                        await sync_to_async(distro.content_handler_list_directory)(rel_path)
-                    )
-                    return HTTPOk(
-                        headers={"Content-Type": "text/html"},
-                        body=self.render_html(dir_list, path=request.path, dates=dates),
-                    )
+                index_path = "{}index.html".format(rel_path)
+                if not publication.published_artifact.filter(relative_path=index_path).exists():
+                    resolved.list_directory = True
+                    return resolved
+                rel_path = resolved.relative_path = index_path
 
             # published artifact
             try:
-
-                def get_contentartifact_blocking():
-                    return (
-                        publication.published_artifact.select_related(
-                            "content_artifact",
-                            "content_artifact__artifact",
-                            "content_artifact__artifact__pulp_domain",
-                        )
-                        .get(relative_path=rel_path)
-                        .content_artifact
+                resolved.content_artifact = (
+                    publication.published_artifact.select_related(
+                        "content_artifact",
+                        "content_artifact__artifact",
+                        "content_artifact__artifact__pulp_domain",
                     )
-
-                ca = await sync_to_async(get_contentartifact_blocking)()
+                    .get(relative_path=rel_path)
+                    .content_artifact
+                )
+                return resolved
             except ObjectDoesNotExist:
                 pass
-            else:
-                if ca.artifact:
-                    return await self._serve_content_artifact(ca, headers, request)
-                else:
-                    return await self._stream_content_artifact(
-                        request, StreamResponse(headers=headers), ca
-                    )
 
             # pass-through
             if publication.pass_through:
                 try:
-
-                    def get_contentartifact_blocking():
-                        ca = ContentArtifact.objects.select_related(
-                            "artifact", "artifact__pulp_domain"
-                        ).get(
-                            content__in=publication.repository_version.content,
-                            relative_path=rel_path,
-                        )
-                        return ca
-
-                    ca = await sync_to_async(get_contentartifact_blocking)()
+                    resolved.content_artifact = (
+                        publication.repository_version.get_content_artifacts(rel_path)
+                        .select_related("artifact", "artifact__pulp_domain")
+                        .get()
+                    )
+                    return resolved
                 except MultipleObjectsReturned:
                     log.error(
                         "Multiple (pass-through) matches for {b}/{p}",
@@ -601,45 +812,22 @@ class Handler:
                     raise
                 except ObjectDoesNotExist:
                     pass
-                else:
-                    if ca.artifact:
-                        return await self._serve_content_artifact(ca, headers, request)
-                    else:
-                        return await self._stream_content_artifact(
-                            request, StreamResponse(headers=headers), ca
-                        )
 
         if repo_version and not publication and not distro.SERVE_FROM_PUBLICATION:
             if rel_path == "" or rel_path[-1] == "/":
                 index_path = "{}index.html".format(rel_path)
-
-                def contentartifact_exists_blocking():
-                    return ContentArtifact.objects.filter(
-                        content__in=repo_version.content, relative_path=index_path
-                    ).exists()
-
-                contentartifact_exists = await sync_to_async(contentartifact_exists_blocking)()
-                if contentartifact_exists:
-                    rel_path = index_path
-                else:
-                    dir_list, dates = await self.list_directory(repo_version, None, rel_path)
-                    dir_list.update(
-                        await sync_to_async(distro.content_handler_list_directory)(rel_path)
-                    )
-                    return HTTPOk(
-                        headers={"Content-Type": "text/html"},
-                        body=self.render_html(dir_list, path=request.path, dates=dates),
-                    )
+                if not repo_version.get_content_artifacts(index_path).exists():
+                    resolved.list_directory = True
+                    return resolved
+                rel_path = resolved.relative_path = index_path
 
             try:
-
-                def get_contentartifact_blocking():
-                    ca = ContentArtifact.objects.select_related(
-                        "artifact", "artifact__pulp_domain"
-                    ).get(content__in=repo_version.content, relative_path=rel_path)
-                    return ca
-
-                ca = await sync_to_async(get_contentartifact_blocking)()
+                resolved.content_artifact = (
+                    repo_version.get_content_artifacts(rel_path)
+                    .select_related("artifact", "artifact__pulp_domain")
+                    .get()
+                )
+                return resolved
             except MultipleObjectsReturned:
                 log.error(
                     "Multiple (pass-through) matches for {b}/{p}",
@@ -648,48 +836,96 @@ class Handler:
                 raise
             except ObjectDoesNotExist:
                 pass
-            else:
-                if ca.artifact:
-                    return await self._serve_content_artifact(ca, headers, request)
-                else:
-                    return await self._stream_content_artifact(
-                        request, StreamResponse(headers=headers), ca
-                    )
 
         if distro.remote:
+            remote = distro.remote.cast()
+            url = remote.get_remote_artifact_url(rel_path, request=request)
+            try:
+                ra = RemoteArtifact.objects.select_related(
+                    "content_artifact",
+                    "content_artifact__artifact",
+                    "content_artifact__artifact__pulp_domain",
+                    "remote",
+                ).get(remote=remote, url=url)
+            except ObjectDoesNotExist:
+                ca = ContentArtifact(relative_path=rel_path)
+                resolved.remote_artifact = RemoteArtifact(
+                    remote=remote, url=url, content_artifact=ca
+                )
+            else:
+                resolved.content_artifact = ra.content_artifact
 
-            def cast_remote_blocking():
-                return distro.remote.cast()
+        return resolved
 
-            remote = await sync_to_async(cast_remote_blocking)()
+    async def _match_and_stream(self, path, request):
+        """
+        Match the path and stream results either from the filesystem or by downloading new data.
 
-            try:
-                url = remote.get_remote_artifact_url(rel_path, request=request)
+        After deciding the client can access the distribution at ``path``, this function calls
+        :meth:`Distribution.content_handler`. If that function returns a not-None result, it is
+        returned to the client.
 
-                def get_remote_artifact_blocking():
-                    ra = RemoteArtifact.objects.select_related(
-                        "content_artifact",
-                        "content_artifact__artifact",
-                        "content_artifact__artifact__pulp_domain",
-                        "remote",
-                    ).get(remote=remote, url=url)
-                    return ra
-
-                ra = await sync_to_async(get_remote_artifact_blocking)()
-                ca = ra.content_artifact
-                if ca.artifact:
-                    return await self._serve_content_artifact(ca, headers, request)
-                else:
-                    return await self._stream_content_artifact(
-                        request, StreamResponse(headers=headers), ca
-                    )
-            except ObjectDoesNotExist:
-                ca = ContentArtifact(relative_path=rel_path)
-                ra = RemoteArtifact(remote=remote, url=url, content_artifact=ca)
-                return await self._stream_remote_artifact(
-                    request, StreamResponse(headers=headers), ra
+        Then the publication linked to the Distribution is used to determine what content should
+        be served. If ``path`` is a directory entry (i.e. not a file), the directory contents
+        are served to the client. This method calls
+        :meth:`Distribution.content_handler_list_directory` to acquire any additional entries the
+        Distribution's content_handler might serve in that directory. If there is an Artifact to be
+        served, it is served to the client.
+
+        If there's no publication, the above paragraph is applied to the latest repository linked
+        to the matched Distribution.
+
+        Finally, when nothing is served to client yet, we check if there is a remote for the
+        Distribution. If so, the Artifact is pulled from the remote and streamed to the client.
+
+        Args:
+            path (str): The path component of the URL.
+            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+
+        Raises:
+            PathNotResolved: The path could not be matched to a published file.
+            PermissionError: When not permitted.
+
+        Returns:
+            :class:`aiohttp.web.StreamResponse` or :class:`aiohttp.web.FileResponse`: The response
+                streamed back to the client.
+        """
+        with timer(request, "match"):
+            distro = await self._lookup_distribution(path)
+        with timer(request, "resolve"):
+            resolved = await sync_to_async(self.resolve_request)(request, path, distro)
+        if resolved.content_handler_result is not None:
+            return resolved.content_handler_result
+
+        distro = resolved.distribution
+        rel_path = resolved.relative_path
+        headers = self.response_headers(rel_path)
+
+        if resolved.list_directory:
+            publication = resolved.publication
+            repo_version = None if publication else resolved.repository_version
+            return await self._stream_directory_listing(
+                request, distro, repo_version, publication, rel_path
+            )
+
+        ca = resolved.content_artifact
+        if ca is not None:
+            if ca.artifact:
+                return await self._serve_content_artifact(ca, headers, request)
+            else:
+                return await self._stream_content_artifact(
+                    request, self._stream_response(request, headers), ca
                 )
 
+        ra = resolved.remote_artifact
+        if ra is not None:
+            return await self._stream_remote_artifact(
+                request, self._stream_response(request, headers), ra
+            )
+
+        repository = resolved.repository
+        publication = resolved.publication
+        repo_version = resolved.repository_version
         if not any([repository, repo_version, publication, distro.remote]):
             reason = _(
                 "Distribution is not pointing to a publication, repository, repository version,"
@@ -709,6 +945,10 @@ class Handler:
         :class:`~pulpcore.plugin.models.RemoteArtifact` downloads raise exceptions, an HTTP 502
         error is returned to the client.
 
+        If ``CONTENT_APP_HEDGE_DELAY`` is set, the remotes that sent files the fastest are tried
+        first, and the next remote is tried in parallel whenever a remote takes longer than the
+        delay to start sending the file, see :meth:`_race_remote_artifacts`.
+
         Args:
             request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
             response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
@@ -726,6 +966,11 @@ class Handler:
             return list(content_artifact.remoteartifact_set.select_related("remote").order_by_acs())
 
         remote_artifacts = await sync_to_async(get_remote_artifacts_blocking)()
+        hedge_delay = settings.CONTENT_APP_HEDGE_DELAY
+        if hedge_delay is not None and len(remote_artifacts) > 1:
+            return await self._race_remote_artifacts(
+                request, response, sources.order_by_latency(remote_artifacts), hedge_delay
+            )
         for remote_artifact in remote_artifacts:
             try:
                 response = await self._stream_remote_artifact(request, response, remote_artifact)
@@ -741,6 +986,88 @@ class Handler:
 
         raise HTTPNotFound()
 
+    async def _race_remote_artifacts(self, request, response, remote_artifacts, delay):
+        """
+        Stream a file from the first of its RemoteArtifacts whose remote starts sending it.
+
+        The RemoteArtifacts are tried in order. The next one is tried in parallel whenever the
+        remotes being tried take more than ``delay`` seconds to send the headers of the file, or
+        right away when one of them fails. The first remote to send the headers is streamed to the
+        client, and the downloads from the other remotes are cancelled, unless other requests follow
+        them.
+
+        Args:
+            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+            response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
+            remote_artifacts (list): The :class:`~pulpcore.plugin.models.RemoteArtifact` objects
+                of the file, the preferred ones first.
+            delay (float): The number of seconds to wait for a remote before trying the next one.
+
+        Raises:
+            :class:`~aiohttp.web.HTTPNotFound` when no remote sent the file.
+
+        Returns:
+            :class:`aiohttp.web.StreamResponse`: The response streamed back to the client.
+        """
+        remaining = list(remote_artifacts)
+        attempts = {}
+        winner = None
+
+        def claim():
+            nonlocal winner
+            if winner is None:
+                winner = asyncio.current_task()
+                for attempt in attempts:
+                    if attempt is not winner:
+                        attempt.cancel()
+            return winner is asyncio.current_task()
+
+        def lost():
+            return winner is not None and winner is not asyncio.current_task()
+
+        try:
+            while remaining or attempts:
+                if remaining and winner is None:
+                    remote_artifact = remaining.pop(0)
+                    attempt = asyncio.ensure_future(
+                        self._stream_remote_artifact(
+                            request, response, remote_artifact, claim=claim, lost=lost
+                        )
+                    )
+                    attempts[attempt] = remote_artifact
+                timeout = delay if remaining and winner is None else None
+                done, pending = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    remote_artifact = attempts.pop(attempt)
+                    if attempt.cancelled():
+                        continue
+                    try:
+                        return attempt.result()
+                    except RaceLost:
+                        continue
+                    except SOURCE_ERRORS as e:
+                        log.warning(
+                            "Could not download remote artifact at '{}': {}".format(
+                                remote_artifact.url, str(e) or type(e).__name__
+                            )
+                        )
+                        if attempt is winner:
+                            if response.prepared:
+                                # Part of the file was sent already
+                                raise
+                            # Let another remote send the file
+                            winner = None
+        finally:
+            for attempt in attempts:
+                if attempt.done() and not attempt.cancelled():
+                    # Losers may have failed before they were cancelled
+                    attempt.exception()
+                attempt.cancel()
+
+        raise HTTPNotFound()
+
     def _save_artifact(self, download_result, remote_artifact):
         """
         Create/Get an Artifact and associate it to a RemoteArtifact and/or ContentArtifact.
@@ -764,7 +1091,6 @@ class Handler:
             The associated :class:`~pulpcore.plugin.models.Artifact`.
         """
         content_artifact = remote_artifact.content_artifact
-        remote = remote_artifact.remote
         artifact = Artifact(**download_result.artifact_attributes, file=download_result.path)
         with transaction.atomic():
             try:
@@ -789,39 +1115,200 @@ class Handler:
 
             update_content_artifact = True
             if content_artifact._state.adding:
-                # This is the first time pull-through content was requested.
-                rel_path = content_artifact.relative_path
-                c_type = remote.get_remote_artifact_content_type(rel_path)
-                content = c_type.init_from_artifact_and_relative_path(artifact, rel_path)
-                try:
-                    with transaction.atomic():
-                        content.save()
-                        content_artifact.content = content
-                        content_artifact.save()
-                except IntegrityError:
-                    # There is already content for this Artifact
-                    content = c_type.objects.get(content.q())
-                    artifacts = content._artifacts
-                    if artifact.sha256 != artifacts.get().sha256:
-                        raise RuntimeError(
-                            "The Artifact downloaded during pull-through does not "
-                            "match the Artifact already stored for the same "
-                            "content."
-                        )
-                    content_artifact = ContentArtifact.objects.get(content=content)
-                    update_content_artifact = False
-                try:
-                    with transaction.atomic():
-                        remote_artifact.content_artifact = content_artifact
-                        remote_artifact.save()
-                except IntegrityError:
-                    # Remote artifact must have already gotten saved during a parallel request
-                    log.info("RemoteArtifact already exists.")
+                content_artifact, update_content_artifact = self._save_pull_through_content(
+                    artifact, remote_artifact
+                )
             if update_content_artifact:
                 content_artifact.artifact = artifact
                 content_artifact.save()
         return artifact
 
+    def _save_artifacts(self, downloads):
+        """
+        Create/Get the Artifacts of many downloads at once, see :meth:`_save_artifact`.
+
+        The Artifacts are created with bulk queries in one transaction, then associated to their
+        ContentArtifacts in another one. If :meth:`_save_artifact` is overridden, it is called
+        for each download instead.
+
+        Args:
+            downloads (list): Tuples of the
+                :class:`~pulpcore.plugin.download.DownloadResult` and the
+                :class:`~pulpcore.plugin.models.RemoteArtifact` of each download.
+
+        Returns:
+            list: The associated :class:`~pulpcore.plugin.models.Artifact` of each download, or
+                the exception that prevented associating it.
+        """
+        if type(self)._save_artifact is not Handler._save_artifact:
+            results = []
+            for download in downloads:
+                try:
+                    results.append(self._save_artifact(*download))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        artifacts = self._get_or_create_artifacts(
+            [download_result for download_result, remote_artifact in downloads]
+        )
+        results = []
+        to_update = {}
+        with transaction.atomic():
+            for (download_result, remote_artifact), artifact in zip(downloads, artifacts):
+                content_artifact = remote_artifact.content_artifact
+                if content_artifact._state.adding:
+                    # Content is saved one by one, content types use multi-table inheritance
+                    try:
+                        with transaction.atomic():
+                            content_artifact, update = self._save_pull_through_content(
+                                artifact, remote_artifact
+                            )
+                    except Exception as e:
+                        results.append(e)
+                        continue
+                    if update:
+                        to_update[content_artifact.pk] = content_artifact
+                else:
+                    to_update[content_artifact.pk] = content_artifact
+                content_artifact.artifact = artifact
+                results.append(artifact)
+            ContentArtifact.objects.bulk_update(
+                sorted(to_update.values(), key=lambda ca: ca.pk), ["artifact"]
+            )
+        return results
+
+    @staticmethod
+    def _get_or_create_artifacts(download_results):
+        """
+        Create the Artifacts of downloads, or get the existing ones.
+
+        The files of the downloads of existing Artifacts are removed.
+
+        Args:
+            download_results (list): The :class:`~pulpcore.plugin.download.DownloadResult` of
+                each download.
+
+        Returns:
+            list: The :class:`~pulpcore.plugin.models.Artifact` of each download.
+        """
+        domain = get_domain()
+        with transaction.atomic():
+            sha256s = {result.artifact_attributes["sha256"] for result in download_results}
+            existing = Artifact.objects.filter(sha256__in=sha256s, pulp_domain=domain)
+            artifacts = {artifact.sha256: artifact for artifact in existing}
+            existing.touch()
+
+            new_artifacts = {}
+            sources = {}
+            for result in download_results:
+                sha256 = result.artifact_attributes["sha256"]
+                if sha256 not in artifacts and sha256 not in new_artifacts:
+                    new_artifacts[sha256] = Artifact(
+                        **result.artifact_attributes, file=result.path, pulp_domain=domain
+                    )
+                    sources[sha256] = result
+            # Sort the inserts like ArtifactSaver to avoid deadlocks
+            for artifact in Artifact.objects.bulk_get_or_create(
+                new_artifacts[sha256] for sha256 in sorted(new_artifacts)
+            ):
+                artifacts[artifact.sha256] = artifact
+
+        for result in download_results:
+            sha256 = result.artifact_attributes["sha256"]
+            if sources.get(sha256) is not result or artifacts[sha256] is not new_artifacts[sha256]:
+                # The file needs to be unlinked because it was not used to create an artifact.
+                # The artifact was already saved while servicing another request for it.
+                with suppress(FileNotFoundError):
+                    os.unlink(result.path)
+        return [artifacts[result.artifact_attributes["sha256"]] for result in download_results]
+
+    def _save_queued_downloads(self, downloads):
+        """
+        Save downloads queued by requests of any domain, see :meth:`_get_save_queue`.
+
+        Args:
+            downloads (list): Tuples of the
+                :class:`~pulpcore.plugin.download.DownloadResult`, the
+                :class:`~pulpcore.plugin.models.RemoteArtifact` and the
+                :class:`~pulpcore.app.models.Domain` of each download.
+
+        Returns:
+            list: The associated :class:`~pulpcore.plugin.models.Artifact` of each download, or
+                the exception that prevented saving it.
+        """
+        results = [None] * len(downloads)
+        by_domain = {}
+        for i, (download_result, remote_artifact, domain) in enumerate(downloads):
+            by_domain.setdefault(domain.pk, (domain, []))[1].append(i)
+        for domain, indexes in by_domain.values():
+            set_domain(domain)
+            try:
+                saved = self._save_artifacts([downloads[i][:2] for i in indexes])
+            except Exception as e:
+                saved = [e] * len(indexes)
+            for i, result in zip(indexes, saved):
+                results[i] = result
+        return results
+
+    def _get_save_queue(self):
+        """
+        Get the queue saving the downloads of the handler in batches.
+
+        Returns:
+            :class:`~pulpcore.content.saving.SaveQueue`: The queue.
+        """
+        if getattr(self, "_save_queue", None) is None:
+            self._save_queue = SaveQueue(
+                self._save_queued_downloads, settings.CONTENT_APP_SAVE_BATCH_INTERVAL
+            )
+        return self._save_queue
+
+    def _save_pull_through_content(self, artifact, remote_artifact):
+        """
+        Create the Content of an Artifact requested for the first time through pull-through caching.
+
+        Args:
+            artifact (:class:`~pulpcore.plugin.models.Artifact`): The saved Artifact.
+            remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The unsaved
+                RemoteArtifact the Artifact was downloaded from.
+
+        Returns:
+            tuple: The saved :class:`~pulpcore.plugin.models.ContentArtifact` of the content, and
+                whether it still needs to be associated to the Artifact.
+        """
+        content_artifact = remote_artifact.content_artifact
+        remote = remote_artifact.remote
+        update_content_artifact = True
+        rel_path = content_artifact.relative_path
+        c_type = remote.get_remote_artifact_content_type(rel_path)
+        content = c_type.init_from_artifact_and_relative_path(artifact, rel_path)
+        try:
+            with transaction.atomic():
+                content.save()
+                content_artifact.content = content
+                content_artifact.save()
+        except IntegrityError:
+            # There is already content for this Artifact
+            content = c_type.objects.get(content.q())
+            artifacts = content._artifacts
+            if artifact.sha256 != artifacts.get().sha256:
+                raise RuntimeError(
+                    "The Artifact downloaded during pull-through does not "
+                    "match the Artifact already stored for the same "
+                    "content."
+                )
+            content_artifact = ContentArtifact.objects.get(content=content)
+            update_content_artifact = False
+        try:
+            with transaction.atomic():
+                remote_artifact.content_artifact = content_artifact
+                remote_artifact.save()
+        except IntegrityError:
+            # Remote artifact must have already gotten saved during a parallel request
+            log.info("RemoteArtifact already exists.")
+        return content_artifact, update_content_artifact
+
     async def _serve_content_artifact(self, content_artifact, headers, request):
         """
         Handle response for a Content Artifact with the file present.
@@ -837,10 +1324,14 @@ class Handler:
 
         Raises:
             :class:`aiohttp.web_exceptions.HTTPFound`: When we need to redirect to the file
+            :class:`aiohttp.web_exceptions.HTTPNotModified`: When the client has the file already
+            :class:`aiohttp.web_exceptions.HTTPPreconditionFailed`: When the file doesn't match
+                the conditions of the request
             NotImplementedError: If file is stored in a file storage we can't handle
 
         Returns:
-            The :class:`aiohttp.web.FileResponse` for the file.
+            The :class:`~pulpcore.responses.ArtifactFileResponse` or
+            :class:`~pulpcore.responses.ArtifactResponse` for the file.
         """
         artifact_file = content_artifact.artifact.file
         artifact_name = artifact_file.name
@@ -849,11 +1340,24 @@ class Handler:
         domain = get_domain()
         storage = domain.get_storage()
 
-        if domain.storage_class == "pulpcore.app.models.storage.FileSystem":
-            path = storage.path(artifact_name)
-            if not os.path.exists(path):
+        with timer(request, "storage"):
+            try:
+                path = storage.path(artifact_name)
+            except NotImplementedError:
+                # The storage does not keep the files on the local filesystem
+                path = None
+            if path is not None and not os.path.exists(path):
                 raise Exception(_("Expected path '{}' is not found").format(path))
-            return FileResponse(path, headers=headers)
+
+        if path is not None or not domain.redirect_to_object_storage:
+            # Only the responses sent by the content app itself are validated by the artifact
+            headers.update(artifact_validators(content_artifact.artifact))
+            conditional = conditional_response(request, headers)
+            if conditional is not None:
+                raise conditional
+
+        if path is not None:
+            return ArtifactFileResponse(path, headers=headers)
         elif not domain.redirect_to_object_storage:
             return ArtifactResponse(content_artifact.artifact, headers=headers)
         elif domain.storage_class == "storages.backends.s3boto3.S3Boto3Storage":
@@ -882,21 +1386,190 @@ class Handler:
         else:
             raise NotImplementedError()
 
-    async def _stream_remote_artifact(self, request, response, remote_artifact):
+    @classmethod
+    def _set_upstream_headers(
+        cls, response, headers, range_start=None, range_stop=None, actual_content_length=None
+    ):
+        """
+        Copy the headers of an upstream response to the response streamed to the client.
+
+        Hop-by-hop headers are skipped. For a range request the Content-Length and Content-Range
+        headers are computed from the upstream Content-Length and the requested range.
+
+        Args:
+            response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
+            headers (iterable): The (name, value) pairs of the upstream headers.
+            range_start (int): The start of the range requested by the client, if any.
+            range_stop (int): The (exclusive) end of the range requested by the client, if any.
+            actual_content_length (int): The length of the range if it was truncated to the size
+                of the RemoteArtifact.
+        """
+        for name, value in headers:
+            lower_name = name.lower()
+            if lower_name not in cls.hop_by_hop_headers:
+                response.headers[name] = value
+            elif response.status == 206 and lower_name == "content-length":
+                content_length = int(value)
+                start = 0 if range_start is None else range_start
+                if range_stop is None:
+                    stop = content_length
+                elif actual_content_length:
+                    stop = start + actual_content_length
+                else:
+                    stop = range_stop
+
+                range_bytes = stop - start
+                if actual_content_length:
+                    response.headers[name] = str(actual_content_length)
+                else:
+                    response.headers[name] = str(range_bytes)
+
+                # aiohttp adds a 1 to the range.stop compared to http headers (including) to
+                # match python array adressing (exclusive)
+                response.headers["Content-Range"] = "bytes {0}-{1}/{2}".format(
+                    start, stop - 1, content_length
+                )
+
+    async def _stream_inflight_download(
+        self,
+        request,
+        response,
+        download,
+        range_start,
+        range_stop,
+        actual_content_length,
+        claim=None,
+    ):
+        """
+        Stream the data of an upstream download another request is running for the same file.
+
+        Args:
+            request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
+            response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
+            download (:class:`~pulpcore.content.inflight.InflightDownload` or
+                :class:`~pulpcore.content.inflight.ForeignDownload`): The download to follow.
+            range_start (int): The start of the range requested by the client, if any.
+            range_stop (int): The (exclusive) end of the range requested by the client, if any.
+            actual_content_length (int): The length of the range if it was truncated to the size
+                of the RemoteArtifact.
+            claim (callable): Called before the response is prepared when racing other sources,
+                see :meth:`_race_remote_artifacts`.
+
+        Raises:
+            RaceLost: When another source claimed the response first.
+
+        Returns:
+            The :class:`aiohttp.web.StreamResponse` or None if the download failed before any data
+            was sent to the client.
+        """
+        data_file = None
+        download.attach()
+        try:
+            if await download.wait_for_file():
+                data_file = download.open_data_file()
+            if data_file is None:
+                return None
+            if claim is not None and not claim():
+                raise RaceLost()
+            self._set_upstream_headers(
+                response, download.headers, range_start, range_stop, actual_content_length
+            )
+            await response.prepare(request)
+            start = max(range_start or 0, 0)
+            async for chunk in inflight.follow(download, data_file, start=start, stop=range_stop):
+                await response.write(chunk)
+        finally:
+            download.close()
+            if data_file:
+                data_file.close()
+        await response.write_eof()
+        return response
+
+    async def _download_in_background(self, remote, remote_artifact, download):
+        """
+        Download and save a RemoteArtifact independently of the requests streaming it.
+
+        The data is written to the downloader's file as fast as the remote sends it. Requests
+        follow the download through `download` at their own pace, so neither a slow nor a
+        disconnected client holds up saving the Artifact.
+
+        Args:
+            remote (:class:`~pulpcore.plugin.models.Remote`): The detail object of the remote.
+            remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The RemoteArtifact
+                to download.
+            download (:class:`~pulpcore.content.inflight.InflightDownload`): The download to
+                publish the progress to.
+
+        Returns:
+            The saved :class:`~pulpcore.plugin.models.Artifact`.
+        """
+
+        measurement = sources.Measurement(remote_artifact.remote_id)
+
+        async def handle_response_headers(headers):
+            measurement.headers_received()
+            download.set_headers(headers)
+
+        async def handle_data(data):
+            measurement.data_received(len(data))
+            await original_handle_data(data)
+            downloader.flush()
+            download.add_data(downloader.path, len(data))
+
+        async def finalize():
+            await original_finalize()
+            if download.path is None:
+                # Publish the file of an empty download
+                download.add_data(downloader.path, 0)
+            download.finish()
+
+        with download:
+            downloader = remote.get_downloader(
+                remote_artifact=remote_artifact, headers_ready_callback=handle_response_headers
+            )
+            original_handle_data = downloader.handle_data
+            downloader.handle_data = handle_data
+            original_finalize = downloader.finalize
+            downloader.finalize = finalize
+            try:
+                download_result = await downloader.run()
+            except SOURCE_ERRORS:
+                measurement.failed()
+                raise
+            measurement.finished()
+
+        if settings.CONTENT_APP_SAVE_BATCH_INTERVAL:
+            return await self._get_save_queue().save(
+                (download_result, remote_artifact, get_domain())
+            )
+        return await sync_to_async(self._save_artifact)(download_result, remote_artifact)
+
+    async def _stream_remote_artifact(
+        self, request, response, remote_artifact, claim=None, lost=None
+    ):
         """
         Stream and save a RemoteArtifact.
 
+        If ``CONTENT_APP_COALESCE_DOWNLOADS`` is enabled and another request is already downloading
+        the same remote file, the response is streamed from that download instead. If
+        ``CONTENT_APP_DECOUPLE_DOWNLOADS`` is enabled, the file is downloaded and saved in the
+        background while the response is streamed from the downloaded data.
+
         Args:
             request(:class:`~aiohttp.web.Request`): The request to prepare a response for.
             response (:class:`~aiohttp.web.StreamResponse`): The response to stream data to.
             remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The RemoteArtifact
                 to fetch and then stream back to the client
+            claim (callable): Called before the response is prepared when racing other sources,
+                see :meth:`_race_remote_artifacts`.
+            lost (callable): Tells whether another source claimed the response when racing.
 
         Raises:
             :class:`~aiohttp.web.HTTPNotFound` when no
                 :class:`~pulpcore.plugin.models.RemoteArtifact` objects associated with the
                 :class:`~pulpcore.plugin.models.ContentArtifact` returned the binary data needed for
                 the client.
+            RaceLost: When another source claimed the response first.
 
         """
 
@@ -927,38 +1600,98 @@ class Handler:
                 start = 0 if range_start is None else range_start
                 actual_content_length = size - start
 
-        async def handle_response_headers(headers):
-            for name, value in headers.items():
-                lower_name = name.lower()
-                if lower_name not in self.hop_by_hop_headers:
-                    response.headers[name] = value
-                elif response.status == 206 and lower_name == "content-length":
-                    content_length = int(value)
-                    start = 0 if range_start is None else range_start
-                    if range_stop is None:
-                        stop = content_length
-                    elif actual_content_length:
-                        stop = start + actual_content_length
-                    else:
-                        stop = range_stop
-
-                    range_bytes = stop - start
-                    if actual_content_length:
-                        response.headers[name] = str(actual_content_length)
-                    else:
-                        response.headers[name] = str(range_bytes)
-
-                    # aiohttp adds a 1 to the range.stop compared to http headers (including) to
-                    # match python array adressing (exclusive)
-                    response.headers["Content-Range"] = "bytes {0}-{1}/{2}".format(
-                        start, stop - 1, content_length
+        download = None
+        if settings.CONTENT_APP_COALESCE_DOWNLOADS:
+            key = inflight.download_key(remote_artifact)
+            lock = None
+            if not inflight.get_inflight_download(key):
+                lock = inflight.DownloadLock(key)
+                if not lock.acquire():
+                    lock = None
+            if lock:
+                download = inflight.InflightDownload(key, lock=lock)
+            else:
+                following = inflight.get_inflight_download(key) or inflight.ForeignDownload.open(
+                    key
+                )
+                if following:
+                    streamed = await self._stream_inflight_download(
+                        request,
+                        response,
+                        following,
+                        range_start,
+                        range_stop,
+                        actual_content_length,
+                        claim,
                     )
+                    if streamed is not None:
+                        return streamed
+                # The download could not be followed, do it without coalescing
+                log.debug("Could not attach to the download of {}".format(remote_artifact.url))
+
+        if settings.CONTENT_APP_DECOUPLE_DOWNLOADS and remote.policy != Remote.STREAMED:
+            if download is None:
+                download = inflight.InflightDownload(inflight.download_key(remote_artifact))
+            background = asyncio.ensure_future(
+                self._download_in_background(remote, remote_artifact, download)
+            )
+            _background_downloads.add(background)
+            background.add_done_callback(_background_download_done)
+            try:
+                streamed = await self._stream_inflight_download(
+                    request,
+                    response,
+                    download,
+                    range_start,
+                    range_stop,
+                    actual_content_length,
+                    claim,
+                )
+            except (RaceLost, asyncio.CancelledError):
+                if lost is not None and lost() and not download.followers:
+                    # Nothing needs the file of a source that lost the race
+                    background.cancel()
+                raise
+            if streamed is None:
+                # The download failed before there was any data, which raises its error, or it was
+                # retried by the downloader, which restarted its file. Serve the saved artifact of
+                # the latter once it is complete.
+                artifact = await asyncio.shield(background)
+                if claim is not None and not claim():
+                    raise RaceLost()
+                content_artifact = ContentArtifact(
+                    artifact=artifact, relative_path=remote_artifact.content_artifact.relative_path
+                )
+                return await self._serve_content_artifact(
+                    content_artifact, dict(response.headers), request
+                )
+            return streamed
+
+        # Requests attached to this download read the data from the downloader's file
+        write_data_to_file = remote.policy != Remote.STREAMED or download is not None
+        measurement = sources.Measurement(remote_artifact.remote_id)
+
+        async def handle_response_headers(headers):
+            if claim is not None and not claim():
+                raise RaceLost()
+            measurement.headers_received()
+            if download:
+                download.set_headers(headers)
+            self._set_upstream_headers(
+                response, headers.items(), range_start, range_stop, actual_content_length
+            )
             await response.prepare(request)
 
         data_size_handled = 0
 
         async def handle_data(data):
             nonlocal data_size_handled
+            measurement.data_received(len(data))
+            if write_data_to_file:
+                await original_handle_data(data)
+                if download:
+                    downloader.flush()
+                    download.add_data(downloader.path, len(data))
             if range_start or range_stop:
                 start_byte_pos = 0
                 end_byte_pos = len(data)
@@ -972,26 +1705,38 @@ class Handler:
                 data_size_handled = data_size_handled + len(data)
             else:
                 await response.write(data)
-            if remote.policy != Remote.STREAMED:
-                await original_handle_data(data)
 
         async def finalize():
-            if remote.policy != Remote.STREAMED:
+            if write_data_to_file:
                 await original_finalize()
+            if download:
+                download.finish()
 
-        downloader = remote.get_downloader(
-            remote_artifact=remote_artifact, headers_ready_callback=handle_response_headers
-        )
-        original_handle_data = downloader.handle_data
-        downloader.handle_data = handle_data
-        original_finalize = downloader.finalize
-        downloader.finalize = finalize
-        download_result = await downloader.run()
+        with download or nullcontext():
+            downloader = remote.get_downloader(
+                remote_artifact=remote_artifact, headers_ready_callback=handle_response_headers
+            )
+            original_handle_data = downloader.handle_data
+            downloader.handle_data = handle_data
+            original_finalize = downloader.finalize
+            downloader.finalize = finalize
+            try:
+                download_result = await downloader.run()
+            except SOURCE_ERRORS:
+                measurement.failed()
+                raise
+        measurement.finished()
 
-        if remote.policy != Remote.STREAMED:
+        if remote.policy != Remote.STREAMED and settings.CONTENT_APP_SAVE_BATCH_INTERVAL:
+            # The response doesn't wait for the batch the artifact is saved with
+            saved = self._get_save_queue().save((download_result, remote_artifact, get_domain()))
+            saved.add_done_callback(_queued_save_done)
+        elif remote.policy != Remote.STREAMED:
             await asyncio.shield(
                 sync_to_async(self._save_artifact)(download_result, remote_artifact)
             )
+        elif write_data_to_file:
+            os.unlink(download_result.path)
         await response.write_eof()
 
         if response.status == 404:
@@ -0,0 +1,395 @@
+"""
+Coordination of concurrent on-demand downloads of the same remote file.
+
+The first request for a remote file becomes the "owner" of the upstream download. Every other
+request for the same file that arrives while the download is still running attaches to it and is
+served from the temporary file the owner's downloader is writing to, instead of starting a download
+of its own.
+
+Requests handled by the same content app process are coordinated through an in-memory registry of
+:class:`InflightDownload` objects. Requests handled by other content app processes on the same host
+are coordinated through a lock file in ``WORKING_DIRECTORY`` (see :class:`DownloadLock`), which also
+tells them where the growing temporary file is and which upstream headers it was served with.
+"""
+import asyncio
+import errno
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.core.files import locks
+
+POLL_INTERVAL = 0.1
+CHUNK_SIZE = 1048576  # 1 megabyte, the same as the HttpDownloader
+
+_inflight_downloads = {}
+
+
+def download_key(remote_artifact):
+    """
+    Get the key identifying the upstream download of a RemoteArtifact.
+
+    Args:
+        remote_artifact (:class:`~pulpcore.plugin.models.RemoteArtifact`): The RemoteArtifact to
+            be downloaded.
+
+    Returns:
+        str: A key that is the same for all RemoteArtifacts pointing to the same file.
+    """
+    value = "{remote}:{url}".format(remote=remote_artifact.remote_id, url=remote_artifact.url)
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def get_inflight_download(key):
+    """
+    Return the download that is currently running in this process for `key`, if any.
+    """
+    return _inflight_downloads.get(key)
+
+
+class InflightDownload:
+    """
+    The state of an upstream download that other requests can attach to.
+
+    The owner of the download publishes the upstream headers, the path of the file the data is
+    written to and the number of bytes already flushed to it. Attached requests wait for changes of
+    that state with :meth:`wait`.
+
+    Args:
+        key (str): The key of the download, see :func:`download_key`.
+        lock (:class:`DownloadLock`): An optional, already acquired lock used to publish the state
+            to other content app processes.
+    """
+
+    def __init__(self, key, lock=None):
+        self.key = key
+        self.lock = lock
+        self.headers = None
+        self.path = None
+        self.size = 0
+        self.complete = False
+        self.failed = False
+        self.followers = 0
+        self._changed = asyncio.Event()
+
+    def __enter__(self):
+        _inflight_downloads[self.key] = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.complete:
+            self.failed = True
+            self._notify()
+        if _inflight_downloads.get(self.key) is self:
+            del _inflight_downloads[self.key]
+        if self.lock:
+            self.lock.release(complete=self.complete, size=self.size)
+
+    @property
+    def finished(self):
+        """Whether no more data is going to be written."""
+        return self.complete or self.failed
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def set_headers(self, headers):
+        """
+        Publish the response headers received from upstream.
+
+        A download whose headers get published more than once is being retried by its downloader,
+        which starts over with a new file. Requests already attached to it can't follow that, so
+        the download is marked as failed for them.
+
+        Args:
+            headers (multidict.CIMultiDictProxy): The upstream response headers.
+        """
+        if self.headers is not None:
+            self.failed = True
+        else:
+            self.headers = list(headers.items())
+        self._notify()
+
+    def add_data(self, path, length):
+        """
+        Record that `length` more bytes have been flushed to the file at `path`.
+        """
+        if self.path is None:
+            self.path = os.path.abspath(path)
+            if self.lock:
+                self.lock.publish(self.path, self.headers)
+        self.size += length
+        self._notify()
+
+    def finish(self):
+        """Record that the download completed and all data has been written."""
+        self.complete = True
+        self._notify()
+
+    def open_data_file(self):
+        """
+        Open the file the owner writes the data to.
+
+        Returns:
+            file: The file opened for reading, or None if it was already moved to the storage.
+        """
+        try:
+            return open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def attach(self):
+        """Record that a request follows the download, until it calls :meth:`close`."""
+        self.followers += 1
+
+    def close(self):
+        """Record that a request stopped following the download."""
+        self.followers -= 1
+
+    async def wait(self, offset):
+        """
+        Wait until there is data beyond `offset` or until the download is finished.
+
+        Args:
+            offset (int): The number of bytes the caller has already consumed.
+        """
+        while self.size <= offset and not self.finished:
+            changed = self._changed
+            await changed.wait()
+
+    async def wait_for_file(self):
+        """
+        Wait until the upstream headers and the path of the file are known.
+
+        Returns:
+            bool: True if the file can be followed, False if the download failed before.
+        """
+        while self.path is None and not self.finished:
+            changed = self._changed
+            await changed.wait()
+        return self.path is not None and not self.failed
+
+
+class DownloadLock:
+    """
+    A lock file announcing to other processes that a download is running.
+
+    The file is exclusively locked by the owner of the download and contains a JSON document with
+    the download's ``status``, and once known, its ``path`` and ``headers``. The owner removes the
+    file before it releases the lock, so a new download can be started for the same key while
+    processes which attached to the old one still read the final state from the unlinked file.
+
+    Args:
+        key (str): The key of the download, see :func:`download_key`.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.path = os.path.join(settings.WORKING_DIRECTORY, "{}.download".format(key))
+        self._file = None
+        self._state = {}
+
+    def acquire(self):
+        """
+        Try to become the owner of the download without blocking.
+
+        Returns:
+            bool: True if the lock was acquired.
+        """
+        while True:
+            _file = open(self.path, "a+")
+            if not locks.lock(_file, locks.LOCK_EX | locks.LOCK_NB):
+                _file.close()
+                return False
+            # The previous owner may have removed the file between our open() and lock() calls
+            try:
+                same_file = os.stat(self.path).st_ino == os.fstat(_file.fileno()).st_ino
+            except FileNotFoundError:
+                same_file = False
+            if same_file:
+                self._file = _file
+                self._write(status="downloading")
+                return True
+            _file.close()
+
+    def _write(self, **state):
+        self._state.update(state)
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(json.dumps(self._state))
+        self._file.flush()
+
+    def publish(self, path, headers):
+        """Announce the file the download is written to and its upstream headers."""
+        self._write(path=path, headers=headers)
+
+    def release(self, complete, size):
+        """
+        Record the outcome of the download, remove the lock file and release the lock.
+        """
+        try:
+            self._write(status="complete" if complete else "failed", size=size)
+            os.unlink(self.path)
+        finally:
+            locks.unlock(self._file)
+            self._file.close()
+            self._file = None
+
+
+class ForeignDownload:
+    """
+    A download running in another content app process, followed through its lock file.
+
+    This offers the same interface to attached requests as :class:`InflightDownload`, but has to
+    poll for changes.
+
+    Args:
+        key (str): The key of the download, see :func:`download_key`.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.headers = None
+        self.path = None
+        self.size = 0
+        self.complete = False
+        self.failed = False
+        self._lock_file = None
+        self._data_file = None
+
+    @classmethod
+    def open(cls, key):
+        """
+        Attach to the download for `key` if another process owns it.
+
+        Returns:
+            :class:`ForeignDownload` or None if there is no such download.
+        """
+        download = cls(key)
+        try:
+            download._lock_file = open(DownloadLock(key).path, "r")
+        except FileNotFoundError:
+            return None
+        return download
+
+    @property
+    def finished(self):
+        """Whether no more data is going to be written."""
+        return self.complete or self.failed
+
+    def attach(self):
+        """Nothing to record for downloads running in other processes."""
+        pass
+
+    def close(self):
+        """Close the file handles used to follow the download."""
+        for _file in (self._lock_file, self._data_file):
+            if _file:
+                _file.close()
+
+    def _read_state(self):
+        self._lock_file.seek(0)
+        try:
+            return json.loads(self._lock_file.read())
+        except ValueError:
+            # The owner is writing to the file right now
+            return {"status": "downloading"}
+
+    def _refresh(self):
+        # The owner holds an exclusive lock until it is done with the download
+        owner_is_done = locks.lock(self._lock_file, locks.LOCK_SH | locks.LOCK_NB)
+        if owner_is_done:
+            locks.unlock(self._lock_file)
+        state = self._read_state()
+        if self.path is None and state.get("path"):
+            try:
+                self._data_file = open(state["path"], "rb")
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                # The owner already moved the file to the artifact storage
+                self.failed = True
+                return
+            self.path = state["path"]
+            self.headers = state["headers"]
+        if owner_is_done:
+            if state["status"] == "complete":
+                self.complete = True
+                self.size = state["size"]
+            else:
+                self.failed = True
+        elif self._data_file:
+            self.size = os.fstat(self._data_file.fileno()).st_size
+
+    async def wait(self, offset):
+        """
+        Wait until there is data beyond `offset` or until the download is finished.
+        """
+        self._refresh()
+        while self.size <= offset and not self.finished:
+            await asyncio.sleep(POLL_INTERVAL)
+            self._refresh()
+
+    async def wait_for_file(self):
+        """
+        Wait until the upstream headers and the path of the file are known.
+
+        Returns:
+            bool: True if the file can be followed, False if the download failed before.
+        """
+        self._refresh()
+        while self.path is None and not self.finished:
+            await asyncio.sleep(POLL_INTERVAL)
+            self._refresh()
+        return self.path is not None and not self.failed
+
+    def open_data_file(self):
+        """
+        Return the file the owner writes the data to.
+
+        The file is opened as soon as its path is known, so it stays readable after the owner
+        moved it to the artifact storage. The caller is responsible for closing it.
+        """
+        data_file, self._data_file = self._data_file, None
+        return data_file
+
+
+async def follow(download, data_file, start=0, stop=None):
+    """
+    Read the data of a running download from its file as it is being written.
+
+    Args:
+        download (:class:`InflightDownload` or :class:`ForeignDownload`): The download to follow.
+        data_file (file): The file the download writes to, opened for reading in binary mode.
+        start (int): The offset of the first byte to yield.
+        stop (int): The offset after the last byte to yield. Defaults to the end of the download.
+
+    Yields:
+        bytes: Chunks of data.
+
+    Raises:
+        ConnectionError: When the download fails before `stop` was reached.
+    """
+    loop = asyncio.get_event_loop()
+    offset = start
+    await loop.run_in_executor(None, data_file.seek, offset)
+    while stop is None or offset < stop:
+        await download.wait(offset)
+        if download.failed:
+            raise ConnectionError("The download followed by this request failed.")
+        available = download.size if stop is None else min(download.size, stop)
+        if offset >= available:
+            if download.complete:
+                break
+            continue
+        chunk = await loop.run_in_executor(
+            None, data_file.read, min(CHUNK_SIZE, available - offset)
+        )
+        if not chunk:
+            # The data is not visible to us yet
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+        offset += len(chunk)
+        yield chunk
@@ -0,0 +1,224 @@
+"""
+Directory listings of the content app.
+
+Entries are computed from relative paths sorted by code point, the way the database returns them,
+and rendered with templates compiled once per process.
+"""
+import heapq
+import json
+import re
+from json.encoder import encode_basestring_ascii
+from gettext import gettext as _
+from itertools import groupby
+from operator import itemgetter
+from urllib.parse import quote
+
+from django.conf import settings
+from markupsafe import escape
+
+_HTML_HEADER = (
+    "\n<html>\n<head><title>Index of {path}</title></head>\n"
+    '<body bgcolor="white">\n<h1>Index of {path}</h1>\n<hr><pre>{parent}\n'
+).format
+_HTML_ENTRY = '<a href="%s">%s</a>%s%s\n'
+_HTML_NEXT_PAGE = '<a href="?after={after}">{next}</a>\n'.format
+_HTML_FOOTER = "</pre><hr></body>\n</html>"
+_HTML_DATE_FORMAT = "%d-%b-%Y %H:%M"
+# Names are padded to this many characters before their date
+_HTML_NAME_WIDTH = 100
+_needs_escaping = re.compile("[&<>\"']").search
+_JSON_ENTRY = '{"name": %s, "type": "%s", "modified": %s}'
+
+
+def entry_name(relative_path, path):
+    """
+    Get the name of the entry of a directory a relative path is part of.
+
+    Args:
+        relative_path (str): A relative path below ``path``.
+        path (str): The relative path of the directory, empty or ending with a slash.
+
+    Returns:
+        str: The first component of ``relative_path`` below ``path``, with the slashes following
+            it for directories.
+    """
+    start = len(path)
+    end = relative_path.find("/", start)
+    if end < 0:
+        return relative_path[start:]
+    length = len(relative_path)
+    while end < length and relative_path[end] == "/":
+        end += 1
+    return relative_path[start:end]
+
+
+def directory_entries(rows, path):
+    """
+    Get the entries of a directory from the relative paths below it.
+
+    The rows of the files below a directory entry are next to each other once sorted, so each
+    entry is found by comparing a row with the previous one, without looking back.
+
+    Args:
+        rows (iterable): Tuples of a relative path below ``path`` and a date, sorted by relative
+            path.
+        path (str): The relative path of the directory, empty or ending with a slash.
+
+    Yields:
+        tuple: The name and the latest date of each entry, sorted by name. Names of directories
+            end with a slash.
+    """
+    name = date = None
+    for relative_path, row_date in rows:
+        row_name = entry_name(relative_path, path)
+        if not row_name:
+            continue
+        if row_name != name:
+            if name is not None:
+                yield name, date
+            name, date = row_name, row_date
+        elif row_date is not None and (date is None or row_date > date):
+            date = row_date
+    if name is not None:
+        yield name, date
+
+
+def merge_entries(*streams):
+    """
+    Merge sorted streams of directory entries.
+
+    Args:
+        streams (iterable): Iterables of tuples of a name and a date, each sorted by name.
+
+    Yields:
+        tuple: The name and the latest date of each entry, sorted by name.
+    """
+    for name, entries in groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+        dates = [entry[1] for entry in entries if entry[1] is not None]
+        yield name, max(dates) if dates else None
+
+
+class HtmlListing:
+    """
+    Render a directory listing as an HTML page.
+
+    Args:
+        path (str): The path of the directory requested.
+    """
+
+    content_type = "text/html"
+
+    def __init__(self, path):
+        self.path = path
+        # Files are often created together, their dates are formatted once
+        self._dates = {None: ""}
+
+    def header(self):
+        """Render the beginning of the listing."""
+        root = self.path == settings.CONTENT_PATH_PREFIX
+        return _HTML_HEADER(path=self.path, parent="" if root else '<a href="../">../</a>')
+
+    def entries(self, entries):
+        """
+        Render entries of the listing.
+
+        Args:
+            entries (iterable): Tuples of the name and the date of the entries.
+        """
+        dates = self._dates
+        lines = []
+        for name, date in entries:
+            if _needs_escaping(name):
+                name = escape(name)
+            formatted = dates.get(date)
+            if formatted is None:
+                formatted = dates[date] = date.strftime(_HTML_DATE_FORMAT)
+            pad = " " * (_HTML_NAME_WIDTH - len(name))
+            lines.append(_HTML_ENTRY % (name, name, pad, formatted))
+        return "".join(lines)
+
+    def footer(self, next_page=None):
+        """
+        Render the end of the listing.
+
+        Args:
+            next_page (str): The name of the last entry listed, if more follow on a next page.
+        """
+        if next_page is None:
+            return _HTML_FOOTER
+        return _HTML_NEXT_PAGE(after=escape(quote(next_page)), next=_("Next page")) + _HTML_FOOTER
+
+
+class JsonListing:
+    """
+    Render a directory listing as a JSON document, for tools.
+
+    The document is an object with the ``entries`` of the directory, each with its ``name``,
+    ``type`` ("directory" or "file") and ``modified`` date, if any. ``next`` is the query string
+    of the next page of the listing, or null.
+
+    Args:
+        path (str): The path of the directory requested.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, path):
+        self.path = path
+        self._separator = ""
+        self._dates = {None: "null"}
+
+    def header(self):
+        """Render the beginning of the listing."""
+        return '{"path": %s, "entries": [' % json.dumps(self.path)
+
+    def entries(self, entries):
+        """
+        Render entries of the listing.
+
+        Args:
+            entries (iterable): Tuples of the name and the date of the entries.
+        """
+        dates = self._dates
+        parts = []
+        for name, date in entries:
+            modified = dates.get(date)
+            if modified is None:
+                modified = dates[date] = encode_basestring_ascii(date.isoformat())
+            entry_type = "directory" if name.endswith("/") else "file"
+            parts.append(_JSON_ENTRY % (encode_basestring_ascii(name), entry_type, modified))
+        if not parts:
+            return ""
+        rendered = self._separator + ", ".join(parts)
+        self._separator = ", "
+        return rendered
+
+    def footer(self, next_page=None):
+        """
+        Render the end of the listing.
+
+        Args:
+            next_page (str): The name of the last entry listed, if more follow on a next page.
+        """
+        next_query = None
+        if next_page is not None:
+            next_query = "?format=json&after={}".format(quote(next_page))
+        return '], "next": %s}' % json.dumps(next_query)
+
+
+# The renderers of listings, by the value of the ``format`` query parameter
+LISTING_FORMATS = {"html": HtmlListing, "json": JsonListing}
+
+
+def get_listing(request_format, path):
+    """
+    Get the renderer of a listing.
+
+    Args:
+        request_format (str): The format requested, HTML if unknown or None.
+        path (str): The path of the directory requested.
+
+    Returns:
+        The renderer, see :class:`HtmlListing`.
+    """
+    return LISTING_FORMATS.get(request_format, HtmlListing)(path)
@@ -0,0 +1,300 @@
+"""
+An in-memory table of the distributions served by the content app.
+
+Matching a request to a distribution is the first thing done for every request. With
+``CONTENT_APP_DISTRIBUTION_CACHE`` enabled, the content app keeps the detail objects of all
+distributions of a domain in memory, keyed by their ``base_path``, so matching a request is a
+dictionary lookup instead of a database query.
+
+The tables are kept fresh through database notifications: the models a distribution depends on
+announce their changes with :func:`~pulpcore.app.util.notify_distributions_changed`, and
+:func:`listen_for_changes` drops the tables of the affected domain when it receives one. The tables
+are only used while the content app is listening, and they expire after
+``CONTENT_APP_DISTRIBUTION_CACHE_TTL`` seconds as a safety net.
+
+The domains requests are made in are kept in memory the same way, keyed by their name. So are the
+decisions of content guards that can be reused (see ``ContentGuard.permit_cache_key``), which are
+dropped when :func:`~pulpcore.app.util.notify_permissions_changed` announces that permissions
+changed.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.utils import InterfaceError, OperationalError
+
+from pulpcore.app.models import ContentGuard, Domain
+from pulpcore.app.util import DISTRIBUTIONS_CHANGED_CHANNEL, PERMISSIONS_CHANGED_CHANNEL
+
+log = logging.getLogger(__name__)
+
+RECONNECT_INTERVAL = 5
+
+SELECT_RELATED = ("repository", "repository_version", "publication", "remote", "pulp_domain")
+
+_tables = {}
+_domains = {}
+_decisions = {}
+_permissions_generation = 0
+_loading = {}
+_generation = 0
+_listening = False
+
+
+def _cast_all(queryset, related=()):
+    """
+    Get the detail objects of all the rows of a master model queryset.
+
+    Unlike calling ``cast()`` on every object, this runs a single query per detail type.
+
+    Args:
+        queryset (django.db.models.QuerySet): A queryset of a master model.
+        related (tuple): Relations to pass to ``select_related``.
+
+    Returns:
+        list: The detail objects.
+    """
+    master_model = queryset.model
+    detail_models = {
+        model.get_pulp_type(): model
+        for model in apps.get_models()
+        if issubclass(model, master_model) and model.TYPE and not model._meta.proxy
+    }
+    objects = []
+    for pulp_type in queryset.order_by().values_list("pulp_type", flat=True).distinct():
+        rows = queryset.filter(pulp_type=pulp_type).select_related(*related)
+        model = detail_models.get(pulp_type)
+        if model is None:
+            objects.extend(row.cast() for row in rows)
+        else:
+            objects.extend(model.objects.filter(pk__in=rows.values("pk")).select_related(*related))
+    return objects
+
+
+def load_distributions(distro_model, domain):
+    """
+    Load the distributions of a domain from the database.
+
+    The content guards of the distributions are already cast to their detail type.
+
+    Args:
+        distro_model (:class:`~pulpcore.plugin.models.Distribution`): The distribution model
+            served by the content app.
+        domain (:class:`~pulpcore.app.models.Domain`): The domain to load the distributions of.
+
+    Returns:
+        dict: The detail distribution objects keyed by their base_path.
+    """
+    queryset = distro_model.objects.filter(pulp_domain=domain)
+    distributions = {d.base_path: d for d in _cast_all(queryset, related=SELECT_RELATED)}
+    guard_pks = {d.content_guard_id for d in distributions.values() if d.content_guard_id}
+    if guard_pks:
+        guards = {g.pk: g for g in _cast_all(ContentGuard.objects.filter(pk__in=guard_pks))}
+        for distribution in distributions.values():
+            if distribution.content_guard_id:
+                distribution.content_guard = guards.get(distribution.content_guard_id)
+    return distributions
+
+
+async def _load(key, distro_model, domain):
+    generation = _generation
+    table = await sync_to_async(load_distributions)(distro_model, domain)
+    # Don't keep what was loaded when a change was announced in the meantime
+    if _listening and generation == _generation:
+        _tables[key] = (time.monotonic() + settings.CONTENT_APP_DISTRIBUTION_CACHE_TTL, table)
+    return table
+
+
+async def get_distributions(distro_model, domain):
+    """
+    Get the table of the distributions of a domain, loading it if necessary.
+
+    Args:
+        distro_model (:class:`~pulpcore.plugin.models.Distribution`): The distribution model
+            served by the content app.
+        domain (:class:`~pulpcore.app.models.Domain`): The domain of the request.
+
+    Returns:
+        dict: The detail distribution objects keyed by their base_path, or None if the content
+            app is not listening for changes, in which case the table can't be trusted.
+    """
+    if not _listening:
+        return None
+    key = (distro_model, domain.pk)
+    entry = _tables.get(key)
+    if entry is not None and time.monotonic() < entry[0]:
+        return entry[1]
+    if key not in _loading:
+        _loading[key] = asyncio.ensure_future(_load(key, distro_model, domain))
+        _loading[key].add_done_callback(lambda task: _loading.pop(key, None))
+    return await asyncio.shield(_loading[key])
+
+
+async def get_domain(name):
+    """
+    Get a domain by its name, loading it if necessary.
+
+    Args:
+        name (str): The name of the domain.
+
+    Returns:
+        :class:`~pulpcore.app.models.Domain`: The domain, or None if the content app is not
+            listening for changes, in which case the domain has to be loaded from the database.
+
+    Raises:
+        Domain.DoesNotExist: When there is no domain with that name.
+    """
+    if not _listening:
+        return None
+    entry = _domains.get(name)
+    if entry is not None and time.monotonic() < entry[0]:
+        return entry[1]
+    generation = _generation
+    domain = await sync_to_async(Domain.objects.get)(name=name)
+    if _listening and generation == _generation:
+        _domains[name] = (time.monotonic() + settings.CONTENT_APP_DISTRIBUTION_CACHE_TTL, domain)
+    return domain
+
+
+def invalidate(domain_pk=None):
+    """
+    Drop the tables and the cached object of a domain.
+
+    Args:
+        domain_pk (str): The primary key of the domain whose distributions changed. Drops all
+            tables if not given.
+    """
+    global _generation
+    _generation += 1
+    for key in list(_tables):
+        if domain_pk is None or str(key[1]) == domain_pk:
+            del _tables[key]
+    for name, (expires, domain) in list(_domains.items()):
+        if domain_pk is None or str(domain.pk) == domain_pk:
+            del _domains[name]
+
+
+def permissions_generation():
+    """
+    Get a number that changes whenever the content app is told that permissions changed.
+
+    Get it before making a decision and pass it to :func:`set_guard_decision`, so the decision is
+    not kept if permissions changed in the meantime.
+    """
+    return _permissions_generation
+
+
+def get_guard_decision(key):
+    """
+    Get a decision of a content guard made for an earlier request.
+
+    Args:
+        key (tuple): The key identifying the content guard and what its decision depends on.
+
+    Returns:
+        tuple: Whether the request was permitted and the reason if it wasn't, or None.
+    """
+    if not _listening:
+        return None
+    entry = _decisions.get(key)
+    if entry is None:
+        return None
+    expires, generation, decision = entry
+    if time.monotonic() >= expires or generation != _permissions_generation:
+        # Permissions changed since the decision was made
+        _decisions.pop(key, None)
+        return None
+    return decision
+
+
+def set_guard_decision(key, generation, permitted, reason=None):
+    """
+    Remember the decision of a content guard.
+
+    Args:
+        key (tuple): The key identifying the content guard and what its decision depends on.
+        generation (int): What :func:`permissions_generation` returned before the decision was made.
+        permitted (bool): Whether the request was permitted.
+        reason (str): Why the request was not permitted.
+    """
+    if _listening and generation == _permissions_generation:
+        expires = time.monotonic() + settings.CONTENT_APP_DISTRIBUTION_CACHE_TTL
+        _decisions[key] = (expires, generation, (permitted, reason))
+
+
+def invalidate_guard_decisions():
+    """
+    Drop all the decisions of content guards.
+
+    A decision stored by a thread racing this invalidation is dropped when it is read, as it is
+    stamped with the generation it was made for.
+    """
+    global _permissions_generation
+    _permissions_generation += 1
+    _decisions.clear()
+
+
+def _connect():
+    db = connections.create_connection("default")
+    with db.wrap_database_errors:
+        pg_connection = db.get_new_connection(db.get_connection_params())
+        pg_connection.autocommit = True
+        with pg_connection.cursor() as cursor:
+            for channel in (DISTRIBUTIONS_CHANGED_CHANNEL, PERMISSIONS_CHANGED_CHANNEL):
+                cursor.execute("LISTEN {channel}".format(channel=channel))
+    return db, pg_connection
+
+
+async def listen_for_changes():
+    """
+    Listen for the changes of the distributions announced through the database.
+
+    This runs for the lifetime of the content app on its own database connection and reconnects
+    when that connection is lost. The tables are not used while the content app is not listening.
+    """
+    global _listening
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            db, pg_connection = await loop.run_in_executor(None, _connect)
+        except (InterfaceError, OperationalError) as e:
+            log.warning("Content app failed to listen for distribution changes: %s", e)
+            await asyncio.sleep(RECONNECT_INTERVAL)
+            continue
+
+        disconnected = loop.create_future()
+
+        def handle_notifications():
+            try:
+                with db.wrap_database_errors:
+                    pg_connection.poll()
+            except (InterfaceError, OperationalError) as e:
+                if not disconnected.done():
+                    disconnected.set_result(e)
+                return
+            while pg_connection.notifies:
+                notify = pg_connection.notifies.pop(0)
+                if notify.channel == PERMISSIONS_CHANGED_CHANNEL:
+                    invalidate_guard_decisions()
+                else:
+                    invalidate(notify.payload)
+
+        fd = pg_connection.fileno()
+        invalidate()
+        invalidate_guard_decisions()
+        loop.add_reader(fd, handle_notifications)
+        _listening = True
+        try:
+            e = await disconnected
+            log.warning("Content app stopped listening for distribution changes: %s", e)
+        finally:
+            _listening = False
+            loop.remove_reader(fd)
+            invalidate()
+            invalidate_guard_decisions()
+            pg_connection.close()
+        await asyncio.sleep(RECONNECT_INTERVAL)
@@ -0,0 +1,68 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+# The maximum number of downloads saved at once
+SAVE_BATCH_MAX_SIZE = 500
+
+
+class SaveQueue:
+    """
+    Save the downloads of the content app in batches.
+
+    Downloads are collected for ``interval`` seconds, or until ``SAVE_BATCH_MAX_SIZE`` downloads
+    are waiting, and are then saved together with a single call of ``save_batch``.
+
+    Args:
+        save_batch (callable): Blocking function saving a list of downloads. It returns the result
+            of each download, or the exception that prevented saving it.
+        interval (float): The number of seconds downloads wait for others to be saved with.
+    """
+
+    def __init__(self, save_batch, interval):
+        self.save_batch = save_batch
+        self.interval = interval
+        self._pending = []
+        self._task = None
+        self._wakeup = None
+
+    def save(self, download):
+        """
+        Queue a download to be saved with the next batch.
+
+        The download is saved even if nothing waits for the result.
+
+        Args:
+            download: The download, as expected by ``save_batch``.
+
+        Returns:
+            :class:`asyncio.Future`: The result of saving the download.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((download, future))
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        elif len(self._pending) >= SAVE_BATCH_MAX_SIZE and self._wakeup is not None:
+            if not self._wakeup.done():
+                self._wakeup.set_result(None)
+        return future
+
+    async def _run(self):
+        while self._pending:
+            if len(self._pending) < SAVE_BATCH_MAX_SIZE:
+                self._wakeup = asyncio.get_running_loop().create_future()
+                await asyncio.wait([self._wakeup], timeout=self.interval)
+            batch = self._pending[:SAVE_BATCH_MAX_SIZE]
+            del self._pending[:SAVE_BATCH_MAX_SIZE]
+            try:
+                results = await sync_to_async(self.save_batch)([download for download, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (download, future), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,108 @@
+import time
+
+# The weight of a new measurement in the moving averages of a remote
+SMOOTHING = 0.3
+
+# The time to first byte recorded for a remote that failed to send a file, in seconds
+FAILURE_PENALTY = 30.0
+
+_first_byte = {}
+_throughput = {}
+
+
+def _smooth(averages, key, value):
+    previous = averages.get(key)
+    averages[key] = value if previous is None else previous + SMOOTHING * (value - previous)
+
+
+class Measurement:
+    """
+    Measure the time to first byte and the throughput of a download from a remote.
+
+    Args:
+        remote_pk: The primary key of the remote the file is downloaded from.
+    """
+
+    def __init__(self, remote_pk):
+        self.remote_pk = remote_pk
+        self.started = time.monotonic()
+        self.first_byte = None
+        self.size = 0
+
+    def headers_received(self):
+        """
+        Record the time the remote took to start sending the file.
+        """
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+            _smooth(_first_byte, self.remote_pk, self.first_byte - self.started)
+
+    def data_received(self, size):
+        """
+        Count the bytes received from the remote.
+        """
+        self.size += size
+
+    def finished(self):
+        """
+        Record the throughput of the remote once the whole file was received.
+        """
+        if self.first_byte is None:
+            return
+        duration = time.monotonic() - self.first_byte
+        if duration > 0 and self.size:
+            _smooth(_throughput, self.remote_pk, self.size / duration)
+
+    def failed(self):
+        """
+        Record that the remote failed to send the file.
+        """
+        _smooth(_first_byte, self.remote_pk, FAILURE_PENALTY)
+
+
+def expected_duration(remote_pk, size=None):
+    """
+    Estimate how long downloading a file from a remote takes, based on the previous downloads.
+
+    Args:
+        remote_pk: The primary key of the remote.
+        size (int): The size of the file, if known.
+
+    Returns:
+        float: The number of seconds, or None if nothing was downloaded from the remote yet.
+    """
+    first_byte = _first_byte.get(remote_pk)
+    if first_byte is None:
+        return None
+    throughput = _throughput.get(remote_pk)
+    if size and throughput:
+        return first_byte + size / throughput
+    return first_byte
+
+
+def order_by_latency(remote_artifacts):
+    """
+    Sort RemoteArtifacts by how fast their remotes are expected to send their file.
+
+    Remotes that were never downloaded from come last, in their original order.
+
+    Args:
+        remote_artifacts (list): The :class:`~pulpcore.plugin.models.RemoteArtifact` objects.
+
+    Returns:
+        list: The sorted RemoteArtifacts.
+    """
+
+    def key(remote_artifact):
+        duration = expected_duration(remote_artifact.remote_id, remote_artifact.size)
+        return (duration is None, duration or 0)
+
+    return sorted(remote_artifacts, key=key)
+
+
+def forget():
+    """
+    Forget all the measurements.
+    """
+    _first_byte.clear()
+    _throughput.clear()
@@ -137,6 +137,16 @@ class BaseDownloader:
         self._writer.write(data)
         self._record_size_and_digests_for_data(data)
 
+    def flush(self):
+        """
+        Flush the data handled so far to the file at ``path``.
+
+        This makes the data available to other readers of the file while the download is still
+        running.
+        """
+        if self._writer:
+            self._writer.flush()
+
     async def finalize(self):
         """
         A coroutine to flush downloaded data, close the file writer, and validate the data.
@@ -0,0 +1,267 @@
+"""
+Metrics of the content app, exposed in the Prometheus text format.
+
+The metrics are kept in the memory of each content app process.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from aiohttp.web_exceptions import HTTPException
+from django.conf import settings
+
+# The Prometheus default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10)
+
+# The methods served by the content app, any other method is recorded as "other" so clients can't
+# add label values to the metrics
+METHODS = ("GET", "HEAD")
+
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append('{}="{}"'.format(name, value))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class Counter:
+    """
+    A Prometheus counter, optionally split by labels.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labels (tuple): The names of the labels of the metric.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        """
+        Increment the counter of the given label values.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """
+        Get the value of the counter of the given label values.
+        """
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        """
+        Yield the name, the formatted labels and the value of each sample of the metric.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+    def clear(self):
+        """
+        Forget all the recorded values.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Counter):
+    """
+    A Prometheus histogram, optionally split by labels.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labels (tuple): The names of the labels of the metric.
+        buckets (tuple): The sorted upper bounds of the buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, *label_values, value):
+        """
+        Record an observation for the given label values.
+        """
+        with self._lock:
+            counts, total = self._values.get(label_values, ((0,) * len(self.buckets), 0))
+            index = bisect.bisect_left(self.buckets, value)
+            counts = counts[:index] + (counts[index] + 1,) + counts[index + 1 :]
+            self._values[label_values] = (counts, total + value)
+
+    def value(self, *label_values):
+        """
+        Get the number of observations and their sum for the given label values.
+        """
+        counts, total = self._values.get(label_values, ((0,), 0))
+        return sum(counts), total
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labels + ("le",), label_values + (_format_value(bound),)
+                )
+                yield self.name + "_bucket", labels, cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, total
+
+
+requests_total = Counter(
+    "pulp_content_requests_total",
+    "Requests handled by the content app.",
+    labels=("method", "status"),
+)
+request_duration = Histogram(
+    "pulp_content_request_duration_seconds",
+    "Time taken by the content app to produce the responses to requests.",
+    labels=("method",),
+)
+phase_duration = Histogram(
+    "pulp_content_phase_duration_seconds",
+    "Time spent in the phases of the handling of content app requests.",
+    labels=("phase",),
+)
+cache_lookups_total = Counter(
+    "pulp_content_cache_lookups_total",
+    "Lookups of responses in the content cache.",
+    labels=("result",),
+)
+
+
+def render():
+    """
+    Render all the metrics in the Prometheus text format.
+
+    Returns:
+        str: The metrics.
+    """
+    lines = []
+    for metric in _registry:
+        lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+        lines.append("# TYPE {} {}".format(metric.name, metric.type))
+        for name, labels, value in metric.samples():
+            lines.append("{}{} {}".format(name, labels, value))
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timer(request, phase):
+    """
+    Measure the time spent in a phase of the handling of a request.
+
+    The time is added to the timings of the request, if it is being instrumented by
+    :func:`instrument`. Phases can be timed more than once per request.
+
+    Args:
+        request (:class:`aiohttp.web.Request`): The request being handled.
+        phase (str): The name of the phase.
+    """
+    timings = request.get("timings") if isinstance(request, web.BaseRequest) else None
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0) + time.perf_counter() - start
+
+
+def server_timing(timings):
+    """
+    Format the timings of a request as a ``Server-Timing`` header.
+
+    Args:
+        timings (dict): The seconds spent in each phase.
+
+    Returns:
+        str: The value of the header, with durations in milliseconds.
+    """
+    return ", ".join("{};dur={:.3f}".format(phase, dur * 1000) for phase, dur in timings.items())
+
+
+@web.middleware
+async def instrument(request, handler):
+    """
+    Record the time spent handling each request of the content app in the metrics.
+    """
+    request["timings"] = {}
+    request["start_time"] = start = time.perf_counter()
+    method = request.method if request.method in METHODS else "other"
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        request_duration.observe(method, value=time.perf_counter() - start)
+        requests_total.inc(method, status)
+        for phase, duration in request["timings"].items():
+            phase_duration.observe(phase, value=duration)
+
+
+async def add_server_timing(request, response):
+    """
+    Send the timings of the request with its response, when ``CONTENT_APP_SERVER_TIMING`` is set.
+
+    Meant to be connected to the ``on_response_prepare`` signal of the application.
+    """
+    timings = request.get("timings")
+    if timings is None or not settings.CONTENT_APP_SERVER_TIMING:
+        return
+    total = time.perf_counter() - request["start_time"]
+    response.headers["Server-Timing"] = server_timing({**timings, "total": total})
+
+
+async def metrics_view(request):
+    """
+    Serve the metrics of the process in the Prometheus text format.
+
+    The metrics are only served to superusers, authenticated by the ``authenticate`` middleware of
+    the content app.
+
+    Raises:
+        :class:`aiohttp.web.HTTPUnauthorized`: When the request has no valid credentials.
+        :class:`aiohttp.web.HTTPForbidden`: When the user is not a superuser.
+    """
+    user = request.get("user")
+    if user is None or not user.is_authenticated:
+        raise web.HTTPUnauthorized(headers={"WWW-Authenticate": 'Basic realm="Pulp"'})
+    if not user.is_superuser:
+        raise web.HTTPForbidden()
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
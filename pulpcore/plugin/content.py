@@ -1,3 +1,3 @@
 from pulpcore.content import app  # noqa
-from pulpcore.content.handler import Handler, PathNotResolved  # noqa
+from pulpcore.content.handler import Handler, PathNotResolved, ResolvedRequest  # noqa
 from pulpcore.responses import ArtifactResponse  # noqa
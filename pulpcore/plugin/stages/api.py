@@ -1,24 +1,139 @@
 import asyncio
+import contextvars
 import logging
+import os
+import resource
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from gettext import gettext as _
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
 from pulpcore.app.util import get_domain
+from pulpcore.plugin.stages import telemetry
 
 log = logging.getLogger(__name__)
 
+# How many times the configured minimum size adaptive batches can grow to, without a maximum size
+ADAPTIVE_MAX_FACTOR = 16
+
+
+def _memory_usage():
+    """
+    Get the resident set size of the process in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not on Linux, the peak resident set size is the best estimate
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class AdaptiveBatchSize:
+    """
+    The minimum size of the batches of a stage, adapted to the pipeline it runs in.
+
+    The size doubles when a full batch is already waiting in the queue feeding the stage, as the
+    stage can't keep up with the previous one and bigger batches make fewer round-trips to the
+    database. It halves when the memory used by the process is above ``STAGES_MEMORY_LIMIT``, and
+    the batches are then limited to that size until the memory is released.
+
+    Args:
+        minsize (int): The configured minimum size of the batches.
+        maxsize (int): The configured maximum size of the batches, if any.
+    """
+
+    def __init__(self, minsize, maxsize=None):
+        self.lower = minsize
+        self.upper = maxsize or minsize * ADAPTIVE_MAX_FACTOR
+        self.size = minsize
+
+    @property
+    def shrunk(self):
+        """Whether the size is below the configured minimum size because of memory pressure."""
+        return self.size < self.lower
+
+    def adapt(self, queue):
+        """
+        Adapt the size after a batch was handled.
+
+        Args:
+            queue (asyncio.Queue): The queue feeding the stage.
+
+        Returns:
+            int: The new size.
+        """
+        limit = settings.STAGES_MEMORY_LIMIT
+        if limit and _memory_usage() > limit:
+            self.size = max(self.size // 2, 1)
+        elif self.shrunk:
+            self.size = min(self.size * 2, self.lower)
+        elif queue.full() or queue.qsize() >= self.size:
+            self.size = min(self.size * 2, self.upper)
+        return self.size
+
+
+def partition(items, key, count):
+    """
+    Split items into groups, the items with equal keys always landing in the same group.
+
+    Args:
+        items (iterable): The items to split.
+        key (callable): Returns the key of an item, which must be hashable.
+        count (int): The maximum number of groups.
+
+    Returns:
+        list: The non-empty groups, each a list keeping the order of the items.
+    """
+    groups = [[] for i in range(count)]
+    for item in items:
+        groups[hash(key(item)) % count].append(item)
+    return [group for group in groups if group]
+
 
 class Stage:
     """
     The base class for all Stages API stages.
 
     To make a stage, inherit from this class and implement :meth:`run` on the subclass.
+
+    The batches of a stage and the queue feeding it are tuned by the attributes below. They default
+    to the values given to :func:`create_pipeline`, then to the ``STAGES_*`` settings.
+
+    Attributes:
+        queue_size (int): The maximum number of items in the queue feeding the stage, 0 for no
+            limit.
+        batch_min_size (int): The minimum size of the batches, see :meth:`batches`.
+        batch_max_size (int): The maximum size of the batches.
+        batch_max_latency (float): The maximum number of seconds a batch smaller than
+            ``batch_min_size`` waits for more items.
+        adaptive_batching (bool): Whether to adapt the minimum size of the batches to the
+            pipeline, see :class:`AdaptiveBatchSize`.
+        db_workers (int): The number of threads, each with its own database connection, saving
+            the batches of the stages that support it, see :meth:`_run_in_shards`. The functions
+            they run, including the hooks of plugins they call, run in these threads at once and
+            must not change state shared with the other threads.
+        telemetry (:class:`~pulpcore.plugin.stages.telemetry.StageTelemetry`): How the stage
+            spent its time, once connected to a pipeline.
     """
 
+    queue_size = None
+    batch_min_size = None
+    batch_max_size = None
+    batch_max_latency = None
+    adaptive_batching = None
+    db_workers = None
+
     def __init__(self):
         self._in_q = None
         self._out_q = None
+        self.telemetry = None
         self.domain = get_domain()
+        self._shard_executors = []
 
     def _connect(self, in_q, out_q):
         """
@@ -30,6 +145,88 @@ class Stage:
         """
         self._in_q = in_q
         self._out_q = out_q
+        self.telemetry = telemetry.StageTelemetry(self.__class__.__name__)
+
+    def _tuning(self, name):
+        """
+        Get the value of a tuning attribute of the stage, defaulting to its ``STAGES_*`` setting.
+        """
+        value = getattr(self, name)
+        if value is None:
+            value = getattr(settings, "STAGES_" + name.upper())
+        return value
+
+    async def _run_in_shards(self, func, items, key):
+        """
+        Run a blocking function on items, split among the database workers of the stage.
+
+        With more than one of ``db_workers``, the items are partitioned by the hash of their key and
+        the partitions are handled at the same time, each in a thread of its own. The threads and
+        their database connections are kept for the following batches, until the stage finishes.
+        Items with equal keys are in the same partition, so that concurrent transactions never lock
+        the same rows.
+
+        Each partition is handled in its own transaction, if ``func`` uses one. When one of them
+        fails, the others may be committed already. The error then fails the stage, and the items
+        that were saved are found by the stages looking up existing objects when they are saved
+        again, e.g. by the next sync.
+
+        Args:
+            func (callable): A blocking function handling a list of items.
+            items (list): The items.
+            key (callable): Returns the key of an item, e.g. its natural key.
+
+        Returns:
+            list: The results of ``func`` for each partition.
+        """
+        workers = self._tuning("db_workers")
+        if not workers or workers <= 1 or len(items) <= 1:
+            return [await sync_to_async(func)(items)]
+
+        if not self._shard_executors:
+            self._shard_executors = [
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.__class__.__name__)
+                for i in range(workers)
+            ]
+        loop = asyncio.get_running_loop()
+        shards = partition(items, key, len(self._shard_executors))
+        # The context of the stage is copied to the threads, like sync_to_async() does
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, contextvars.copy_context().run, func, shard)
+                for executor, shard in zip(self._shard_executors, shards)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def _close_shards(self):
+        """
+        Close the database connections of the threads of :meth:`_run_in_shards` and stop them.
+        """
+        executors, self._shard_executors = self._shard_executors, []
+        if not executors:
+            return
+
+        def close_connection():
+            connection.close()
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, close_connection) for executor in executors),
+            return_exceptions=True,
+        )
+        for executor in executors:
+            executor.shutdown(wait=False)
+        for result in results:
+            if isinstance(result, BaseException):
+                log.warning(
+                    "%(name)s - could not close a connection: %(error)s",
+                    {"name": self, "error": result},
+                )
 
     async def __call__(self):
         """
@@ -38,8 +235,14 @@ class Stage:
         It calls :meth:`run` and signals the next stage that its work is finished.
         """
         log.debug(_("%(name)s - begin."), {"name": self})
-        await self.run()
-        await self._out_q.put(None)
+        telemetry.set_current_stage(self.telemetry)
+        started = time.monotonic()
+        try:
+            await self.run()
+            await self._out_q.put(None)
+        finally:
+            self.telemetry.duration = time.monotonic() - started
+            await self._close_shards()
         log.debug(_("%(name)s - put end-marker."), {"name": self})
 
     async def run(self):
@@ -73,22 +276,28 @@ class Stage:
 
         """
         while True:
+            started = time.monotonic()
             content = await self._in_q.get()
+            self.telemetry.input_wait += time.monotonic() - started
             if content is None:
                 break
+            self.telemetry.items_in += 1
             log.debug("%(name)s - next: %(content)s.", {"name": self, "content": content})
             yield content
 
-    async def batches(self, minsize=500):
+    async def batches(self, minsize=None):
         """
         Asynchronous iterator yielding batches of :class:`DeclarativeContent` from `self._in_q`.
 
         The iterator will try to get as many instances of
         :class:`DeclarativeContent` as possible without blocking, but
-        at least `minsize` instances.
+        at least `minsize` instances, and at most ``batch_max_size`` instances. With
+        ``batch_max_latency`` set, a smaller batch is yielded once its first instance waited that
+        many seconds.
 
         Args:
-            minsize (int): The minimum batch size to yield (unless it is the final batch)
+            minsize (int): The minimum batch size to yield (unless it is the final batch),
+                defaults to ``batch_min_size``.
 
         Yields:
             A list of :class:`DeclarativeContent` instances
@@ -104,13 +313,26 @@ class Stage:
                                 await self.put(d_content)
 
         """
+        minsize = minsize or self._tuning("batch_min_size")
+        maxsize = self._tuning("batch_max_size")
+        if maxsize:
+            minsize = min(minsize, maxsize)
+        max_latency = self._tuning("batch_max_latency")
+        batch_size = None
+        if self._tuning("adaptive_batching"):
+            batch_size = AdaptiveBatchSize(minsize, maxsize)
+        limit = maxsize
+        loop = asyncio.get_running_loop()
+
         batch = []
+        batch_started = None
         shutdown = False
         no_block = False
         thaw_queue_event = asyncio.Event()
 
         def add_to_batch(content):
             nonlocal batch
+            nonlocal batch_started
             nonlocal shutdown
             nonlocal no_block
             nonlocal thaw_queue_event
@@ -122,14 +344,26 @@ class Stage:
                 if not content.does_batch:
                     no_block = True
                 content._thaw_queue_event = thaw_queue_event
+                if not batch:
+                    batch_started = loop.time()
                 batch.append(content)
 
         get_listener = asyncio.ensure_future(self._in_q.get())
         thaw_event_listener = asyncio.ensure_future(thaw_queue_event.wait())
         while not shutdown:
+            timeout = None
+            if batch and max_latency is not None:
+                timeout = max(batch_started + max_latency - loop.time(), 0)
+            started = loop.time()
             done, pending = await asyncio.wait(
-                [thaw_event_listener, get_listener], return_when=asyncio.FIRST_COMPLETED
+                [thaw_event_listener, get_listener],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
             )
+            self.telemetry.input_wait += loop.time() - started
+            if not done:
+                # The batch waited long enough for more items
+                no_block = True
             if thaw_event_listener in done:
                 thaw_event_listener = asyncio.ensure_future(thaw_queue_event.wait())
                 no_block = True
@@ -137,7 +371,7 @@ class Stage:
                 content = await get_listener
                 add_to_batch(content)
                 get_listener = asyncio.ensure_future(self._in_q.get())
-            while not shutdown:
+            while not shutdown and not (limit and len(batch) >= limit):
                 try:
                     content = self._in_q.get_nowait()
                 except asyncio.QueueEmpty:
@@ -152,9 +386,13 @@ class Stage:
                 for content in batch:
                     content._thaw_queue_event = None
                 thaw_queue_event.clear()
+                self.telemetry.batch(len(batch))
                 yield batch
                 batch = []
                 no_block = False
+                if batch_size is not None:
+                    minsize = batch_size.adapt(self._in_q)
+                    limit = minsize if batch_size.shrunk else maxsize
         thaw_event_listener.cancel()
         get_listener.cancel()
 
@@ -170,14 +408,25 @@ class Stage:
         """
         if item is None:
             raise ValueError(_("(None) not permitted."))
+        started = time.monotonic()
         await self._out_q.put(item)
+        self.telemetry.output_wait += time.monotonic() - started
+        self.telemetry.items_out += 1
         log.debug("{name} - put: {content}".format(name=self, content=item))
 
     def __str__(self):
         return "[{id}] {name}".format(id=id(self), name=self.__class__.__name__)
 
 
-async def create_pipeline(stages, maxsize=1):
+async def create_pipeline(
+    stages,
+    maxsize=None,
+    batch_min_size=None,
+    batch_max_size=None,
+    batch_max_latency=None,
+    adaptive_batching=None,
+    db_workers=None,
+):
     """
     A coroutine that builds a Stages API linear pipeline from the list `stages` and runs it.
 
@@ -191,16 +440,36 @@ async def create_pipeline(stages, maxsize=1):
                 async for d_content in self.items():  # Fetch items from the previous stage
                     await self.put(d_content)  # Hand them over to the next stage
 
+    The queues between the stages and the batches of the stages are tuned by the arguments, for
+    the stages that don't set the corresponding attribute, see
+    :class:`~pulpcore.plugin.stages.Stage`. They default to the ``STAGES_*`` settings.
+
     Args:
         stages (list of coroutines): A list of Stages API compatible coroutines.
         maxsize (int): The maximum amount of items a queue between two stages should hold. Optional
-            and defaults to 1.
+            and defaults to ``STAGES_QUEUE_SIZE``.
+        batch_min_size (int): The minimum size of the batches of the stages.
+        batch_max_size (int): The maximum size of the batches of the stages.
+        batch_max_latency (float): The maximum number of seconds a batch smaller than
+            ``batch_min_size`` waits for more items.
+        adaptive_batching (bool): Whether to adapt the minimum size of the batches to the pipeline.
+        db_workers (int): The number of database workers of the stages saving their batches in
+            parallel.
 
     Returns:
         A single coroutine that can be used to run, wait, or cancel the entire pipeline with.
     Raises:
         ValueError: When a stage instance is specified more than once.
     """
+    tuning = {
+        "batch_min_size": batch_min_size,
+        "batch_max_size": batch_max_size,
+        "batch_max_latency": batch_max_latency,
+        "adaptive_batching": adaptive_batching,
+        "db_workers": db_workers,
+    }
+    if maxsize is None:
+        maxsize = settings.STAGES_QUEUE_SIZE
     futures = []
     history = set()
     in_q = None
@@ -208,8 +477,12 @@ async def create_pipeline(stages, maxsize=1):
         if stage in history:
             raise ValueError(_("Each stage instance must be unique."))
         history.add(stage)
+        for name, value in tuning.items():
+            if value is not None and getattr(stage, name) is None:
+                setattr(stage, name, value)
         if i < len(stages) - 1:
-            out_q = asyncio.Queue(maxsize=maxsize)
+            queue_size = stages[i + 1].queue_size
+            out_q = asyncio.Queue(maxsize=maxsize if queue_size is None else queue_size)
         else:
             out_q = None
         stage._connect(in_q, out_q)
@@ -218,6 +491,7 @@ async def create_pipeline(stages, maxsize=1):
 
     try:
         await asyncio.gather(*futures)
+        telemetry.report(stages)
     except Exception:
         # One of the stages raised an exception, cancel all stages...
         pending = []
@@ -247,5 +521,10 @@ class EndStage(Stage):
         Importantly it does not try to put items into the nonexistent next queue.
         """
         # We overwrite __call__ here to avoid trying to put None in `self._out_q`.
-        async for _ in self.items():  # noqa
-            pass
+        telemetry.set_current_stage(self.telemetry)
+        started = time.monotonic()
+        try:
+            async for _ in self.items():  # noqa
+                pass
+        finally:
+            self.telemetry.duration = time.monotonic() - started
@@ -70,10 +70,11 @@ class QueryExistingArtifacts(Stage):
             The coroutine for this stage.
         """
         async for batch in self.batches():
-            artifact_digests_by_type = defaultdict(list)
+            artifact_digests_by_type = defaultdict(set)
+            d_artifacts_by_digest = defaultdict(list)
 
             # For each unsaved artifact, check its digests in the order of COMMON_DIGEST_FIELDS
-            # and the first digest which is found is added to the list of digests of that type.
+            # and the first digest which is found is added to the set of digests of that type.
             # We assume that in general only one digest is provided and that it will be
             # sufficient to identify the Artifact.
             for d_content in batch:
@@ -84,33 +85,42 @@ class QueryExistingArtifacts(Stage):
                         for digest_type in Artifact.COMMON_DIGEST_FIELDS:
                             digest_value = getattr(d_artifact.artifact, digest_type)
                             if digest_value:
-                                artifact_digests_by_type[digest_type].append(digest_value)
+                                artifact_digests_by_type[digest_type].add(digest_value)
+                                d_artifacts_by_digest[digest_type, digest_value].append(d_artifact)
                                 break
 
-            # For each type of digest, fetch all the existing Artifacts where digest "in"
-            # the list we built earlier. Walk over all the artifacts again compare the
-            # digest of the new artifact to those of the existing ones - if one matches,
-            # swap it out with the existing one.
-            for digest_type, digests in artifact_digests_by_type.items():
-                query_params = {
-                    "{attr}__in".format(attr=digest_type): digests,
-                    "pulp_domain": self.domain,
-                }
-                existing_artifacts_qs = Artifact.objects.filter(**query_params)
-                existing_artifacts = sync_to_async_iterable(existing_artifacts_qs)
-                await sync_to_async(existing_artifacts_qs.touch)()
-                for d_content in batch:
-                    for d_artifact in d_content.d_artifacts:
-                        artifact_digest = getattr(d_artifact.artifact, digest_type)
-                        if artifact_digest:
-                            async for result in existing_artifacts:
-                                result_digest = getattr(result, digest_type)
-                                if result_digest == artifact_digest:
-                                    d_artifact.artifact = result
-                                    break
+            # For each type of digest, fetch and touch all the existing Artifacts where digest
+            # "in" the set we built earlier, and swap them with the new artifacts of that digest.
+            existing_artifacts = await sync_to_async(self._fetch_existing_artifacts)(
+                artifact_digests_by_type
+            )
+            for (digest_type, digest_value), artifact in existing_artifacts.items():
+                for d_artifact in d_artifacts_by_digest[digest_type, digest_value]:
+                    d_artifact.artifact = artifact
             for d_content in batch:
                 await self.put(d_content)
 
+    def _fetch_existing_artifacts(self, artifact_digests_by_type):
+        """
+        Fetch the saved Artifacts with the given digests, and update their timestamp_of_interest.
+
+        Args:
+            artifact_digests_by_type (dict): The digests to look for, by digest type.
+
+        Returns:
+            dict: The existing :class:`~pulpcore.plugin.models.Artifact` objects, by digest type
+                and digest.
+        """
+        existing_artifacts = {}
+        for digest_type, digests in artifact_digests_by_type.items():
+            query_params = {
+                "{attr}__in".format(attr=digest_type): digests,
+                "pulp_domain": self.domain,
+            }
+            for artifact in Artifact.objects.filter(**query_params).touched():
+                existing_artifacts[digest_type, getattr(artifact, digest_type)] = artifact
+        return existing_artifacts
+
 
 class GenericDownloader(Stage):
     """
@@ -256,7 +266,8 @@ class ArtifactSaver(Stage):
     :class:`~pulpcore.plugin.stages.DeclarativeArtifact` objects have been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. With more than one of ``db_workers``, the artifacts of each
+    batch are split by digest and the parts are saved in parallel.
     """
 
     async def run(self):
@@ -266,6 +277,15 @@ class ArtifactSaver(Stage):
         Returns:
             The coroutine for this stage.
         """
+
+        def save_artifacts(da_to_save):
+            da_to_save_ordered = sorted(da_to_save, key=lambda x: x.artifact.sha256)
+            artifacts = Artifact.objects.bulk_get_or_create(
+                d_artifact.artifact for d_artifact in da_to_save_ordered
+            )
+            for d_artifact, artifact in zip(da_to_save_ordered, artifacts):
+                d_artifact.artifact = artifact
+
         async for batch in self.batches():
             da_to_save = []
             for d_content in batch:
@@ -273,16 +293,11 @@ class ArtifactSaver(Stage):
                     if d_artifact.artifact._state.adding and not d_artifact.deferred_download:
                         d_artifact.artifact.file = str(d_artifact.artifact.file)
                         da_to_save.append(d_artifact)
-            da_to_save_ordered = sorted(da_to_save, key=lambda x: x.artifact.sha256)
 
             if da_to_save:
-                for d_artifact, artifact in zip(
-                    da_to_save_ordered,
-                    await sync_to_async(Artifact.objects.bulk_get_or_create)(
-                        d_artifact.artifact for d_artifact in da_to_save_ordered
-                    ),
-                ):
-                    d_artifact.artifact = artifact
+                await self._run_in_shards(
+                    save_artifacts, da_to_save, lambda d_artifact: d_artifact.artifact.sha256
+                )
 
             for d_content in batch:
                 await self.put(d_content)
@@ -80,12 +80,16 @@ class ContentSaver(Stage):
     :class:`~pulpcore.plugin.models.Artifact`.
 
     Each "unsaved" Content objects is saved and a :class:`~pulpcore.plugin.models.ContentArtifact`
-    objects too.
+    objects too. The units are inserted in bulk, except for the content types saving them one by
+    one, see :meth:`~pulpcore.plugin.models.Content.can_bulk_create`.
 
     Each :class:`~pulpcore.plugin.stages.DeclarativeContent` is sent to after it has been handled.
 
     This stage drains all available items from `self._in_q` and batches everything into one large
-    call to the db for efficiency.
+    call to the db for efficiency. With more than one of ``db_workers``, each batch is split by the
+    natural keys of its content units and the parts are saved in parallel, in separate
+    transactions, see :meth:`~pulpcore.plugin.stages.Stage._run_in_shards`. All the parts of a batch
+    are saved before any of its items is sent to `self._out_q`.
     """
 
     async def run(self):
@@ -97,7 +101,7 @@ class ContentSaver(Stage):
         """
         async for batch in self.batches():
 
-            def process_batch():
+            def process_batch(batch):
                 content_artifact_bulk = []
                 to_update_ca_query = ContentArtifact.objects.none()
                 to_update_ca_bulk = []
@@ -107,7 +111,8 @@ class ContentSaver(Stage):
                     # Process the batch in dc.content.natural_keys order.
                     # This prevents deadlocks when we're processing the same/similar content
                     # in concurrent workers.
-                    batch.sort(key=lambda x: "".join(map(str, x.content.natural_key())))
+                    batch.sort(key=self._natural_key)
+                    created = self._bulk_create(batch)
                     for d_content in batch:
                         # Are we saving to the database for the first time?
                         content_already_saved = not d_content.content._state.adding
@@ -123,19 +128,21 @@ class ContentSaver(Stage):
                                 except ObjectDoesNotExist:
                                     raise e
                             else:
-                                for d_artifact in d_content.d_artifacts:
-                                    if not d_artifact.artifact._state.adding:
-                                        artifact = d_artifact.artifact
-                                    else:
-                                        # set to None for on-demand synced artifacts
-                                        artifact = None
-                                    content_artifact = ContentArtifact(
-                                        content=d_content.content,
-                                        artifact=artifact,
-                                        relative_path=d_artifact.relative_path,
-                                    )
-                                    content_artifact_bulk.append(content_artifact)
-                                continue
+                                created.add(id(d_content))
+                        if id(d_content) in created:
+                            for d_artifact in d_content.d_artifacts:
+                                if not d_artifact.artifact._state.adding:
+                                    artifact = d_artifact.artifact
+                                else:
+                                    # set to None for on-demand synced artifacts
+                                    artifact = None
+                                content_artifact = ContentArtifact(
+                                    content=d_content.content,
+                                    artifact=artifact,
+                                    relative_path=d_artifact.relative_path,
+                                )
+                                content_artifact_bulk.append(content_artifact)
+                            continue
                         # When the Content already exists, check if ContentArtifacts need to be
                         # updated
                         for d_artifact in d_content.d_artifacts:
@@ -195,15 +202,51 @@ class ContentSaver(Stage):
 
                     self._post_save(batch)
 
-            await sync_to_async(process_batch)()
+            await self._run_in_shards(process_batch, batch, self._natural_key)
             for declarative_content in batch:
                 await self.put(declarative_content)
 
+    @staticmethod
+    def _bulk_create(batch):
+        """
+        Save the new content units of a batch in bulk, for the types that allow it.
+
+        The units conflicting with existing ones are replaced by them.
+
+        Args:
+            batch (list of :class:`~pulpcore.plugin.stages.DeclarativeContent`): The batch.
+
+        Returns:
+            set: The ids of the :class:`~pulpcore.plugin.stages.DeclarativeContent` objects whose
+                content unit was created.
+        """
+        to_create = [
+            d_content
+            for d_content in batch
+            if d_content.content._state.adding and d_content.content.can_bulk_create()
+        ]
+        created = set()
+        if to_create:
+            contents = Content.objects.bulk_get_or_create_content(
+                d_content.content for d_content in to_create
+            )
+            for d_content, content in zip(to_create, contents):
+                if content is d_content.content and not content._state.adding:
+                    created.add(id(d_content))
+                d_content.content = content
+        return created
+
+    @staticmethod
+    def _natural_key(d_content):
+        return "".join(map(str, d_content.content.natural_key()))
+
     def _pre_save(self, batch):
         """
         A hook plugin-writers can override to save related objects prior to content unit saving.
 
-        This is run within the same transaction as the content unit saving.
+        This is run within the same transaction as the content unit saving. With more than one of
+        ``db_workers``, it is called for each part of a batch, from different threads at once, so
+        it must not change state shared by the parts of a batch.
 
         Args:
             batch (list of :class:`~pulpcore.plugin.stages.DeclarativeContent`): The batch of
@@ -216,7 +259,9 @@ class ContentSaver(Stage):
         """
         A hook plugin-writers can override to save related objects after content unit saving.
 
-        This is run within the same transaction as the content unit saving.
+        This is run within the same transaction as the content unit saving. With more than one of
+        ``db_workers``, it is called for each part of a batch, from different threads at once, so
+        it must not change state shared by the parts of a batch.
 
         Args:
             batch (list of :class:`~pulpcore.plugin.stages.DeclarativeContent`): The batch of
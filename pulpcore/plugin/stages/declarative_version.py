@@ -18,7 +18,19 @@ from .content_stages import (
 
 
 class DeclarativeVersion:
-    def __init__(self, first_stage, repository, mirror=False, acs=False):
+    def __init__(
+        self,
+        first_stage,
+        repository,
+        mirror=False,
+        acs=False,
+        queue_size=None,
+        batch_min_size=None,
+        batch_max_size=None,
+        batch_max_latency=None,
+        adaptive_batching=None,
+        db_workers=None,
+    ):
         """
         A pipeline that creates a new :class:`~pulpcore.plugin.models.RepositoryVersion` from a
         stream of :class:`~pulpcore.plugin.stages.DeclarativeContent` objects.
@@ -104,12 +116,33 @@ class DeclarativeVersion:
                 'False' is the default.
             acs (bool): When set to 'True' a new stage is added to look for
                 Alternate Content Sources.
+            queue_size (int): The maximum number of items in the queues between the stages.
+            batch_min_size (int): The minimum size of the batches of the stages.
+            batch_max_size (int): The maximum size of the batches of the stages.
+            batch_max_latency (float): The maximum number of seconds a batch smaller than
+                ``batch_min_size`` waits for more items.
+            adaptive_batching (bool): Whether to adapt the minimum size of the batches to the
+                pipeline.
+            db_workers (int): The number of database connections the
+                :class:`~pulpcore.plugin.stages.ArtifactSaver` and
+                :class:`~pulpcore.plugin.stages.ContentSaver` stages save their batches with.
+
+            The tuning of the pipeline defaults to the ``STAGES_*`` settings, see
+            :func:`~pulpcore.plugin.stages.create_pipeline`.
 
         """
         self.first_stage = first_stage
         self.repository = repository
         self.mirror = mirror
         self.acs = acs
+        self.pipeline_tuning = {
+            "maxsize": queue_size,
+            "batch_min_size": batch_min_size,
+            "batch_max_size": batch_max_size,
+            "batch_max_latency": batch_max_latency,
+            "adaptive_batching": adaptive_batching,
+            "db_workers": db_workers,
+        }
 
     def pipeline_stages(self, new_version):
         """
@@ -157,7 +190,7 @@ class DeclarativeVersion:
                 stages = self.pipeline_stages(new_version)
                 stages.append(ContentAssociation(new_version, self.mirror))
                 stages.append(EndStage())
-                pipeline = create_pipeline(stages)
+                pipeline = create_pipeline(stages, **self.pipeline_tuning)
                 loop.run_until_complete(pipeline)
 
         return new_version if new_version.complete else None
@@ -0,0 +1,141 @@
+import contextvars
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from pulpcore.constants import VAR_TMP_PULP
+
+log = logging.getLogger(__name__)
+
+# The telemetry of the stage running in the current context, which database queries are added to
+_current_stage = contextvars.ContextVar("current_stage_telemetry", default=None)
+
+
+class StageTelemetry:
+    """
+    Records how a stage of a pipeline spent its time.
+
+    Attributes:
+        name (str): The name of the stage.
+        items_in (int): The number of items the stage got from the previous stage.
+        items_out (int): The number of items the stage passed to the next stage.
+        batches (int): The number of batches the stage got.
+        max_batch_size (int): The size of the biggest batch the stage got.
+        input_wait (float): The seconds spent waiting for items from the previous stage.
+        output_wait (float): The seconds spent waiting for the next stage to take items.
+        db_queries (int): The number of database queries made by the stage.
+        db_time (float): The seconds spent in database queries.
+        duration (float): The seconds the stage ran for.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.duration = 0.0
+
+    def batch(self, size):
+        """
+        Record a batch the stage got.
+        """
+        self.batches += 1
+        self.items_in += size
+        self.max_batch_size = max(self.max_batch_size, size)
+
+    def as_dict(self):
+        """
+        Get the telemetry, with the time the stage was busy and its throughput.
+
+        Returns:
+            dict: The telemetry.
+        """
+        busy = max(self.duration - self.input_wait - self.output_wait, 0.0)
+        return {
+            "name": self.name,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "batches": self.batches,
+            "mean_batch_size": self.items_in / self.batches if self.batches else None,
+            "max_batch_size": self.max_batch_size,
+            "input_wait": self.input_wait,
+            "output_wait": self.output_wait,
+            "busy": busy,
+            "db_queries": self.db_queries,
+            "db_time": self.db_time,
+            "duration": self.duration,
+            "items_per_second": self.items_in / self.duration if self.duration else None,
+        }
+
+
+def set_current_stage(telemetry):
+    """
+    Add the database queries made in the current context to the telemetry of a stage.
+
+    The context is copied by :func:`asgiref.sync.sync_to_async`, so queries made in other threads
+    on behalf of the stage are recorded as well.
+    """
+    _current_stage.set(telemetry)
+
+
+def _time_query(execute, sql, params, many, context):
+    telemetry = _current_stage.get()
+    if telemetry is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        telemetry.db_queries += 1
+        telemetry.db_time += time.perf_counter() - start
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer)
+
+
+def report(stages):
+    """
+    Log the telemetry of the stages of a pipeline that ran.
+
+    With ``TASK_DIAGNOSTICS`` enabled, the telemetry is also added to the ``stages.json`` file of
+    the diagnostics of the current task.
+
+    Args:
+        stages (list): The :class:`~pulpcore.plugin.stages.Stage` objects of the pipeline.
+    """
+    telemetry = [stage.telemetry.as_dict() for stage in stages]
+    for stage in telemetry:
+        log.debug(
+            "%(name)s - %(items_in)d items in %(batches)d batches, %(duration).2fs: "
+            "%(input_wait).2fs waiting for input, %(output_wait).2fs waiting for output, "
+            "%(db_queries)d queries in %(db_time).2fs.",
+            stage,
+        )
+
+    task_id = os.environ.get("PULP_TASK_ID")
+    if not settings.TASK_DIAGNOSTICS or task_id is None:
+        return
+    path = VAR_TMP_PULP / task_id / "stages.json"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pipelines = json.loads(path.read_text()) if path.exists() else []
+        pipelines.append(telemetry)
+        path.write_text(json.dumps(pipelines, indent=2))
+    except (OSError, ValueError) as e:
+        log.warning("Could not write the telemetry of the pipeline to %s: %s", path, e)
+    else:
+        log.info("Writing the telemetry of the pipeline to %s", path)
@@ -2,15 +2,163 @@ import asyncio
 
 from asgiref.sync import sync_to_async
 
-from aiohttp import hdrs
-from aiohttp.web import StreamResponse
+from aiohttp import ClientSession, hdrs
+from aiohttp.helpers import ETAG_ANY
+from aiohttp.web import FileResponse, StreamResponse
 from aiohttp.web_exceptions import (
+    HTTPNotModified,
     HTTPPartialContent,
+    HTTPPreconditionFailed,
     HTTPRequestRangeNotSatisfiable,
 )
+from django.utils.http import http_date, parse_http_date_safe
+from multidict import CIMultiDict
 
 from pulpcore.app.models import Artifact
 
+# Storages whose files can be fetched with an HTTP GET of their (signed) url
+OBJECT_STORAGE_CLASSES = (
+    "storages.backends.s3boto3.S3Boto3Storage",
+    "storages.backends.azure_storage.AzureStorage",
+    "storages.backends.gcloud.GoogleCloudStorage",
+)
+
+_object_storage_sessions = {}
+
+
+def _get_object_storage_session(domain_pk):
+    """
+    Get the session holding the connection pool to the object storage of a domain.
+    """
+    key = (asyncio.get_running_loop(), domain_pk)
+    session = _object_storage_sessions.get(key)
+    if session is None or session.closed:
+        session = _object_storage_sessions[key] = ClientSession(raise_for_status=True)
+    return session
+
+
+def artifact_validators(artifact):
+    """
+    Get the headers identifying the file of an Artifact in conditional requests.
+
+    Artifacts are content addressed, so their sha256 digest is a strong ``ETag``.
+
+    Args:
+        artifact (:class:`~pulpcore.plugin.models.Artifact`): The artifact being served.
+
+    Returns:
+        dict: The ``ETag`` and ``Last-Modified`` headers.
+    """
+    headers = {}
+    if artifact.sha256:
+        headers["ETag"] = '"{}"'.format(artifact.sha256)
+    if artifact.pulp_created:
+        headers[hdrs.LAST_MODIFIED] = http_date(artifact.pulp_created.timestamp())
+    return headers
+
+
+def _etag_matches(etag, etags, weak):
+    if len(etags) == 1 and etags[0].value == ETAG_ANY:
+        return True
+    if etag is None:
+        return False
+    value = etag.strip('"')
+    return any(e.value == value and (weak or not e.is_weak) for e in etags)
+
+
+def conditional_response(request, headers):
+    """
+    Evaluate the conditional headers of a request, as described in RFC 7232.
+
+    Args:
+        request (:class:`aiohttp.web.Request`): The request.
+        headers (dict): The headers of the response to the request, with the ``ETag`` and
+            ``Last-Modified`` headers identifying its version.
+
+    Returns:
+        The :class:`~aiohttp.web_exceptions.HTTPNotModified` or
+            :class:`~aiohttp.web_exceptions.HTTPPreconditionFailed` response to send instead, or
+            None if the response should be sent.
+    """
+    headers = CIMultiDict(headers)
+    etag = headers.get(hdrs.ETAG)
+    last_modified = parse_http_date_safe(headers.get(hdrs.LAST_MODIFIED) or "")
+
+    if request.if_match is not None:
+        if not _etag_matches(etag, request.if_match, weak=False):
+            return HTTPPreconditionFailed()
+    elif request.if_unmodified_since is not None and last_modified is not None:
+        if last_modified > request.if_unmodified_since.timestamp():
+            return HTTPPreconditionFailed()
+
+    not_modified = False
+    if request.if_none_match is not None:
+        not_modified = _etag_matches(etag, request.if_none_match, weak=True)
+    elif request.if_modified_since is not None and last_modified is not None:
+        not_modified = last_modified <= request.if_modified_since.timestamp()
+    if not_modified:
+        validators = {k: headers[k] for k in (hdrs.ETAG, hdrs.LAST_MODIFIED) if k in headers}
+        return HTTPNotModified(headers=validators)
+    return None
+
+
+def _if_range_matches(request, headers):
+    # The Range of a request is ignored if the If-Range header doesn't identify the file
+    if_range = request.headers.get(hdrs.IF_RANGE)
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == headers.get(hdrs.ETAG)
+    last_modified = parse_http_date_safe(headers.get(hdrs.LAST_MODIFIED) or "")
+    return (
+        request.if_range is not None
+        and last_modified is not None
+        and request.if_range.timestamp() == last_modified
+    )
+
+
+class ArtifactFileResponse(FileResponse):
+    """
+    A FileResponse for the file of an Artifact on the local filesystem.
+
+    aiohttp identifies files by their modification time and size. The ``ETag`` and
+    ``Last-Modified`` headers given to this response, see :func:`artifact_validators`, identify the
+    file instead. The conditions of the request are expected to be evaluated against them with
+    :func:`conditional_response` before the response is sent.
+    """
+
+    async def prepare(self, request):
+        headers = request.headers.copy()
+        for header in (
+            hdrs.IF_MATCH,
+            hdrs.IF_NONE_MATCH,
+            hdrs.IF_MODIFIED_SINCE,
+            hdrs.IF_UNMODIFIED_SINCE,
+            hdrs.IF_RANGE,
+        ):
+            headers.popall(header, None)
+        if not _if_range_matches(request, self.headers):
+            headers.popall(hdrs.RANGE, None)
+        return await super().prepare(request.clone(headers=headers))
+
+    @property
+    def etag(self):
+        return FileResponse.etag.fget(self)
+
+    @etag.setter
+    def etag(self, value):
+        if hdrs.ETAG not in self.headers:
+            FileResponse.etag.fset(self, value)
+
+    @property
+    def last_modified(self):
+        return FileResponse.last_modified.fget(self)
+
+    @last_modified.setter
+    def last_modified(self, value):
+        if hdrs.LAST_MODIFIED not in self.headers:
+            FileResponse.last_modified.fset(self, value)
+
 
 class ArtifactResponse(StreamResponse):
     """A response object can be used to send artifacts."""
@@ -34,13 +182,57 @@ class ArtifactResponse(StreamResponse):
         self._artifact_pk = artifact_pk
         self._chunk_size = chunk_size
 
-    async def _sendfile(self, request, fobj, offset, count):
-        # To keep memory usage low, fobj is transferred in chunks
-        # controlled by the constructor's chunk_size argument.
+    def _local_path(self):
+        """
+        Get the path of the artifact's file if its storage keeps it on the local filesystem.
 
+        Returns:
+            str: The absolute path of the file, or None if the storage has no local paths.
+        """
+        try:
+            return self._file.path
+        except NotImplementedError:
+            return None
+
+    async def _sendfile(self, request, fobj, offset, count):
+        # Let the kernel copy files opened from the local filesystem directly to the socket.
         writer = await super().prepare(request)
         assert writer is not None
 
+        if self.compression:
+            return await self._sendfile_fallback(writer, fobj, offset, count)
+
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.sendfile(request.transport, fobj, offset, count)
+        except NotImplementedError:
+            return await self._sendfile_fallback(writer, fobj, offset, count)
+
+        await super().write_eof()
+        return writer
+
+    async def _stream_object(self, request, offset, count):
+        # Fetch the requested range of the object with an async HTTP request, so no executor thread
+        # is blocked by a slow object storage. The read-ahead is bounded by the chunk size.
+        loop = asyncio.get_event_loop()
+        url = await loop.run_in_executor(None, self._file.storage.url, self._file.name)
+        headers = {}
+        if count < self._artifact.size:
+            headers[hdrs.RANGE] = "bytes={}-{}".format(offset, offset + count - 1)
+        session = _get_object_storage_session(self._artifact.pulp_domain_id)
+        async with session.get(url, headers=headers, read_bufsize=self._chunk_size) as response:
+            if headers and response.status != HTTPPartialContent.status_code:
+                raise RuntimeError("The object storage ignored the Range of the request.")
+            writer = await super().prepare(request)
+            assert writer is not None
+            async for chunk in response.content.iter_chunked(self._chunk_size):
+                await writer.write(chunk)
+        await writer.drain()
+        return writer
+
+    async def _sendfile_fallback(self, writer, fobj, offset, count):
+        # To keep memory usage low, fobj is transferred in chunks
+        # controlled by the constructor's chunk_size argument.
         loop = asyncio.get_event_loop()
 
         await loop.run_in_executor(None, fobj.seek, offset)
@@ -72,13 +264,12 @@ class ArtifactResponse(StreamResponse):
             self.content_type = "application/octet-stream"
 
         status = self._status
-        file_size = self._file.size
+        file_size = self._artifact.size
         count = file_size
 
         start = None
 
-        ifrange = request.if_range
-        if ifrange is None:
+        if _if_range_matches(request, self.headers):
             try:
                 rng = request.http_range
                 start = rng.start
@@ -154,7 +345,44 @@ class ArtifactResponse(StreamResponse):
         else:
             offset = 0
 
+        path = self._local_path()
+        if path is None and self._artifact.pulp_domain.storage_class in OBJECT_STORAGE_CLASSES:
+            return await self._stream_object(request, offset, count)
+        elif path is None:
+            writer = await super().prepare(request)
+            assert writer is not None
+            try:
+                return await self._sendfile_fallback(writer, self._file, offset, count)
+            finally:
+                await loop.run_in_executor(None, self._file.close)
+
+        fobj = await loop.run_in_executor(None, open, path, "rb")
         try:
-            return await self._sendfile(request, self._file, offset, count)
+            return await self._sendfile(request, fobj, offset, count)
         finally:
-            await loop.run_in_executor(None, self._file.close)
+            await loop.run_in_executor(None, fobj.close)
+
+
+class BufferedStreamResponse(StreamResponse):
+    """
+    A StreamResponse that keeps a copy of the data it sends, as long as it is small enough.
+
+    This allows small streamed responses to be cached.
+
+    Args:
+        max_buffer_size (int): The maximum number of bytes to keep a copy of. The copy is dropped
+            once more data is sent.
+    """
+
+    def __init__(self, *args, max_buffer_size=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._max_buffer_size = max_buffer_size
+        self.body_copy = bytearray() if max_buffer_size else None
+
+    async def write(self, data):
+        if self.body_copy is not None:
+            if len(self.body_copy) + len(data) > self._max_buffer_size:
+                self.body_copy = None
+            else:
+                self.body_copy.extend(data)
+        await super().write(data)
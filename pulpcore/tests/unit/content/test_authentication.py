@@ -0,0 +1,111 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authentication import BaseAuthentication, BasicAuthentication
+
+from pulpcore.content import authentication, routing
+from pulpcore.content.handler import Handler
+
+
+class ContentHandler(Handler):
+    async def stream_content(self, request):
+        return web.Response(text=str(request["user"]))
+
+
+@override_settings(CONTENT_APP_DISTRIBUTION_CACHE=True, CONTENT_APP_AUTHENTICATION_CACHE_TTL=60)
+class AuthenticateTestCase(SimpleTestCase):
+    def setUp(self):
+        self.domain = Mock()
+        self.distribution = Mock(content_guard_id=None)
+        self.authenticated = []
+        self.authenticator = BasicAuthentication()
+
+        async def get_domain(name):
+            return self.domain
+
+        async def lookup_distribution(path):
+            return self.distribution
+
+        def perform_authentication(view, request):
+            self.authenticated.append(request)
+            user = request.META.get("HTTP_AUTHORIZATION") or request.META.get("HTTP_X_REMOTE_USER")
+            request.user = user or "anonymous"
+            request.auth = None
+            request._authenticator = self.authenticator if user else None
+
+        patchers = [
+            patch.object(authentication.routing, "get_domain", get_domain),
+            patch.object(ContentHandler, "_lookup_distribution", staticmethod(lookup_distribution)),
+            patch.object(authentication, "validate_domain", Mock(return_value=self.domain)),
+            patch.object(authentication.APIView, "perform_authentication", perform_authentication),
+            patch.dict(authentication._authenticated, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, *headers):
+        async def run():
+            app = web.Application(middlewares=[authentication.authenticate])
+            app.router.add_get("/pulp/content/{path:.+}", ContentHandler().stream_content)
+            async with TestClient(TestServer(app)) as client:
+                texts = []
+                for header in headers:
+                    response = await client.get("/pulp/content/foo/bar", headers=header)
+                    texts.append(await response.text())
+                return texts
+
+        return asyncio.run(run())
+
+    def test_unguarded(self):
+        """Requests for distributions without a content guard are not authenticated."""
+        self.assertEqual(self.get({"Authorization": "alice"}), ["AnonymousUser"])
+        self.assertEqual(self.authenticated, [])
+
+    def test_guarded(self):
+        """The users credentials were authenticated as are remembered."""
+        self.distribution.content_guard_id = 1
+        texts = self.get(
+            {"Authorization": "alice"}, {"Authorization": "bob"}, {"Authorization": "alice"}
+        )
+        self.assertEqual(texts, ["alice", "bob", "alice"])
+        self.assertEqual(len(self.authenticated), 2)
+
+    @override_settings(CONTENT_APP_AUTHENTICATION_CACHE_TTL=0)
+    def test_guarded_no_cache(self):
+        """Every request is authenticated without a TTL."""
+        self.distribution.content_guard_id = 1
+        self.get({"Authorization": "alice"}, {"Authorization": "alice"})
+        self.assertEqual(len(self.authenticated), 2)
+
+    def test_no_credentials(self):
+        """Requests without credentials are authenticated every time."""
+        self.distribution.content_guard_id = 1
+        self.assertEqual(self.get({}, {}), ["anonymous", "anonymous"])
+        self.assertEqual(len(self.authenticated), 2)
+
+    @override_settings(REMOTE_USER_ENVIRON_NAME="HTTP_X_REMOTE_USER")
+    def test_remote_user(self):
+        """The entry named by REMOTE_USER_ENVIRON_NAME identifies the credentials."""
+        self.distribution.content_guard_id = 1
+        texts = self.get({"X_REMOTE_USER": "alice"}, {}, {"X_REMOTE_USER": "alice"})
+        self.assertEqual(texts, ["alice", "anonymous", "alice"])
+        self.assertEqual(len(self.authenticated), 2)
+
+    def test_other_authenticator(self):
+        """Users authenticated by other authentication classes are not remembered."""
+        self.distribution.content_guard_id = 1
+        self.authenticator = BaseAuthentication()
+        self.get({"Authorization": "alice"}, {"Authorization": "alice"})
+        self.assertEqual(len(self.authenticated), 2)
+
+    def test_permissions_changed(self):
+        """The users are forgotten when permissions change."""
+        self.distribution.content_guard_id = 1
+        self.get({"Authorization": "alice"})
+        routing.invalidate_guard_decisions()
+        self.get({"Authorization": "alice"})
+        self.assertEqual(len(self.authenticated), 2)
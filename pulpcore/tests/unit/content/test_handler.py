@@ -1,10 +1,21 @@
+import asyncio
+import json
+import os
+import re
 import tempfile
+import unittest
+from uuid import uuid4
 
-from unittest.mock import Mock
+from unittest.mock import MagicMock, Mock, patch
 
-from django.test import TestCase
+from aiohttp import web
+from aiohttp.client_exceptions import ClientConnectionError, ClientResponseError
+from aiohttp.web_exceptions import HTTPForbidden, HTTPNotFound
+from aiohttp.test_utils import TestClient, TestServer
+from django.test import SimpleTestCase, TestCase, override_settings
 
-from pulpcore.content import Handler
+from pulpcore.content import Handler, routing, sources
+from pulpcore.content import handler as handler_module
 from pulpcore.plugin.models import Artifact, Content, ContentArtifact
 
 
@@ -47,3 +58,384 @@ class HandlerSaveContentTestCase(TestCase):
         c2 = Content.objects.get(pk=self.c2.pk)
         self.assertEqual(existing_artifact.pk, new_artifact.pk)
         self.assertEqual(c2._artifacts.get().pk, existing_artifact.pk)
+
+    def test_save_artifacts(self):
+        """The artifacts of a batch of downloads are saved together."""
+        first, second = self.download_result_mock(), self.download_result_mock()
+        artifacts = Handler()._save_artifacts([(first, self.ra1), (second, self.ra2)])
+        self.assertEqual(artifacts[0].pk, artifacts[1].pk)
+        self.assertEqual(Content.objects.get(pk=self.c1.pk)._artifacts.get().pk, artifacts[0].pk)
+        self.assertEqual(Content.objects.get(pk=self.c2.pk)._artifacts.get().pk, artifacts[0].pk)
+        self.assertFalse(os.path.exists(second.path))
+
+    def test_save_artifacts_artifact_already_exists(self):
+        """Existing artifacts are reused by batches."""
+        new_artifact = Handler()._save_artifact(self.download_result_mock(), self.ra1)
+        artifacts = Handler()._save_artifacts([(self.download_result_mock(), self.ra2)])
+        self.assertEqual(artifacts[0].pk, new_artifact.pk)
+        self.assertEqual(Content.objects.get(pk=self.c2.pk)._artifacts.get().pk, new_artifact.pk)
+
+
+class HandlerDirectoryListingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.names = ["file{:03}".format(i) for i in range(25)] + ["dir/"]
+        self.queries = []
+
+        def directory_entries(querysets, path, after=None, limit=None, extra=()):
+            self.queries.append((after, limit))
+            names = sorted(n for n in [*self.names, *extra] if after is None or n > after)
+            return [(name, None) for name in names[:limit]]
+
+        patchers = [
+            patch.object(Handler, "_listing_querysets", Mock(return_value=[])),
+            patch.object(Handler, "_directory_entries", staticmethod(directory_entries)),
+            patch("pulpcore.content.handler.LISTING_BATCH_SIZE", 10),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def list_directory(self, query=""):
+        distro = Mock(content_handler_list_directory=Mock(return_value={"extra/"}))
+
+        async def handler(request):
+            self.response = await Handler()._stream_directory_listing(
+                request, distro, Mock(), None, ""
+            )
+            return self.response
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/pulp/content/foo/", handler)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.get("/pulp/content/foo/" + query)
+                return response.status, await response.text()
+
+        return asyncio.run(run())
+
+    def test_listing(self):
+        """All entries are listed in order, fetched in batches."""
+        status, body = self.list_directory()
+        self.assertEqual(status, 200)
+        self.assertIn('<a href="../">../</a>', body)
+        names = re.findall(r'<a href="([^"]*)">', body)[1:]
+        self.assertEqual(names, sorted([*self.names, "extra/"]))
+        self.assertEqual(len(self.queries), 3)
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_listing_kept_for_cache(self):
+        """Listings are kept in memory to be cached, whatever STREAMED_RESPONSE_MAX_SIZE is."""
+        status, body = self.list_directory()
+        self.assertEqual(self.response.body_copy.decode(), body)
+
+    @override_settings(CONTENT_APP_LISTING_PAGE_SIZE=20)
+    def test_pagination(self):
+        """Listings end with a link to the next page."""
+        status, body = self.list_directory()
+        names = re.findall(r'<a href="([^"]*)">', body)[1:]
+        self.assertEqual(len(names), 21)
+        self.assertEqual(names[-1], "?after=file017")
+        status, body = self.list_directory("?after=file017")
+        names = re.findall(r'<a href="([^"]*)">', body)[1:]
+        self.assertEqual(names, ["file{:03}".format(i) for i in range(18, 25)])
+
+    @override_settings(CONTENT_APP_LISTING_PAGE_SIZE=20)
+    def test_json_listing(self):
+        """Listings are sent as JSON documents when asked for."""
+        status, body = self.list_directory("?format=json")
+        document = json.loads(body)
+        self.assertEqual(len(document["entries"]), 20)
+        self.assertEqual(
+            document["entries"][0], {"name": "dir/", "type": "directory", "modified": None}
+        )
+        self.assertEqual(document["next"], "?format=json&after=file017")
+
+
+class HandlerResolveRequestTestCase(unittest.TestCase):
+    def distribution(self, **kwargs):
+        attributes = dict(
+            base_path="foo",
+            content_guard=None,
+            repository=None,
+            publication=None,
+            repository_version=None,
+            remote=None,
+            content_handler=Mock(return_value=None),
+        )
+        attributes.update(kwargs)
+        return Mock(**attributes)
+
+    def test_content_handler_result(self):
+        """The result of the content handler of the distribution is all that is resolved."""
+        distro = self.distribution(content_handler=Mock(return_value="response"))
+        resolved = Handler().resolve_request(Mock(), "/foo/bar/baz", distro)
+        distro.content_handler.assert_called_once_with("bar/baz")
+        self.assertEqual(resolved.content_handler_result, "response")
+        self.assertIs(resolved.distribution, distro)
+        self.assertFalse(resolved.guarded)
+
+    def test_nothing_to_serve(self):
+        """Distributions not pointing to anything resolve to nothing."""
+        resolved = Handler().resolve_request(Mock(), "/foo/bar", self.distribution())
+        self.assertEqual(resolved.relative_path, "bar")
+        self.assertIsNone(resolved.content_handler_result)
+        self.assertIsNone(resolved.content_artifact)
+        self.assertIsNone(resolved.remote_artifact)
+        self.assertFalse(resolved.list_directory)
+
+
+class HandlerPermitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.guard = Mock(pk=1, pulp_last_updated=2)
+        self.guard.cast.return_value = self.guard
+        self.guard.permit_cache_key.return_value = ("user", 3)
+        self.distribution = Mock(content_guard=self.guard)
+        for patcher in [
+            patch.object(routing, "_listening", True),
+            patch.dict(routing._decisions, clear=True),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_decision_is_reused(self):
+        """Guards are only asked once for requests with the same key."""
+        self.assertTrue(Handler._permit(Mock(), self.distribution))
+        self.assertTrue(Handler._permit(Mock(), self.distribution))
+        self.guard.permit.assert_called_once()
+
+    def test_denial_is_reused(self):
+        """Denials are reused with their reason."""
+        self.guard.permit.side_effect = PermissionError("denied")
+        for _ in range(2):
+            with self.assertRaises(HTTPForbidden) as e:
+                Handler._permit(Mock(), self.distribution)
+            self.assertEqual(e.exception.reason, "denied")
+        self.guard.permit.assert_called_once()
+
+    def test_decision_without_key(self):
+        """Guards without a key are asked for every request."""
+        self.guard.permit_cache_key.return_value = None
+        Handler._permit(Mock(), self.distribution)
+        Handler._permit(Mock(), self.distribution)
+        self.assertEqual(self.guard.permit.call_count, 2)
+
+
+class FakeDownloader:
+    def __init__(self, chunks, headers_ready_callback):
+        self.chunks = chunks
+        self.headers_ready_callback = headers_ready_callback
+        self.path = tempfile.NamedTemporaryFile(delete=False).name
+        self._writer = open(self.path, "wb")
+
+    async def handle_data(self, data):
+        self._writer.write(data)
+
+    def flush(self):
+        self._writer.flush()
+
+    async def finalize(self):
+        self._writer.close()
+
+    async def run(self):
+        await self.headers_ready_callback({"Content-Type": "application/octet-stream"})
+        for chunk in self.chunks:
+            await self.handle_data(chunk)
+            await asyncio.sleep(0)
+        await self.finalize()
+        return Mock(path=self.path)
+
+
+@override_settings(CONTENT_APP_DECOUPLE_DOWNLOADS=True)
+class HandlerDecoupledDownloadTestCase(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(sources.forget)
+        self.chunks = [bytes([i]) * 1000 for i in range(10)]
+        remote = Mock(policy="on_demand")
+        remote.name = "remote"
+        remote.get_downloader = lambda remote_artifact, headers_ready_callback: FakeDownloader(
+            self.chunks, headers_ready_callback
+        )
+        self.remote_artifact = Mock(size=None, url="https://example.com/file", remote_id=1)
+        self.remote_artifact.remote.cast.return_value = remote
+        self.remote = remote
+        self.saved = []
+        patcher = patch.object(
+            Handler, "_save_artifact", lambda handler, result, ra: self.saved.append(result)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self):
+        async def handler(request):
+            return await Handler()._stream_remote_artifact(
+                request, web.StreamResponse(), self.remote_artifact
+            )
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/{path:.+}", handler)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.get("/file")
+                status, body = response.status, await response.read()
+            await asyncio.gather(*handler_module._background_downloads)
+            return status, body
+
+        return asyncio.run(run())
+
+    def test_stream(self):
+        """The response is streamed from the file the download is written to."""
+        status, body = self.get()
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b"".join(self.chunks))
+        self.assertEqual(len(self.saved), 1)
+        os.unlink(self.saved[0].path)
+
+    def test_retried(self):
+        """The saved artifact is served when the downloader retried the download."""
+        artifact = Artifact(pulp_domain_id=uuid4())
+        served = []
+
+        class RetryingDownloader(FakeDownloader):
+            async def run(self):
+                # The headers of the first attempt
+                await self.headers_ready_callback({"Content-Type": "application/octet-stream"})
+                return await super().run()
+
+        async def serve_content_artifact(handler, content_artifact, headers, request):
+            served.append(content_artifact)
+            return web.Response(body=b"saved")
+
+        self.remote.get_downloader = lambda remote_artifact, headers_ready_callback: (
+            RetryingDownloader(self.chunks, headers_ready_callback)
+        )
+        self.remote_artifact.content_artifact.relative_path = "file"
+        with patch.object(
+            Handler,
+            "_save_artifact",
+            lambda handler, result, ra: self.saved.append(result) or artifact,
+        ), patch.object(Handler, "_serve_content_artifact", serve_content_artifact):
+            status, body = self.get()
+        self.assertEqual((status, body), (200, b"saved"))
+        self.assertEqual(len(served), 1)
+        self.assertIs(served[0].artifact, artifact)
+        self.assertEqual(served[0].relative_path, "file")
+        os.unlink(self.saved[0].path)
+
+    @override_settings(CONTENT_APP_SAVE_BATCH_INTERVAL=0.01)
+    def test_batched_save(self):
+        """The artifacts of downloads are saved in batches."""
+        batches = []
+
+        def save_artifacts(handler, downloads):
+            batches.append([result for result, ra in downloads])
+            return [Mock() for download in downloads]
+
+        async def run():
+            handler = Handler()
+            await asyncio.gather(
+                handler._download_in_background(self.remote, self.remote_artifact, MagicMock()),
+                handler._download_in_background(self.remote, self.remote_artifact, MagicMock()),
+            )
+
+        with patch.object(Handler, "_save_artifacts", save_artifacts), patch.object(
+            handler_module, "get_domain", Mock(return_value=Mock(pk=1))
+        ):
+            asyncio.run(run())
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 2)
+        for result in batches[0]:
+            os.unlink(result.path)
+
+    def stream_in_race(self, lost):
+        async def run():
+            with self.assertRaises(handler_module.RaceLost):
+                await Handler()._stream_remote_artifact(
+                    MagicMock(http_range=slice(None, None)),
+                    Mock(),
+                    self.remote_artifact,
+                    claim=lambda: False,
+                    lost=lambda: lost,
+                )
+            await asyncio.gather(*handler_module._background_downloads, return_exceptions=True)
+
+        asyncio.run(run())
+
+    def test_race_lost(self):
+        """The download of a source losing a race is cancelled."""
+        self.stream_in_race(lost=True)
+        self.assertEqual(self.saved, [])
+
+    def test_race_not_lost(self):
+        """The download goes on if the race was given up for another reason."""
+        self.stream_in_race(lost=False)
+        self.assertEqual(len(self.saved), 1)
+        os.unlink(self.saved[0].path)
+
+
+NOT_FOUND = ClientResponseError(Mock(), (), status=404)
+
+
+class HandlerRaceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(sources.forget)
+        self.started = []
+        self.cancelled = []
+
+        async def stream_remote_artifact(
+            handler, request, response, remote_artifact, claim=None, lost=None
+        ):
+            self.started.append(remote_artifact.url)
+            try:
+                await asyncio.sleep(remote_artifact.delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(remote_artifact.url)
+                raise
+            if remote_artifact.fails:
+                raise remote_artifact.fails
+            if not claim():
+                raise handler_module.RaceLost()
+            return remote_artifact.url
+
+        patcher = patch.object(Handler, "_stream_remote_artifact", stream_remote_artifact)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def race(self, *sources):
+        remote_artifacts = [
+            Mock(url=url, delay=delay, fails=fails) for url, delay, fails in sources
+        ]
+        response = Mock(prepared=False)
+        return asyncio.run(
+            Handler()._race_remote_artifacts(Mock(), response, remote_artifacts, 0.05)
+        )
+
+    def test_fast_first_source(self):
+        """The next source is not tried if the first one answers in time."""
+        self.assertEqual(self.race(("fast", 0, False), ("slow", 0, False)), "fast")
+        self.assertEqual(self.started, ["fast"])
+
+    def test_hedge(self):
+        """The next source is tried when the first one is slow, and the slower is cancelled."""
+        self.assertEqual(self.race(("slow", 1, False), ("fast", 0, False)), "fast")
+        self.assertEqual(self.started, ["slow", "fast"])
+        self.assertEqual(self.cancelled, ["slow"])
+
+    def test_failure(self):
+        """The next source is tried right away when one fails."""
+        self.assertEqual(self.race(("broken", 0, NOT_FOUND), ("slow", 0.2, False)), "slow")
+        self.assertEqual(self.started, ["broken", "slow"])
+
+    def test_connection_failures(self):
+        """The next source is tried when one can't be reached or times out."""
+        texts = self.race(
+            ("reset", 0, ClientConnectionError()),
+            ("timeout", 0, asyncio.TimeoutError()),
+            ("healthy", 0.2, False),
+        )
+        self.assertEqual(texts, "healthy")
+        self.assertEqual(self.started, ["reset", "timeout", "healthy"])
+
+    def test_all_fail(self):
+        """The file is not found if no source has it."""
+        with self.assertRaises(HTTPNotFound):
+            self.race(("broken", 0, NOT_FOUND), ("missing", 0, NOT_FOUND))
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase
+
+from multidict import CIMultiDict
+
+from django.test import override_settings
+
+from pulpcore.content import inflight
+
+
+async def collect(download, data_file, **kwargs):
+    data = b""
+    async for chunk in inflight.follow(download, data_file, **kwargs):
+        data += chunk
+    return data
+
+
+class InflightDownloadTestCase(TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.TemporaryDirectory()
+        self.data_file = tempfile.NamedTemporaryFile(dir=self.working_directory.name)
+
+    def tearDown(self):
+        self.data_file.close()
+        self.working_directory.cleanup()
+
+    async def write(self, download, chunks):
+        download.set_headers(CIMultiDict({"Content-Length": str(sum(map(len, chunks)))}))
+        for chunk in chunks:
+            await asyncio.sleep(0)
+            self.data_file.write(chunk)
+            self.data_file.flush()
+            download.add_data(self.data_file.name, len(chunk))
+        download.finish()
+
+    def test_follow_running_download(self):
+        """A request attached to a download receives all the data written by the owner."""
+
+        async def run():
+            with inflight.InflightDownload("key") as download:
+                self.assertIs(inflight.get_inflight_download("key"), download)
+                writer = asyncio.ensure_future(self.write(download, [b"abc", b"def", b"ghi"]))
+                self.assertTrue(await download.wait_for_file())
+                with download.open_data_file() as data_file:
+                    data = await collect(download, data_file)
+                await writer
+            self.assertIsNone(inflight.get_inflight_download("key"))
+            return data
+
+        self.assertEqual(asyncio.run(run()), b"abcdefghi")
+
+    def test_follow_range(self):
+        """A request attached to a download can ask for a range of the data."""
+
+        async def run():
+            with inflight.InflightDownload("key") as download:
+                writer = asyncio.ensure_future(self.write(download, [b"abc", b"def", b"ghi"]))
+                await download.wait_for_file()
+                with download.open_data_file() as data_file:
+                    data = await collect(download, data_file, start=2, stop=7)
+                await writer
+            return data
+
+        self.assertEqual(asyncio.run(run()), b"cdefg")
+
+    def test_failed_download(self):
+        """Attached requests notice when the owner gives up on the download."""
+
+        async def run():
+            download = inflight.InflightDownload("key")
+            with download:
+                pass
+            return await download.wait_for_file()
+
+        self.assertFalse(asyncio.run(run()))
+
+    def test_lock_is_exclusive(self):
+        """Only one owner can hold the lock and others follow it through the lock file."""
+
+        async def run():
+            with override_settings(WORKING_DIRECTORY=self.working_directory.name):
+                lock = inflight.DownloadLock("key")
+                self.assertTrue(lock.acquire())
+                self.assertFalse(inflight.DownloadLock("key").acquire())
+                foreign = inflight.ForeignDownload.open("key")
+                with inflight.InflightDownload("key", lock=lock) as download:
+                    await self.write(download, [b"abc", b"def"])
+                self.assertFalse(os.path.exists(lock.path))
+                self.assertTrue(await foreign.wait_for_file())
+                self.assertEqual(foreign.headers, [["Content-Length", "6"]])
+                with foreign.open_data_file() as data_file:
+                    data = await collect(foreign, data_file)
+                foreign.close()
+                return data
+
+        self.assertEqual(asyncio.run(run()), b"abcdef")
@@ -0,0 +1,215 @@
+import json
+import os
+import time
+import unittest
+from datetime import datetime, timedelta
+from itertools import islice
+from uuid import uuid4
+
+from django.test import TestCase
+
+from pulpcore.app.models import (
+    ContentArtifact,
+    Publication,
+    PublishedArtifact,
+    PublishedMetadata,
+    Repository,
+)
+from pulpcore.content.handler import LISTING_BATCH_SIZE, Handler
+from pulpcore.content.listing import (
+    HtmlListing,
+    JsonListing,
+    directory_entries,
+    entry_name,
+    merge_entries,
+)
+
+DAY = datetime(2023, 1, 1)
+
+# The benchmarks take a while and only run when this environment variable is set
+BENCHMARKS = bool(os.environ.get("PULP_BENCHMARKS"))
+
+
+class DirectoryEntriesTestCase(unittest.TestCase):
+    def test_entry_name(self):
+        """Names are the first component below the directory."""
+        self.assertEqual(entry_name("a/b/c", ""), "a/")
+        self.assertEqual(entry_name("a/b/c", "a/"), "b/")
+        self.assertEqual(entry_name("a/b/c", "a/b/"), "c")
+        self.assertEqual(entry_name("a//b", ""), "a//")
+
+    def test_directory_entries(self):
+        """Each entry is found once, with the latest date of the files below it."""
+        rows = [
+            ("a-b", DAY),
+            ("a/b", DAY),
+            ("a/c/d", DAY + timedelta(days=1)),
+            ("a/e", None),
+            ("b", None),
+        ]
+        self.assertEqual(
+            list(directory_entries(rows, "")),
+            [("a-b", DAY), ("a/", DAY + timedelta(days=1)), ("b", None)],
+        )
+        self.assertEqual(
+            list(directory_entries(rows[1:4], "a/")), [("b", DAY), ("c/", rows[2][1]), ("e", None)]
+        )
+
+    def test_merge_entries(self):
+        """Entries of sorted streams are merged, keeping the latest dates."""
+        first = [("a", DAY), ("c/", None)]
+        second = [("a", DAY + timedelta(days=1)), ("b", None), ("c/", DAY)]
+        self.assertEqual(
+            list(merge_entries(first, second)),
+            [("a", DAY + timedelta(days=1)), ("b", None), ("c/", DAY)],
+        )
+
+
+class ListingRenderingTestCase(unittest.TestCase):
+    entries = [("dir/", None), ("<file>", DAY)]
+
+    def test_html(self):
+        """Names are escaped in HTML listings."""
+        listing = HtmlListing("/pulp/content/foo/")
+        html = listing.header() + listing.entries(self.entries) + listing.footer("<file>")
+        self.assertIn('<a href="&lt;file&gt;">&lt;file&gt;</a>', html)
+        self.assertIn("01-Jan-2023 00:00", html)
+        self.assertIn('<a href="?after=%3Cfile%3E">', html)
+
+    def test_json(self):
+        """JSON listings are valid across batches of entries."""
+        listing = JsonListing("/pulp/content/foo/")
+        document = json.loads(
+            listing.header()
+            + listing.entries(self.entries[:1])
+            + listing.entries(self.entries[1:])
+            + listing.footer()
+        )
+        self.assertEqual(
+            document,
+            {
+                "path": "/pulp/content/foo/",
+                "entries": [
+                    {"name": "dir/", "type": "directory", "modified": None},
+                    {"name": "<file>", "type": "file", "modified": "2023-01-01T00:00:00"},
+                ],
+                "next": None,
+            },
+        )
+
+
+@unittest.skipUnless(BENCHMARKS, "Set PULP_BENCHMARKS to run the benchmarks")
+class ListingBenchmarkTestCase(unittest.TestCase):
+    """
+    Renders the listings of a synthetic tree of a million files in a thousand directories.
+
+    This covers the rendering of the listings and the Python grouping of paths, which is what lists
+    the distributions. The entries of publications and repository versions are grouped in the
+    database, see :class:`DirectoryEntriesBenchmarkTestCase`.
+    """
+
+    DIRECTORIES = 1000
+    FILES = 1000
+    # The seconds each step may take per file, a few times what it takes on a laptop
+    MAX_SECONDS_PER_FILE = 5e-6
+
+    def test_benchmark(self):
+        rows = [
+            ("packages/{:03}/file{:07}.rpm".format(i, i * self.FILES + j), DAY)
+            for i in range(self.DIRECTORIES)
+            for j in range(self.FILES)
+        ]
+        timings = {}
+
+        start = time.perf_counter()
+        directories = list(directory_entries(rows, "packages/"))
+        timings["names"] = time.perf_counter() - start
+
+        for renderer in (HtmlListing, JsonListing):
+            start = time.perf_counter()
+            for i, (directory, date) in enumerate(directories):
+                path = "packages/" + directory
+                listing = renderer("/pulp/content/foo/" + path)
+                files = rows[i * self.FILES : (i + 1) * self.FILES]
+                body = listing.header()
+                body += listing.entries(directory_entries(files, path))
+                body += listing.footer()
+            timings[renderer.__name__] = time.perf_counter() - start
+
+        self.assertEqual(len(directories), self.DIRECTORIES)
+        self.assertEqual(len(json.loads(body)["entries"]), self.FILES)
+        for step, duration in timings.items():
+            self.assertLess(
+                duration / len(rows),
+                self.MAX_SECONDS_PER_FILE,
+                "{} took {:.1f}s for {} files".format(step, duration, len(rows)),
+            )
+
+
+@unittest.skipUnless(BENCHMARKS, "Set PULP_BENCHMARKS to run the benchmarks")
+class DirectoryEntriesBenchmarkTestCase(TestCase):
+    """
+    Lists a publication of a hundred thousand files in a hundred directories from the database.
+
+    The entries grouped by ``Handler._directory_entries`` are compared with fetching the paths of
+    all the files below the directory and grouping them in Python.
+    """
+
+    DIRECTORIES = 100
+    FILES = 1000
+
+    def setUp(self):
+        repository = Repository.objects.create(name=str(uuid4()))
+        self.publication = Publication.objects.create(
+            repository_version=repository.latest_version()
+        )
+        content = PublishedMetadata.objects.create(
+            relative_path="metadata", publication=self.publication
+        )
+        paths = [
+            "packages/{:03}/file{:07}.rpm".format(i, i * self.FILES + j)
+            for i in range(self.DIRECTORIES)
+            for j in range(self.FILES)
+        ]
+        content_artifacts = ContentArtifact.objects.bulk_create(
+            (ContentArtifact(content=content, relative_path=path) for path in paths),
+            batch_size=10000,
+        )
+        PublishedArtifact.objects.bulk_create(
+            (
+                PublishedArtifact(
+                    relative_path=ca.relative_path,
+                    content_artifact=ca,
+                    publication=self.publication,
+                )
+                for ca in content_artifacts
+            ),
+            batch_size=10000,
+        )
+
+    def list_in_python(self, path):
+        rows = (
+            self.publication.published_artifact.filter(relative_path__startswith=path)
+            .order_by("relative_path")
+            .values_list("relative_path", "content_artifact__pulp_created")
+        )
+        return list(islice(directory_entries(rows.iterator(), path), LISTING_BATCH_SIZE))
+
+    def list_in_database(self, path):
+        querysets = Handler._listing_querysets(None, self.publication)
+        return Handler._directory_entries(querysets, path, limit=LISTING_BATCH_SIZE)
+
+    def test_benchmark(self):
+        for path in ("packages/", "packages/000/"):
+            timings = {}
+            for method in (self.list_in_python, self.list_in_database):
+                start = time.perf_counter()
+                entries = method(path)
+                timings[method.__name__] = time.perf_counter() - start
+            self.assertEqual(entries, self.list_in_python(path))
+            # Listing the top directory returns a hundred rows instead of a hundred thousand
+            self.assertLess(
+                timings["list_in_database"],
+                timings["list_in_python"] * (0.5 if path == "packages/" else 2),
+                "Listing {}: {}".format(path, timings),
+            )
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from pulpcore.content import routing
+
+
+class DistributionTableTestCase(TestCase):
+    def setUp(self):
+        self.domain = Mock(pk=uuid4())
+        self.other_domain = Mock(pk=uuid4())
+        self.loaded = []
+
+        def load_distributions(distro_model, domain):
+            self.loaded.append(domain)
+            return {"foo": Mock(base_path="foo", pulp_domain=domain)}
+
+        patchers = [
+            patch.object(routing, "load_distributions", load_distributions),
+            patch.object(routing, "_listening", True),
+            patch.dict(routing._tables, clear=True),
+            patch.dict(routing._domains, clear=True),
+            patch.dict(routing._decisions, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, domain):
+        return asyncio.run(routing.get_distributions(Mock, domain))
+
+    def test_table_is_loaded_once(self):
+        """The distributions of a domain are only loaded for the first request."""
+        self.assertIn("foo", self.get(self.domain))
+        self.assertIn("foo", self.get(self.domain))
+        self.assertEqual(self.loaded, [self.domain])
+
+    def test_concurrent_requests_share_the_load(self):
+        """Concurrent requests for a domain that is not loaded yet wait for the same load."""
+
+        async def run():
+            return await asyncio.gather(
+                *(routing.get_distributions(Mock, self.domain) for _ in range(3))
+            )
+
+        tables = asyncio.run(run())
+        self.assertIs(tables[0], tables[1])
+        self.assertIs(tables[0], tables[2])
+        self.assertEqual(self.loaded, [self.domain])
+
+    def test_invalidate_domain(self):
+        """A notification only drops the table of the domain that changed."""
+        self.get(self.domain)
+        self.get(self.other_domain)
+        routing.invalidate(str(self.domain.pk))
+        self.get(self.domain)
+        self.get(self.other_domain)
+        self.assertEqual(self.loaded, [self.domain, self.other_domain, self.domain])
+
+    def test_not_listening(self):
+        """The table is not used while the content app doesn't receive notifications."""
+        with patch.object(routing, "_listening", False):
+            self.assertIsNone(self.get(self.domain))
+        self.assertEqual(self.loaded, [])
+
+    def test_domain_is_loaded_once(self):
+        """Domains are kept until a change of the domain is announced."""
+        with patch.object(routing.Domain.objects, "get", Mock(return_value=self.domain)) as get:
+            self.assertIs(asyncio.run(routing.get_domain("default")), self.domain)
+            self.assertIs(asyncio.run(routing.get_domain("default")), self.domain)
+            routing.invalidate(str(self.other_domain.pk))
+            asyncio.run(routing.get_domain("default"))
+            self.assertEqual(get.call_count, 1)
+            routing.invalidate(str(self.domain.pk))
+            asyncio.run(routing.get_domain("default"))
+            self.assertEqual(get.call_count, 2)
+
+    def test_guard_decisions(self):
+        """Decisions are dropped when permissions change, even while they are being made."""
+        generation = routing.permissions_generation()
+        routing.set_guard_decision("key", generation, True)
+        self.assertEqual(routing.get_guard_decision("key"), (True, None))
+        routing.invalidate_guard_decisions()
+        self.assertIsNone(routing.get_guard_decision("key"))
+        routing.set_guard_decision("key", generation, False, "denied")
+        self.assertIsNone(routing.get_guard_decision("key"))
+
+    def test_stale_guard_decisions(self):
+        """Decisions stored while permissions changed are dropped when they are read."""
+        generation = routing.permissions_generation()
+        routing.invalidate_guard_decisions()
+        # Stored by a thread that checked the generation before the invalidation
+        routing._decisions["key"] = (time.monotonic() + 60, generation, (True, None))
+        self.assertIsNone(routing.get_guard_decision("key"))
+        self.assertNotIn("key", routing._decisions)
@@ -0,0 +1,46 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+
+from pulpcore.content import saving
+
+
+class SaveQueueTestCase(TestCase):
+    def setUp(self):
+        self.batches = []
+
+        def save_batch(downloads):
+            self.batches.append(downloads)
+            return [ValueError(d) if d < 0 else d * 2 for d in downloads]
+
+        self.queue = saving.SaveQueue(save_batch, interval=0.01)
+
+    def save(self, *downloads):
+        async def run():
+            futures = [self.queue.save(download) for download in downloads]
+            return await asyncio.gather(*futures, return_exceptions=True)
+
+        return asyncio.run(run())
+
+    def test_batch(self):
+        """Downloads queued together are saved together."""
+        self.assertEqual(self.save(1, 2, 3), [2, 4, 6])
+        self.assertEqual(self.batches, [[1, 2, 3]])
+
+    def test_max_batch_size(self):
+        """Batches are saved as soon as they are full."""
+        with patch.object(saving, "SAVE_BATCH_MAX_SIZE", 2):
+            self.assertEqual(self.save(1, 2, 3), [2, 4, 6])
+        self.assertEqual(self.batches, [[1, 2], [3]])
+
+    def test_failures(self):
+        """Only the downloads that failed to be saved get an exception."""
+        results = self.save(1, -1)
+        self.assertEqual(results[0], 2)
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_batch_failure(self):
+        """All the downloads of a batch that failed to be saved get its exception."""
+        self.queue.save_batch = lambda downloads: 1 / 0
+        results = self.save(1, 2)
+        self.assertTrue(all(isinstance(result, ZeroDivisionError) for result in results))
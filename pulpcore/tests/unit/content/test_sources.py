@@ -0,0 +1,41 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from pulpcore.content import sources
+
+
+class SourcesTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(sources.forget)
+
+    def measure(self, remote_pk, first_byte, size=0, duration=1):
+        with patch.object(sources.time, "monotonic", Mock(return_value=0)):
+            measurement = sources.Measurement(remote_pk)
+        with patch.object(sources.time, "monotonic", Mock(return_value=first_byte)):
+            measurement.headers_received()
+        measurement.data_received(size)
+        with patch.object(sources.time, "monotonic", Mock(return_value=first_byte + duration)):
+            measurement.finished()
+        return measurement
+
+    def test_expected_duration(self):
+        """The time to first byte and the throughput of the remotes are averaged."""
+        self.assertIsNone(sources.expected_duration(1))
+        self.measure(1, first_byte=1.0, size=100)
+        self.assertEqual(sources.expected_duration(1), 1.0)
+        self.assertEqual(sources.expected_duration(1, size=200), 3.0)
+        self.measure(1, first_byte=2.0)
+        self.assertAlmostEqual(sources.expected_duration(1), 1.3)
+
+    def test_failure(self):
+        """Remotes that failed are expected to be slow."""
+        self.measure(1, first_byte=1.0).failed()
+        self.assertGreater(sources.expected_duration(1), 1.0)
+
+    def test_order_by_latency(self):
+        """The fastest remotes come first, then the ones never downloaded from."""
+        self.measure(1, first_byte=2.0)
+        self.measure(2, first_byte=0.1)
+        remote_artifacts = [Mock(remote_id=pk, size=None) for pk in (3, 1, 4, 2)]
+        ordered = sources.order_by_latency(remote_artifacts)
+        self.assertEqual([ra.remote_id for ra in ordered], [2, 1, 3, 4])
@@ -1,12 +1,17 @@
 import os
 import tempfile
 from unittest import mock
+from uuid import uuid4
 
 from django.core.files.storage import default_storage as storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from django.conf import settings
-from django.test import TestCase
+from django.db import models
+from django.db.models.signals import post_save
+from django_lifecycle import BEFORE_SAVE, hook
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import isolate_apps
 from pulpcore.plugin.exceptions import (
     UnsupportedDigestValidationError,
     MissingDigestValidationError,
@@ -16,9 +21,12 @@ from pulpcore.plugin.models import (
     Artifact,
     Content,
     ContentArtifact,
+    Publication,
+    PublishedMetadata,
     PulpTemporaryFile,
     Remote,
     RemoteArtifact,
+    Repository,
 )
 
 
@@ -58,6 +66,96 @@ class ContentCRUDTestCase(TestCase):
         self.assertFalse(Content.objects.filter(pk=content.pk).exists())
 
 
+@isolate_apps("pulpcore.app")
+class ContentBulkCreateTestCase(SimpleTestCase):
+    def content_type(self, **attrs):
+        meta = type("Meta", (), {"app_label": "core", "default_related_name": "+"})
+        attrs.update({"__module__": __name__, "Meta": meta, "name": models.TextField()})
+        return type("BulkContent", (Content,), attrs)
+
+    def test_can_bulk_create(self):
+        self.assertTrue(self.content_type().can_bulk_create())
+        self.assertFalse(Content.can_bulk_create())
+
+    def test_opt_out(self):
+        self.assertFalse(self.content_type(BULK_CREATE=False).can_bulk_create())
+
+    def test_save_overridden(self):
+        def save(self, *args, **kwargs):
+            super(type(self), self).save(*args, **kwargs)
+
+        self.assertFalse(self.content_type(save=save).can_bulk_create())
+
+    def test_lifecycle_hooks(self):
+        @hook(BEFORE_SAVE)
+        def set_name(self):
+            self.name = "name"
+
+        self.assertFalse(self.content_type(set_name=set_name).can_bulk_create())
+
+    def test_signal_receivers(self):
+        content_type = self.content_type()
+
+        def receiver(sender, **kwargs):
+            pass
+
+        post_save.connect(receiver, sender=content_type)
+        self.addCleanup(post_save.disconnect, receiver, sender=content_type)
+        self.assertFalse(content_type.can_bulk_create())
+
+
+class ContentBulkGetOrCreateTestCase(TestCase):
+    def setUp(self):
+        repository = Repository.objects.create(name=str(uuid4()))
+        self.publication = Publication.objects.create(
+            repository_version=repository.latest_version()
+        )
+        self.existing = self.unit("existing")
+        self.existing.save()
+
+    def unit(self, relative_path):
+        return PublishedMetadata(relative_path=relative_path, publication=self.publication)
+
+    def test_bulk_get_or_create_content(self):
+        units = [self.unit("a"), self.unit("existing"), self.unit("b"), self.unit("a")]
+        results = Content.objects.bulk_get_or_create_content(units)
+
+        self.assertEqual(len(results), 4)
+        # New units are inserted and returned in their place
+        for unit, result in ((units[0], results[0]), (units[2], results[2])):
+            self.assertIs(result, unit)
+            self.assertFalse(unit._state.adding)
+            self.assertEqual(unit._state.db, "default")
+            self.assertEqual(unit.pk, unit.pulp_id)
+            master = Content.objects.get(pk=unit.pk)
+            self.assertEqual(master.pulp_type, PublishedMetadata.get_pulp_type())
+            self.assertIsNotNone(master.pulp_created)
+            self.assertEqual(
+                PublishedMetadata.objects.get(pk=unit.pk).relative_path, unit.relative_path
+            )
+        # Units conflicting with existing ones or with others of the batch are replaced by them
+        self.assertIsNot(results[1], units[1])
+        self.assertEqual(results[1].pk, self.existing.pk)
+        self.assertIsNot(results[3], units[3])
+        self.assertEqual(results[3].pk, units[0].pk)
+        for unit in (units[1], units[3]):
+            self.assertTrue(unit._state.adding)
+            self.assertIsNone(unit.pk)
+            self.assertFalse(Content.objects.filter(pk=unit.pulp_id).exists())
+
+        self.assertEqual(
+            sorted(
+                PublishedMetadata.objects.filter(publication=self.publication).values_list(
+                    "relative_path", flat=True
+                )
+            ),
+            ["a", "b", "existing"],
+        )
+        self.assertEqual(
+            Content.objects.filter(pulp_type=PublishedMetadata.get_pulp_type()).count(), 3
+        )
+
+
 class PulpTemporaryFileTestCase(TestCase):
     def test_storage_location(self):
         if settings.DEFAULT_FILE_STORAGE != "pulpcore.app.models.storage.FileSystem":
@@ -1,7 +1,8 @@
 from itertools import compress
+from unittest import mock
 
 from django.test import TestCase
-from pulpcore.plugin.models import Content, Repository, RepositoryVersion
+from pulpcore.plugin.models import Content, ContentArtifact, Repository, RepositoryVersion
 
 
 class RepositoryVersionTestCase(TestCase):
@@ -260,6 +261,21 @@ class RepositoryTestCase(TestCase):
             self.repository.latest_version().number, 0, self.repository.latest_version().number
         )
 
+    @mock.patch("pulpcore.app.models.repository.notify_distributions_changed")
+    def test_notify_distributions_changed(self, notify):
+        """The content apps are told when a repository changes or gets a new version."""
+        self.repository.description = "changed"
+        self.repository.save()
+        notify.assert_called_with(self.repository.pulp_domain_id)
+
+        version = RepositoryVersion.objects.create(
+            repository=self.repository, number=self.repository.next_version
+        )
+        notify.reset_mock()
+        version.complete = True
+        version.save()
+        notify.assert_called_once_with(self.repository.pulp_domain_id)
+
     def test_next_version_with_multiple_versions(self):
         self.assertEqual(self.repository.next_version, 1, self.repository.next_version)
         self.assertEqual(
@@ -289,3 +305,26 @@ class RepositoryTestCase(TestCase):
         self.assertEqual(
             self.repository.latest_version().number, 1, self.repository.latest_version().number
         )
+
+    def test_content_artifacts_index(self):
+        content_artifacts = [
+            ContentArtifact(content_id=pk, relative_path=f"path/{i}")
+            for i, pk in enumerate(self.pks)
+        ]
+        ContentArtifact.objects.bulk_create(content_artifacts)
+
+        with self.repository.new_version() as version1:
+            version1.add_content(self.content_qs(self.pks[:3]))
+        with self.repository.new_version() as version2:
+            version2.remove_content(self.content_qs(self.pks[:1]))
+
+        version0 = RepositoryVersion.objects.get(number=0, repository=self.repository)
+        self.assertFalse(version0.content_artifacts_indexed)
+        self.assertTrue(version1.content_artifacts_indexed)
+        self.assertTrue(version2.content_artifacts_indexed)
+
+        self.assertEqual(version1.get_content_artifacts("path/0").get(), content_artifacts[0])
+        self.assertFalse(version2.get_content_artifacts("path/0").exists())
+        self.assertEqual(version2.get_content_artifacts("path/2").get(), content_artifacts[2])
+        self.assertFalse(version2.get_content_artifacts("path/3").exists())
+        self.assertFalse(version0.get_content_artifacts("path/0").exists())
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from pulpcore.plugin.models import Artifact
+from pulpcore.plugin.stages import DeclarativeArtifact, DeclarativeContent, QueryExistingArtifacts
+
+
+def digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+class QueryExistingArtifactsTestCase(TestCase):
+    """Runs the stage on batches of 10k artifacts, half of which already exist."""
+
+    BATCH_SIZE = 10000
+
+    def setUp(self):
+        Artifact.objects.bulk_create(
+            Artifact(file="artifact/{}".format(i), size=1, sha256=digest(i))
+            for i in range(0, self.BATCH_SIZE, 2)
+        )
+
+    def run_stage(self, d_contents):
+        async def run():
+            in_q, out_q = asyncio.Queue(), asyncio.Queue()
+            stage = QueryExistingArtifacts()
+            stage._connect(in_q, out_q)
+            for d_content in d_contents:
+                in_q.put_nowait(d_content)
+            in_q.put_nowait(None)
+            await stage()
+
+        async_to_sync(run)()
+
+    def declarative_content(self, i, digest_type="sha256"):
+        artifact = Artifact(size=1, **{digest_type: digest(i)})
+        d_artifact = DeclarativeArtifact(artifact=artifact, url="", relative_path=str(i))
+        return DeclarativeContent(content=None, d_artifacts=[d_artifact])
+
+    def test_existing_artifacts(self):
+        """Existing artifacts are fetched and touched with one query per digest type."""
+        d_contents = [self.declarative_content(i) for i in range(self.BATCH_SIZE)]
+        start = time.perf_counter()
+        with self.assertNumQueries(1):
+            self.run_stage(d_contents)
+        duration = time.perf_counter() - start
+
+        existing = [dc.d_artifacts[0].artifact for dc in d_contents[::2]]
+        new = [dc.d_artifacts[0].artifact for dc in d_contents[1::2]]
+        self.assertFalse(any(artifact._state.adding for artifact in existing))
+        self.assertTrue(all(artifact._state.adding for artifact in new))
+        self.assertEqual(existing[1].sha256, digest(2))
+        self.assertLess(duration, 30, "Querying 10k artifacts took {:.1f}s".format(duration))
+
+    def test_digest_types(self):
+        """Artifacts are looked up by their first known digest."""
+        d_contents = [self.declarative_content(0), self.declarative_content(2, "sha512")]
+        with self.assertNumQueries(2):
+            self.run_stage(d_contents)
+        self.assertFalse(d_contents[0].d_artifacts[0].artifact._state.adding)
+        self.assertTrue(d_contents[1].d_artifacts[0].artifact._state.adding)
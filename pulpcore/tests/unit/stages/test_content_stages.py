@@ -0,0 +1,32 @@
+from uuid import uuid4
+
+from django.test import TestCase
+
+from pulpcore.plugin.models import Publication, PublishedMetadata, Repository
+from pulpcore.plugin.stages import ContentSaver, DeclarativeContent
+
+
+class ContentSaverBulkCreateTestCase(TestCase):
+    def setUp(self):
+        repository = Repository.objects.create(name=str(uuid4()))
+        self.publication = Publication.objects.create(
+            repository_version=repository.latest_version()
+        )
+        self.existing = self.unit("existing")
+        self.existing.save()
+
+    def unit(self, relative_path):
+        return PublishedMetadata(relative_path=relative_path, publication=self.publication)
+
+    def test_bulk_create(self):
+        new = DeclarativeContent(content=self.unit("new"))
+        conflicting = DeclarativeContent(content=self.unit("existing"))
+        saved = DeclarativeContent(content=self.existing)
+
+        created = ContentSaver._bulk_create([new, conflicting, saved])
+
+        self.assertEqual(created, {id(new)})
+        self.assertFalse(new.content._state.adding)
+        self.assertTrue(PublishedMetadata.objects.filter(pk=new.content.pk).exists())
+        self.assertEqual(conflicting.content.pk, self.existing.pk)
+        self.assertIs(saved.content, self.existing)
@@ -1,9 +1,17 @@
 import asyncio
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
 
 import asynctest
 import mock
 
-from pulpcore.plugin.stages import Stage, EndStage, DeclarativeContent
+from django.test import override_settings
+
+from pulpcore.plugin.stages import Stage, EndStage, DeclarativeContent, create_pipeline
+from pulpcore.plugin.stages.api import AdaptiveBatchSize, partition
 
 
 class TestStage(asynctest.TestCase):
@@ -78,6 +86,205 @@ class TestStage(asynctest.TestCase):
         with self.assertRaises(StopAsyncIteration):
             await batch_it.__anext__()
 
+    async def test_max_size(self):
+        self.stage.batch_max_size = 2
+        contents = [DeclarativeContent(mock.Mock()) for i in range(5)]
+        for content in contents:
+            self.in_q.put_nowait(content)
+        self.in_q.put_nowait(None)
+        batches = [batch async for batch in self.stage.batches(minsize=1)]
+        self.assertEqual(batches, [contents[:2], contents[2:4], contents[4:]])
+
+    async def test_max_latency(self):
+        self.stage.batch_max_latency = 0.01
+        c1 = DeclarativeContent(mock.Mock())
+        self.in_q.put_nowait(c1)
+        batch_it = self.stage.batches(minsize=10)
+        self.assertEqual([c1], await asyncio.wait_for(batch_it.__anext__(), 1))
+        self.in_q.put_nowait(None)
+        with self.assertRaises(StopAsyncIteration):
+            await batch_it.__anext__()
+
+    async def test_adaptive_batching(self):
+        self.stage.adaptive_batching = True
+        for i in range(6):
+            self.in_q.put_nowait(DeclarativeContent(mock.Mock()))
+        batch_it = self.stage.batches(minsize=2)
+        self.assertEqual(len(await batch_it.__anext__()), 6)
+        # A whole batch was waiting, the next batch waits for twice as many items
+        for i in range(3):
+            self.in_q.put_nowait(DeclarativeContent(mock.Mock()))
+        next_batch = asyncio.ensure_future(batch_it.__anext__())
+        await asyncio.sleep(0.01)
+        self.assertFalse(next_batch.done())
+        self.in_q.put_nowait(DeclarativeContent(mock.Mock()))
+        self.assertEqual(len(await next_batch), 4)
+
+
+class TestAdaptiveBatchSize(asynctest.TestCase):
+    def setUp(self):
+        self.queue = asyncio.Queue()
+        self.batch_size = AdaptiveBatchSize(2, maxsize=8)
+
+    def test_grow(self):
+        self.assertEqual(self.batch_size.adapt(self.queue), 2)
+        for i in range(2):
+            self.queue.put_nowait(mock.Mock())
+        self.assertEqual(self.batch_size.adapt(self.queue), 4)
+        for i in range(10):
+            self.queue.put_nowait(mock.Mock())
+        self.assertEqual(self.batch_size.adapt(self.queue), 8)
+        self.assertEqual(self.batch_size.adapt(self.queue), 8)
+
+    @mock.patch("pulpcore.plugin.stages.api._memory_usage", return_value=2000)
+    def test_memory_pressure(self, memory_usage):
+        for i in range(10):
+            self.queue.put_nowait(mock.Mock())
+        with override_settings(STAGES_MEMORY_LIMIT=1000):
+            self.assertEqual(self.batch_size.adapt(self.queue), 1)
+            self.assertTrue(self.batch_size.shrunk)
+        self.assertEqual(self.batch_size.adapt(self.queue), 2)
+        self.assertFalse(self.batch_size.shrunk)
+
+
+class TestCreatePipeline(asynctest.TestCase):
+    async def test_tuning(self):
+        class SizedStage(Stage):
+            queue_size = 5
+            batch_min_size = 3
+
+            async def run(self):
+                async for batch in self.batches():
+                    for content in batch:
+                        await self.put(content)
+
+        class FirstStage(Stage):
+            async def run(self):
+                await self.put(mock.Mock())
+
+        stages = [FirstStage(), SizedStage(), EndStage()]
+        await create_pipeline(stages, maxsize=2, batch_min_size=10, batch_max_latency=1)
+        self.assertEqual(stages[0]._out_q.maxsize, 5)
+        self.assertEqual(stages[1]._out_q.maxsize, 2)
+        self.assertEqual(stages[1].batch_min_size, 3)
+        self.assertEqual(stages[1].batch_max_latency, 1)
+        self.assertEqual(stages[2].batch_min_size, 10)
+
+
+class TestShards(asynctest.TestCase):
+    def test_partition(self):
+        items = ["a", "b", "c", "a", "d", "b"]
+        groups = partition(items, str, 3)
+        self.assertLessEqual(len(groups), 3)
+        self.assertCountEqual(sum(groups, []), items)
+        for group in groups:
+            self.assertTrue(group)
+            self.assertEqual(group, [item for item in items if item in group])
+        self.assertEqual(partition(items, str, 1), [items])
+
+    @mock.patch("pulpcore.plugin.stages.api.connection")
+    async def test_run_in_shards(self, connection):
+        stage = Stage()
+        stage.db_workers = 4
+        threads = set()
+
+        def func(shard):
+            threads.add(threading.get_ident())
+            return sorted(shard)
+
+        items = list(range(100))
+        results = await stage._run_in_shards(func, items, lambda item: item % 10)
+        self.assertGreater(len(results), 1)
+        self.assertLessEqual(len(results), 4)
+        self.assertCountEqual(sum(results, []), items)
+        for key in range(10):
+            self.assertEqual(sum(any(item % 10 == key for item in result) for result in results), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+
+        # The threads and their connections are kept for the next batches
+        await stage._run_in_shards(func, items, lambda item: item % 10)
+        self.assertLessEqual(len(threads), 4)
+        connection.close.assert_not_called()
+        await stage._close_shards()
+        self.assertEqual(connection.close.call_count, 4)
+
+    @mock.patch("pulpcore.plugin.stages.api.connection")
+    async def test_run_in_shards_failure(self, connection):
+        stage = Stage()
+        stage.db_workers = 2
+
+        def func(shard):
+            if 0 in shard:
+                raise ValueError()
+            return shard
+
+        with self.assertRaises(ValueError):
+            await stage._run_in_shards(func, [0, 1, 2, 3], lambda item: item)
+        await stage._close_shards()
+        self.assertEqual(connection.close.call_count, 2)
+
+    @mock.patch("pulpcore.plugin.stages.api.connection")
+    async def test_shards_closed(self, connection):
+        """The threads of the shards are stopped when the stage finishes."""
+
+        class ShardedStage(Stage):
+            db_workers = 2
+
+            async def run(self):
+                await self._run_in_shards(sorted, [0, 1, 2, 3], lambda item: item)
+
+        stage = ShardedStage()
+        stage._connect(asyncio.Queue(), asyncio.Queue())
+        await stage()
+        self.assertEqual(stage._shard_executors, [])
+        self.assertEqual(connection.close.call_count, 2)
+
+    async def test_run_in_one_shard(self):
+        stage = Stage()
+        results = await stage._run_in_shards(sorted, [3, 1, 2], lambda item: item)
+        self.assertEqual(results, [[1, 2, 3]])
+
+
+class TestStageTelemetry(asynctest.TestCase):
+    class FirstStage(Stage):
+        async def run(self):
+            for i in range(10):
+                await self.put(mock.Mock())
+
+    class BatchStage(Stage):
+        async def run(self):
+            async for batch in self.batches(minsize=4):
+                for content in batch:
+                    await self.put(content)
+
+    async def test_counts(self):
+        stages = [self.FirstStage(), self.BatchStage(), EndStage()]
+        await create_pipeline(stages, batch_max_size=4)
+        first, middle, end = [stage.telemetry.as_dict() for stage in stages]
+        self.assertEqual(first["items_in"], 0)
+        self.assertEqual(first["items_out"], 10)
+        self.assertEqual(middle["items_in"], 10)
+        self.assertEqual(middle["items_out"], 10)
+        self.assertGreaterEqual(middle["batches"], 3)
+        self.assertLessEqual(middle["max_batch_size"], 4)
+        self.assertEqual(end["items_in"], 10)
+        for stage in (first, middle, end):
+            self.assertGreaterEqual(stage["duration"], stage["input_wait"] + stage["output_wait"])
+
+    @override_settings(TASK_DIAGNOSTICS=True)
+    async def test_task_diagnostics(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch(
+            "pulpcore.plugin.stages.telemetry.VAR_TMP_PULP", Path(tmp)
+        ), mock.patch.dict(os.environ, {"PULP_TASK_ID": "task"}):
+            await create_pipeline([self.FirstStage(), EndStage()])
+            await create_pipeline([self.FirstStage(), self.BatchStage(), EndStage()])
+            pipelines = json.loads((Path(tmp) / "task" / "stages.json").read_text())
+        self.assertEqual(len(pipelines), 2)
+        self.assertEqual(
+            [stage["name"] for stage in pipelines[1]], ["FirstStage", "BatchStage", "EndStage"]
+        )
+        self.assertEqual(pipelines[1][1]["items_out"], 10)
+
 
 class TestMultipleStages(asynctest.TestCase):
     class FirstStage(Stage):
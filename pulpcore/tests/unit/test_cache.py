@@ -1,8 +1,22 @@
+import json
 from time import sleep
+
+import asynctest
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web_exceptions import HTTPNotFound
 from django.test import TestCase
-from unittest import skipUnless
+from unittest import TestCase as SimpleTestCase, skipUnless
+from unittest.mock import patch
 
-from pulpcore.cache import Cache, ConnectionError
+from pulpcore.cache import Cache, ConnectionError, invalidate_on_commit
+from pulpcore.cache.cache import (
+    ENTRY_MAGIC,
+    AsyncContentCache,
+    LocalCache,
+    dump_entry,
+    load_entry,
+)
+from pulpcore.content.handler import PathNotResolved
 
 
 try:
@@ -100,3 +114,150 @@ class CacheBasicOperationsTestCase(TestCase):
         cache.redis.flushdb()
         for key, _, base_key in tuples:
             self.assertFalse(cache.exists(key, base_key=base_key))
+
+    def test_08_invalidate_on_commit(self):
+        """Tests that base-keys are deleted together once the transaction is committed"""
+        cache = Cache()
+        cache.set("key", "hi", base_key="base1")
+        cache.set("key", "there", base_key="base2")
+        with patch.object(Cache, "delete", wraps=cache.delete) as delete:
+            with self.captureOnCommitCallbacks(execute=True):
+                invalidate_on_commit("base1")
+                invalidate_on_commit(["base1", "base2"])
+                self.assertEqual(2, cache.exists(base_key=["base1", "base2"]))
+        delete.assert_called_once_with(base_key=["base1", "base2"])
+        self.assertEqual(0, cache.exists(base_key=["base1", "base2"]))
+
+
+class CacheEntryFormatTestCase(SimpleTestCase):
+    """Tests the serialization of cached responses"""
+
+    def test_small_body(self):
+        """Tests that small bodies are stored as they are"""
+        entry = {"type": "Response", "status": 200, "headers": {"Content-Type": "text/html"}}
+        data = dump_entry(entry, b"<html></html>")
+        self.assertTrue(data.startswith(ENTRY_MAGIC))
+        self.assertTrue(data.endswith(b"<html></html>"))
+        self.assertEqual(load_entry(data), (entry, b"<html></html>"))
+
+    def test_large_body(self):
+        """Tests that large bodies are compressed"""
+        entry = {"type": "Response", "status": 200, "headers": {}}
+        body = b"<a href='package.rpm'>package.rpm</a>\n" * 1000
+        data = dump_entry(entry, body)
+        self.assertLess(len(data), len(body))
+        self.assertEqual(load_entry(data), (entry, body))
+
+    def test_no_body(self):
+        """Tests entries without a body"""
+        entry = {"type": "FileResponse", "status": 200, "headers": {}, "path": "/tmp/file"}
+        self.assertEqual(load_entry(dump_entry(entry)), (entry, None))
+
+    def test_legacy_entry(self):
+        """Tests that JSON entries written by older versions can still be read"""
+        entry = {"type": "Response", "status": 200, "headers": {}}
+        data = json.dumps({**entry, "body": b"\x00binary".hex()}).encode()
+        self.assertEqual(load_entry(data), (entry, b"\x00binary"))
+
+    def test_corrupted_entry(self):
+        """Tests that corrupted entries are reported"""
+        with self.assertRaises(ValueError):
+            load_entry(ENTRY_MAGIC + b"\x01")
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    """Tests the in-process cache in front of Redis"""
+
+    def setUp(self):
+        self.cache = LocalCache(max_size=10, ttl=60)
+        self.cache.active = True
+
+    def test_set_get(self):
+        """Tests setting values, then getting them"""
+        self.cache.set("key", "value", base_key="base")
+        self.assertEqual(self.cache.get("key", "base"), b"value")
+        self.assertIsNone(self.cache.get("key", "other"))
+        self.assertTrue(self.cache.exists("base"))
+        self.assertFalse(self.cache.exists("other"))
+
+    def test_inactive(self):
+        """Tests that the cache is not used while it doesn't receive invalidations"""
+        self.cache.set("key", b"value", base_key="base")
+        self.cache.active = False
+        self.assertIsNone(self.cache.get("key", "base"))
+        self.assertFalse(self.cache.exists("base"))
+
+    def test_max_size(self):
+        """Tests that the least recently used entries are dropped"""
+        self.cache.set("a", b"1234", base_key="base")
+        self.cache.set("b", b"1234", base_key="base")
+        self.cache.get("a", "base")
+        self.cache.set("c", b"1234", base_key="base")
+        self.assertEqual(self.cache.get("a", "base"), b"1234")
+        self.assertIsNone(self.cache.get("b", "base"))
+        self.assertEqual(self.cache.get("c", "base"), b"1234")
+        self.cache.set("d", b"12345678901", base_key="base")
+        self.assertIsNone(self.cache.get("d", "base"))
+        self.assertEqual(self.cache.size, 8)
+
+    def test_ttl(self):
+        """Tests that entries expire"""
+        self.cache.ttl = -1
+        self.cache.set("key", b"value", base_key="base")
+        self.assertIsNone(self.cache.get("key", "base"))
+
+    def test_delete(self):
+        """Tests deleting entries by key and by base key"""
+        self.cache.set("a", b"1", base_key="base1")
+        self.cache.set("b", b"2", base_key="base1")
+        self.cache.set("a", b"3", base_key="base2")
+        self.cache.delete(key="a", base_key="base1")
+        self.assertIsNone(self.cache.get("a", "base1"))
+        self.assertEqual(self.cache.get("b", "base1"), b"2")
+        self.cache.delete(base_key=["base1", "base2"])
+        self.assertFalse(self.cache.exists("base1"))
+        self.assertFalse(self.cache.exists("base2"))
+        self.assertEqual(self.cache.size, 0)
+
+    def test_stale_value(self):
+        """Tests that values read from Redis before an invalidation are not cached"""
+        generation = self.cache.generation
+        self.cache.delete(base_key="base")
+        self.cache.set("key", b"value", base_key="base", generation=generation)
+        self.assertIsNone(self.cache.get("key", "base"))
+
+
+class AsyncContentCacheTestCase(asynctest.TestCase):
+    """Tests the entries and keys of the content app cache"""
+
+    def setUp(self):
+        self.cache = AsyncContentCache()
+        self.cache.set = asynctest.CoroutineMock()
+
+    def test_make_key(self):
+        """Tests that only the query parameters of directory listings are part of the keys"""
+        request = make_mocked_request("GET", "/pulp/content/dist/?after=a&format=json&x=1")
+        self.assertEqual(
+            self.cache.make_key(request), "/pulp/content/dist/?after=a&format=json:GET"
+        )
+        request = make_mocked_request("GET", "/pulp/content/dist/?x=1")
+        self.assertEqual(self.cache.make_key(request), "/pulp/content/dist/:GET")
+        request = make_mocked_request("GET", "/pulp/content/dist/pkg.rpm?after=a&x=1")
+        self.assertEqual(self.cache.make_key(request), "/pulp/content/dist/pkg.rpm:GET")
+
+    @patch("pulpcore.cache.cache.NEGATIVE_TTL", 10)
+    async def test_negative_entry(self):
+        """Tests that only the paths that could not be resolved are cached as not found"""
+        handler = asynctest.CoroutineMock(side_effect=PathNotResolved("/missing"))
+        with self.assertRaises(PathNotResolved):
+            await self.cache.make_entry("key", "base", handler, [], {})
+        entry, body = load_entry(self.cache.set.call_args[0][1])
+        self.assertEqual(entry["type"], "NotFound")
+
+    @patch("pulpcore.cache.cache.NEGATIVE_TTL", 10)
+    async def test_remote_not_found(self):
+        """Tests that other not found errors are not cached"""
+        handler = asynctest.CoroutineMock(side_effect=HTTPNotFound())
+        with self.assertRaises(HTTPNotFound):
+            await self.cache.make_entry("key", "base", handler, [], {})
+        self.cache.set.assert_not_called()
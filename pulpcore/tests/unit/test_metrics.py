@@ -0,0 +1,123 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore import metrics
+
+
+class MetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = patch.object(metrics, "_registry", [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render(self):
+        """Metrics are rendered in the Prometheus text format."""
+        counter = metrics.Counter("requests_total", "Requests.", labels=("status",))
+        histogram = metrics.Histogram("duration_seconds", "Durations.", buckets=(0.1, 1))
+        counter.inc(200)
+        counter.inc(200)
+        counter.inc(404)
+        histogram.observe(value=0.05)
+        histogram.observe(value=0.5)
+        histogram.observe(value=5)
+        self.assertEqual(
+            metrics.render(),
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{status="200"} 2\n'
+            'requests_total{status="404"} 1\n'
+            "# HELP duration_seconds Durations.\n"
+            "# TYPE duration_seconds histogram\n"
+            'duration_seconds_bucket{le="0.1"} 1\n'
+            'duration_seconds_bucket{le="1"} 2\n'
+            'duration_seconds_bucket{le="+Inf"} 3\n'
+            "duration_seconds_count 3\n"
+            "duration_seconds_sum 5.55\n",
+        )
+
+    def test_view(self):
+        """Metrics are only served to superusers."""
+        users = {
+            "anonymous": AnonymousUser(),
+            "user": Mock(is_authenticated=True, is_superuser=False),
+            "admin": Mock(is_authenticated=True, is_superuser=True),
+        }
+
+        @web.middleware
+        async def authenticate(request, handler):
+            request["user"] = users[request.headers["User"]]
+            return await handler(request)
+
+        async def run():
+            app = web.Application(middlewares=[authenticate])
+            app.router.add_get("/metrics", metrics.metrics_view)
+            async with TestClient(TestServer(app)) as client:
+                statuses = {}
+                for name in users:
+                    response = await client.get("/metrics", headers={"User": name})
+                    statuses[name] = response.status
+                return statuses
+
+        statuses = asyncio.run(run())
+        self.assertEqual(statuses, {"anonymous": 401, "user": 403, "admin": 200})
+
+
+class InstrumentTestCase(SimpleTestCase):
+    def setUp(self):
+        for metric in (metrics.requests_total, metrics.phase_duration):
+            metric.clear()
+            self.addCleanup(metric.clear)
+
+    def get(self, path, method="GET"):
+        async def handler(request):
+            with metrics.timer(request, "resolve"):
+                await asyncio.sleep(0.01)
+            if request.path == "/missing":
+                raise web.HTTPNotFound()
+            return web.Response(text="content")
+
+        async def run():
+            app = web.Application(middlewares=[metrics.instrument])
+            app.on_response_prepare.append(metrics.add_server_timing)
+            app.router.add_route("*", "/{path}", handler)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.request(method, path)
+                return response.status, response.headers
+
+        return asyncio.run(run())
+
+    def test_requests_are_recorded(self):
+        """The status of the requests and the time spent in their phases are recorded."""
+        self.get("/content")
+        self.get("/missing")
+        self.assertEqual(metrics.requests_total.value("GET", 200), 1)
+        self.assertEqual(metrics.requests_total.value("GET", 404), 1)
+        count, total = metrics.phase_duration.value("resolve")
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(total, 0.02)
+
+    def test_unknown_methods(self):
+        """Requests of methods not served by the content app are recorded as "other"."""
+        self.get("/content", method="HEAD")
+        self.get("/content", method="PURGE")
+        self.get("/content", method="DELETE")
+        self.assertEqual(metrics.requests_total.value("HEAD", 200), 1)
+        self.assertEqual(metrics.requests_total.value("other", 200), 2)
+        self.assertEqual(metrics.requests_total.value("PURGE", 200), 0)
+
+    def test_no_server_timing(self):
+        """The timings are not sent by default."""
+        status, headers = self.get("/content")
+        self.assertNotIn("Server-Timing", headers)
+
+    @override_settings(CONTENT_APP_SERVER_TIMING=True)
+    def test_server_timing(self):
+        """The timings are sent in the Server-Timing header."""
+        status, headers = self.get("/content")
+        phases = [timing.split(";")[0] for timing in headers["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["resolve", "total"])
@@ -0,0 +1,228 @@
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase
+from unittest.mock import Mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request
+
+from pulpcore.responses import (
+    ArtifactFileResponse,
+    ArtifactResponse,
+    BufferedStreamResponse,
+    artifact_validators,
+    conditional_response,
+)
+
+SHA256 = "b5bb9d8014a0f9b1d61e21e796d78dccdf1352f23cd32812f4850b878ae4944c"
+
+
+class ArtifactResponseTestCase(TestCase):
+    def setUp(self):
+        self.data = bytes(range(256)) * 1024
+        self.local_file = tempfile.NamedTemporaryFile()
+        self.local_file.write(self.data)
+        self.local_file.flush()
+
+    def tearDown(self):
+        self.local_file.close()
+
+    def local_artifact(self):
+        return Mock(size=len(self.data), file=Mock(path=self.local_file.name))
+
+    def remote_artifact(self, storage_class="example.storage.Storage"):
+        remote_file = open(self.local_file.name, "rb")
+        artifact_file = Mock(seek=remote_file.seek, read=Mock(wraps=remote_file.read))
+        artifact_file.name = "artifact"
+        type(artifact_file).path = property(Mock(side_effect=NotImplementedError))
+        artifact_file.close.side_effect = remote_file.close
+        artifact_file.storage.url = lambda name: self.object_storage_url + name
+        pulp_domain = Mock(storage_class=storage_class)
+        return Mock(size=len(self.data), file=artifact_file, pulp_domain=pulp_domain)
+
+    def get(self, artifact, headers=None, response_headers=None):
+        async def handler(request):
+            return ArtifactResponse(artifact, headers=response_headers)
+
+        async def object_storage_handler(request):
+            return web.FileResponse(self.local_file.name)
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            app.router.add_get("/storage/{name}", object_storage_handler)
+            async with TestClient(TestServer(app)) as client:
+                self.object_storage_url = str(client.make_url("/storage/"))
+                response = await client.get("/", headers=headers)
+                return response.status, response.headers, await response.read()
+
+        return asyncio.run(run())
+
+    def test_local_file(self):
+        """A file on the local filesystem is sent completely."""
+        status, headers, body = self.get(self.local_artifact())
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.data)
+
+    def test_local_file_range(self):
+        """A range of a file on the local filesystem is sent."""
+        status, headers, body = self.get(self.local_artifact(), headers={"Range": "bytes=10-299"})
+        self.assertEqual(status, 206)
+        self.assertEqual(headers["Content-Range"], f"bytes 10-299/{len(self.data)}")
+        self.assertEqual(body, self.data[10:300])
+
+    def test_remote_file_range(self):
+        """Files of storages without local paths are read in chunks."""
+        status, headers, body = self.get(self.remote_artifact(), headers={"Range": "bytes=-300"})
+        self.assertEqual(status, 206)
+        self.assertEqual(body, self.data[-300:])
+
+    def test_object_storage_range(self):
+        """Files of object storages are fetched with ranged requests."""
+        artifact = self.remote_artifact(storage_class="storages.backends.s3boto3.S3Boto3Storage")
+        status, headers, body = self.get(artifact, headers={"Range": "bytes=1000-"})
+        self.assertEqual(status, 206)
+        self.assertEqual(body, self.data[1000:])
+        artifact.file.read.assert_not_called()
+
+    def test_if_range(self):
+        """The Range is only honored if the If-Range header identifies the file."""
+        validators = {"ETag": f'"{SHA256}"'}
+        status, headers, body = self.get(
+            self.local_artifact(),
+            headers={"Range": "bytes=0-9", "If-Range": f'"{SHA256}"'},
+            response_headers=validators,
+        )
+        self.assertEqual(status, 206)
+        status, headers, body = self.get(
+            self.local_artifact(),
+            headers={"Range": "bytes=0-9", "If-Range": '"other"'},
+            response_headers=validators,
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.data)
+
+
+class ConditionalResponseTestCase(TestCase):
+    def setUp(self):
+        artifact = Mock(sha256=SHA256, pulp_created=datetime(2023, 5, 1, tzinfo=timezone.utc))
+        self.headers = artifact_validators(artifact)
+
+    def conditional(self, **headers):
+        request = make_mocked_request(
+            "GET", "/", headers={k.replace("_", "-"): v for k, v in headers.items()}
+        )
+        return conditional_response(request, self.headers)
+
+    def test_validators(self):
+        """Artifacts are identified by their digest and creation time."""
+        self.assertEqual(self.headers["ETag"], f'"{SHA256}"')
+        self.assertEqual(self.headers["Last-Modified"], "Mon, 01 May 2023 00:00:00 GMT")
+
+    def test_unconditional(self):
+        """Requests without conditions get the response."""
+        self.assertIsNone(self.conditional())
+
+    def test_if_none_match(self):
+        """Clients having the artifact are told it's not modified."""
+        response = self.conditional(If_None_Match=f'"other", W/"{SHA256}"')
+        self.assertIsInstance(response, web.HTTPNotModified)
+        self.assertEqual(response.headers["ETag"], f'"{SHA256}"')
+        self.assertIsNone(self.conditional(If_None_Match='"other"'))
+
+    def test_if_modified_since(self):
+        """The dates are only compared without an If-None-Match header."""
+        date = "Tue, 02 May 2023 00:00:00 GMT"
+        self.assertIsInstance(self.conditional(If_Modified_Since=date), web.HTTPNotModified)
+        self.assertIsNone(self.conditional(If_Modified_Since=date, If_None_Match='"other"'))
+        self.assertIsNone(self.conditional(If_Modified_Since="Sun, 30 Apr 2023 00:00:00 GMT"))
+
+    def test_if_match(self):
+        """The precondition fails if the artifact isn't the expected one."""
+        self.assertIsNone(self.conditional(If_Match=f'"{SHA256}"'))
+        self.assertIsNone(self.conditional(If_Match="*"))
+        response = self.conditional(If_Match=f'W/"{SHA256}"')
+        self.assertIsInstance(response, web.HTTPPreconditionFailed)
+
+
+class ArtifactFileResponseTestCase(TestCase):
+    def setUp(self):
+        self.local_file = tempfile.NamedTemporaryFile()
+        self.local_file.write(b"0123456789")
+        self.local_file.flush()
+        self.addCleanup(self.local_file.close)
+
+    def get(self, headers=None):
+        validators = {"ETag": f'"{SHA256}"', "Last-Modified": "Mon, 01 May 2023 00:00:00 GMT"}
+
+        async def handler(request):
+            return ArtifactFileResponse(self.local_file.name, headers=validators)
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.get("/", headers=headers)
+                return response.status, response.headers, await response.read()
+
+        return asyncio.run(run())
+
+    def test_validators(self):
+        """The validators of the artifact are sent instead of those of the file."""
+        status, headers, body = self.get()
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["ETag"], f'"{SHA256}"')
+        self.assertEqual(headers["Last-Modified"], "Mon, 01 May 2023 00:00:00 GMT")
+        self.assertEqual(body, b"0123456789")
+
+    def test_if_range(self):
+        """The Range is only honored if the If-Range header identifies the artifact."""
+        status, headers, body = self.get({"Range": "bytes=2-3", "If-Range": f'"{SHA256}"'})
+        self.assertEqual((status, body), (206, b"23"))
+        status, headers, body = self.get(
+            {"Range": "bytes=2-3", "If-Range": "Mon, 01 May 2023 00:00:00 GMT"}
+        )
+        self.assertEqual((status, body), (206, b"23"))
+        status, headers, body = self.get(
+            {"Range": "bytes=2-3", "If-Range": "Tue, 02 May 2023 00:00:00 GMT"}
+        )
+        self.assertEqual((status, body), (200, b"0123456789"))
+
+
+class BufferedStreamResponseTestCase(TestCase):
+    def stream(self, chunks, max_buffer_size):
+        async def handler(request):
+            response = BufferedStreamResponse(max_buffer_size=max_buffer_size)
+            await response.prepare(request)
+            for chunk in chunks:
+                await response.write(chunk)
+            await response.write_eof()
+            self.response = response
+            return response
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/", handler)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.get("/")
+                return await response.read()
+
+        return asyncio.run(run())
+
+    def test_small_body(self):
+        """The data of small responses is kept."""
+        body = self.stream([b"repo", b"md"], max_buffer_size=6)
+        self.assertEqual(body, b"repomd")
+        self.assertEqual(self.response.body_copy, b"repomd")
+
+    def test_large_body(self):
+        """The data is dropped once it exceeds the maximum size, but still sent."""
+        body = self.stream([b"repo", b"md"], max_buffer_size=5)
+        self.assertEqual(body, b"repomd")
+        self.assertIsNone(self.response.body_copy)
+
+    def test_disabled(self):
+        """Nothing is kept without a maximum size."""
+        self.stream([b"repomd"], max_buffer_size=0)
+        self.assertIsNone(self.response.body_copy)
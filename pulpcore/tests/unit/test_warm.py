@@ -0,0 +1,63 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import SimpleTestCase, override_settings
+
+from pulpcore.app.tasks import warm
+
+
+class WarmDistributionsTestCase(SimpleTestCase):
+    def distribution(self, base_path, content_guard_id=None):
+        return Mock(base_path=base_path, content_guard_id=content_guard_id)
+
+    @override_settings(CONTENT_PATH_PREFIX="/pulp/content/", DOMAIN_ENABLED=False)
+    def test_distribution_url(self):
+        """The url of a distribution is built from the content origin and its base path."""
+        url = warm._distribution_url(self.distribution("a/b"), "http://content:24816/")
+        self.assertEqual(url, "http://content:24816/pulp/content/a/b/")
+
+    @override_settings(CONTENT_PATH_PREFIX="/pulp/content/", DOMAIN_ENABLED=True)
+    def test_distribution_url_domain(self):
+        """The name of the domain of a distribution is part of its url."""
+        distribution = self.distribution("a")
+        distribution.pulp_domain.name = "default"
+        url = warm._distribution_url(distribution, "http://content")
+        self.assertEqual(url, "http://content/pulp/content/default/a/")
+
+    @override_settings(CONTENT_PATH_PREFIX="/pulp/content/", DOMAIN_ENABLED=False)
+    def test_warm(self):
+        """Each served file is requested once, guarded distributions are skipped."""
+        requested = []
+
+        async def handler(request):
+            requested.append(request.path)
+            if request.path.endswith("missing"):
+                raise web.HTTPNotFound()
+            return web.Response(text="x")
+
+        def served_paths(distribution, download_on_demand=False):
+            return ["missing", "a file", "dir/b"]
+
+        async def run():
+            app = web.Application()
+            app.router.add_get("/{path:.*}", handler)
+            async with TestServer(app) as server:
+                distributions = [self.distribution("a"), self.distribution("b", "guard")]
+                return await warm.request_distributions(
+                    distributions, content_origin=str(server.make_url("")), concurrency=2
+                )
+
+        with patch.object(warm, "_served_paths", served_paths):
+            statuses = asyncio.run(run())
+        self.assertEqual(statuses, {200: 3, 404: 1})
+        self.assertCountEqual(
+            requested,
+            [
+                "/pulp/content/a/",
+                "/pulp/content/a/missing",
+                "/pulp/content/a/a file",
+                "/pulp/content/a/dir/b",
+            ],
+        )